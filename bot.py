@@ -202,6 +202,7 @@ def setup_handlers(app):
         
         # Users Management
         ("^view_all_users$", UsersHandlers.view_all_users),
+        ("^users_page_(prev|next)$", UsersHandlers.users_page_navigate),
         ("^manage_user_", UsersHandlers.manage_user),
         ("^manage_admins$", UsersHandlers.manage_admins),
         ("^make_admin_", UsersHandlers.make_admin),
@@ -255,6 +256,8 @@ def setup_handlers(app):
         ("^toggle_mention_filter_", TaskSettingsHandlers.toggle_advanced_filter),
         ("^toggle_forward_filter_", TaskSettingsHandlers.toggle_advanced_filter),
         ("^toggle_keyboard_filter_", TaskSettingsHandlers.toggle_advanced_filter),
+        ("^toggle_duplicate_filter_", TaskSettingsHandlers.toggle_advanced_filter),
+        ("^toggle_similar_filter_", TaskSettingsHandlers.toggle_advanced_filter),
         
         # Replacements
         ("^replacements_", TaskSettingsHandlers.replacements_menu),
@@ -270,8 +273,8 @@ def setup_handlers(app):
         ("^user_lists_", TaskSettingsHandlers.user_lists_menu),
         ("^manage_whitelist_", TaskSettingsHandlers.manage_whitelist),
         ("^manage_blacklist_", TaskSettingsHandlers.manage_blacklist),
-        ("^remove_whitelist_", TaskSettingsHandlers.remove_whitelist_user),
-        ("^remove_blacklist_", TaskSettingsHandlers.remove_blacklist_user),
+        ("^remove_whitelist_", TaskSettingsHandlers.remove_from_whitelist),
+        ("^remove_blacklist_", TaskSettingsHandlers.remove_from_blacklist),
         
         # Statistics
         ("^task_statistics$", MainHandlers.task_statistics),
@@ -341,6 +344,30 @@ async def stop_bot():
             except Exception as e:
                 logger.error(f"Error shutting down application: {e}")
         
+        # إيقاف محرك البث ومرسل الإشعارات؛ ما لم يكتمل يستأنف عند التشغيل التالي
+        try:
+            from utils.broadcaster import broadcaster
+            await broadcaster.stop()
+            from utils.notification_dispatcher import notification_dispatcher
+            await notification_dispatcher.stop()
+        except Exception as e:
+            logger.error(f"Error stopping broadcaster: {e}")
+        
+        # كتابة ما تبقى من عدادات الرسائل المرفوضة قبل إغلاق قاعدة البيانات
+        try:
+            from database.filter_rejections import filter_rejections
+            await filter_rejections.stop()
+            logger.info("Filter rejection writer stopped")
+        except Exception as e:
+            logger.error(f"Error stopping filter rejection writer: {e}")
+        
+        # إيقاف عمليات رسم المخططات
+        try:
+            from utils.chart_renderer import chart_renderer
+            chart_renderer.shutdown()
+        except Exception as e:
+            logger.error(f"Error stopping chart renderer: {e}")
+        
         # Close database
         try:
             if hasattr(db, 'pool') and db.pool:
@@ -465,6 +492,26 @@ async def main():
             # بدء النسخ الاحتياطي التلقائي في الخلفية
             asyncio.create_task(AutoBackupSystem.schedule_auto_backup())
             logger.info("Auto backup system started")
+            
+            # تجميع الإحصائيات الساعية إلى يومية وشهرية
+            from database.statistics_rollup import StatisticsRollup
+            asyncio.create_task(StatisticsRollup.schedule_rollups())
+            logger.info("Statistics rollup job started")
+            
+            # كتابة عدادات الرسائل المرفوضة دفعة واحدة دورياً
+            from database.filter_rejections import filter_rejections
+            asyncio.create_task(filter_rejections.run())
+            logger.info("Filter rejection writer started")
+            
+            # محرك البث الجماعي (يستأنف البثوث غير المكتملة)
+            from utils.broadcaster import broadcaster
+            broadcaster.start(application.bot)
+            logger.info("Broadcaster started")
+            
+            # إرسال الإشعارات الفردية المستحقة من جدول notifications
+            from utils.notification_dispatcher import notification_dispatcher
+            notification_dispatcher.start(application.bot)
+            logger.info("Notification dispatcher started")
         except ImportError as import_error:
             logger.warning(f"Could not import monitoring modules: {import_error}")
             logger.warning("Monitoring and backup systems will not be available")
@@ -12,6 +12,27 @@ class Config:
     # Database Configuration
     DATABASE_URL = os.getenv('DATABASE_URL')
     
+    # Database Pool
+    # hot: forwarding path, ui: handlers, bulk: backups and analytics
+    DB_HOT_POOL_MIN_SIZE = int(os.getenv('DB_HOT_POOL_MIN_SIZE', 4))
+    DB_HOT_POOL_MAX_SIZE = int(os.getenv('DB_HOT_POOL_MAX_SIZE', 12))
+    DB_UI_POOL_MIN_SIZE = int(os.getenv('DB_UI_POOL_MIN_SIZE', 2))
+    DB_UI_POOL_MAX_SIZE = int(os.getenv('DB_UI_POOL_MAX_SIZE', 6))
+    DB_BULK_POOL_MIN_SIZE = int(os.getenv('DB_BULK_POOL_MIN_SIZE', 0))
+    DB_BULK_POOL_MAX_SIZE = int(os.getenv('DB_BULK_POOL_MAX_SIZE', 2))
+    DB_POOL_MAX_QUERIES = int(os.getenv('DB_POOL_MAX_QUERIES', 50000))
+    DB_POOL_MAX_INACTIVE_LIFETIME = float(os.getenv('DB_POOL_MAX_INACTIVE_LIFETIME', 300))
+    DB_COMMAND_TIMEOUT = float(os.getenv('DB_COMMAND_TIMEOUT', 30))
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 30000))
+    DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 256))
+    DB_APPLICATION_NAME = os.getenv('DB_APPLICATION_NAME', 'telegram-forwarder')
+    DB_ACQUIRE_TIMEOUT = float(os.getenv('DB_ACQUIRE_TIMEOUT', 10))
+    DB_SLOW_ACQUIRE_MS = float(os.getenv('DB_SLOW_ACQUIRE_MS', 250))
+    DB_BULK_COMMAND_TIMEOUT = float(os.getenv('DB_BULK_COMMAND_TIMEOUT', 300))
+    DB_BULK_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_BULK_STATEMENT_TIMEOUT_MS', 300000))
+    DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL')  # optional, bulk pool only
+    DB_MIGRATION_LOCK_WAIT_SECONDS = float(os.getenv('DB_MIGRATION_LOCK_WAIT_SECONDS', 600))
+    
     # Userbot Configuration
     API_ID = os.getenv('API_ID')
     API_HASH = os.getenv('API_HASH')
@@ -30,3 +51,60 @@ class Config:
         'photo', 'video', 'audio', 'document', 
         'voice', 'video_note', 'sticker', 'animation'
     ]
+    
+    # Filter Decision Cache
+    FILTER_CACHE_MAX_ENTRIES = int(os.getenv('FILTER_CACHE_MAX_ENTRIES', 50000))
+    FILTER_CACHE_MAX_BYTES = int(os.getenv('FILTER_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    
+    # Filter Rejection Counters (batched writes)
+    FILTER_STATS_FLUSH_SECONDS = float(os.getenv('FILTER_STATS_FLUSH_SECONDS', 5))
+    FILTER_STATS_MAX_PENDING = int(os.getenv('FILTER_STATS_MAX_PENDING', 5000))
+    
+    # User Listing
+    USER_COUNTS_CACHE_SECONDS = int(os.getenv('USER_COUNTS_CACHE_SECONDS', 60))
+    
+    # Permission Checks
+    PERMISSION_CACHE_SECONDS = int(os.getenv('PERMISSION_CACHE_SECONDS', 300))
+    PERMISSION_CACHE_MAX_ENTRIES = int(os.getenv('PERMISSION_CACHE_MAX_ENTRIES', 10000))
+    
+    # Duplicate Suppression
+    DUPLICATE_WINDOW_SECONDS = int(os.getenv('DUPLICATE_WINDOW_SECONDS', 3600))
+    DUPLICATE_MAX_WINDOW_SECONDS = int(os.getenv('DUPLICATE_MAX_WINDOW_SECONDS', 86400))
+    DUPLICATE_MAX_ENTRIES_PER_TARGET = int(os.getenv('DUPLICATE_MAX_ENTRIES_PER_TARGET', 5000))
+    
+    # Near-Duplicate Detection
+    NEAR_DUPLICATE_THRESHOLD = float(os.getenv('NEAR_DUPLICATE_THRESHOLD', 0.9))
+    NEAR_DUPLICATE_MIN_TOKENS = int(os.getenv('NEAR_DUPLICATE_MIN_TOKENS', 5))
+    NEAR_DUPLICATE_MAX_ENTRIES_PER_TARGET = int(os.getenv('NEAR_DUPLICATE_MAX_ENTRIES_PER_TARGET', 2000))
+    
+    # Statistics Rollups
+    STATS_ROLLUP_INTERVAL_SECONDS = int(os.getenv('STATS_ROLLUP_INTERVAL_SECONDS', 3600))
+    STATS_ROLLUP_BATCH_DAYS = int(os.getenv('STATS_ROLLUP_BATCH_DAYS', 7))
+    STATS_HOURLY_RETENTION_DAYS = int(os.getenv('STATS_HOURLY_RETENTION_DAYS', 35))
+    STATS_PARTITIONS_AHEAD = int(os.getenv('STATS_PARTITIONS_AHEAD', 3))
+    STATS_ANALYTICS_DAYS = int(os.getenv('STATS_ANALYTICS_DAYS', 28))  # ضمن فترة الاحتفاظ الساعية
+    
+    # Outgoing Message Rate Limit (Telegram allows ~30 messages/second per bot)
+    SEND_RATE_PER_SECOND = float(os.getenv('SEND_RATE_PER_SECOND', 25))
+    SEND_BURST = int(os.getenv('SEND_BURST', 5))
+    
+    # Broadcasts (all-user notifications, resumable)
+    BROADCAST_BATCH_SIZE = int(os.getenv('BROADCAST_BATCH_SIZE', 200))  # مستلمون لكل نقطة حفظ
+    BROADCAST_POLL_SECONDS = int(os.getenv('BROADCAST_POLL_SECONDS', 30))
+    BROADCAST_LEASE_SECONDS = int(os.getenv('BROADCAST_LEASE_SECONDS', 300))  # بعدها تستأنف نسخة أخرى البث
+    
+    # Notification Dispatcher (per-user notifications table)
+    NOTIFICATION_BATCH_SIZE = int(os.getenv('NOTIFICATION_BATCH_SIZE', 50))
+    NOTIFICATION_POLL_SECONDS = int(os.getenv('NOTIFICATION_POLL_SECONDS', 5))
+    NOTIFICATION_LEASE_SECONDS = int(os.getenv('NOTIFICATION_LEASE_SECONDS', 300))  # بعدها يعاد حجز ما لم يؤكد
+    NOTIFICATION_MAX_ATTEMPTS = int(os.getenv('NOTIFICATION_MAX_ATTEMPTS', 3))
+    
+    # Chart Rendering (separate worker processes)
+    CHART_WORKERS = int(os.getenv('CHART_WORKERS', 2))
+    CHART_MAX_QUEUE = int(os.getenv('CHART_MAX_QUEUE', 20))
+    CHART_DPI = int(os.getenv('CHART_DPI', 300))
+    CHART_POINTS_PER_PIXEL = float(os.getenv('CHART_POINTS_PER_PIXEL', 1.0))  # حد النقاط بعد LTTB نسبة لعرض الرسم
+    
+    # Chart Cache (Telegram file_id of charts already sent)
+    CHART_CACHE_MAX_ENTRIES = int(os.getenv('CHART_CACHE_MAX_ENTRIES', 1000))
+    CHART_CACHE_TTL_SECONDS = int(os.getenv('CHART_CACHE_TTL_SECONDS', 900))
@@ -52,7 +52,7 @@ class BackupManager:
     async def _collect_user_data(user_id: int) -> Dict[str, Any]:
         """جمع بيانات المستخدم للنسخة الاحتياطية"""
         try:
-            async with db.pool.acquire() as conn:
+            async with db.bulk_pool.acquire() as conn:
                 # بيانات المستخدم
                 user_data = await conn.fetchrow(
                     'SELECT * FROM users WHERE user_id = $1', user_id
@@ -0,0 +1,157 @@
+from typing import Optional, List, Dict, Any
+from .models import db
+from .queries import queries
+
+CREATE_BROADCAST = queries.register('broadcasts.create', '''
+    INSERT INTO broadcasts (title, message, parse_mode, admin_only, created_by)
+    VALUES ($1, $2, $3, $4, $5)
+    RETURNING id
+''')
+
+# أقدم بث معلق، أو قيد الإرسال انتهت مهلة حجزه (توقفت النسخة التي حجزته)؛ يستأنف من last_user_id.
+# SKIP LOCKED يمنع نسختين تحجزان في اللحظة نفسها من أخذ الصف نفسه
+CLAIM_NEXT_BROADCAST = queries.register('broadcasts.claim_next', '''
+    UPDATE broadcasts
+    SET status = 'running', started_at = COALESCE(started_at, CURRENT_TIMESTAMP),
+        claimed_by = $1, claimed_at = CURRENT_TIMESTAMP
+    WHERE id = (
+        SELECT id FROM broadcasts
+        WHERE status = 'pending'
+           OR (status = 'running'
+               AND (claimed_at IS NULL OR claimed_at < CURRENT_TIMESTAMP - $2 * INTERVAL '1 second'))
+        ORDER BY id
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING *
+''')
+
+# دفعة مستلمين بمؤشر على المفتاح الأساسي، فكل دفعة قراءة فهرس محدودة مهما كان عدد المستخدمين
+BROADCAST_RECIPIENTS = queries.register('broadcasts.recipients', '''
+    SELECT user_id FROM users
+    WHERE user_id > $1 AND is_active AND blocked_at IS NULL AND (NOT $3 OR is_admin)
+    ORDER BY user_id
+    LIMIT $2
+''')
+
+# من حظر البوت يستبعد من البث حتى يعود بـ /start (create_or_update_user يمسح blocked_at)؛
+# is_active (الحظر الإداري) لا يتغير. من عاد أثناء إرسال الدفعة ($2 ثانية) لا يعلم
+MARK_BLOCKED = queries.register('broadcasts.mark_blocked', '''
+    UPDATE users
+    SET blocked_at = CURRENT_TIMESTAMP
+    WHERE user_id = ANY($1::bigint[]) AND blocked_at IS NULL
+      AND (last_activity IS NULL OR last_activity < CURRENT_TIMESTAMP - $2 * INTERVAL '1 second')
+''')
+
+# يجدد مهلة الحجز؛ لا يعيد صفاً إذا أخذت نسخة أخرى البث بعد انتهاء المهلة
+SAVE_PROGRESS = queries.register('broadcasts.save_progress', '''
+    UPDATE broadcasts
+    SET last_user_id = $2, sent = sent + $3, failed = failed + $4, blocked = blocked + $5,
+        claimed_at = CURRENT_TIMESTAMP
+    WHERE id = $1 AND claimed_by = $6
+    RETURNING status
+''')
+
+FINISH_BROADCAST = queries.register('broadcasts.finish', '''
+    UPDATE broadcasts
+    SET status = 'done', finished_at = CURRENT_TIMESTAMP, claimed_at = NULL
+    WHERE id = $1 AND status = 'running' AND claimed_by = $2
+''')
+
+# عند الإيقاف المنظم: النسخة التالية تستأنف فوراً دون انتظار المهلة
+RELEASE_BROADCAST = queries.register('broadcasts.release', '''
+    UPDATE broadcasts SET claimed_at = NULL WHERE id = $1 AND claimed_by = $2
+''')
+
+CANCEL_BROADCAST = queries.register('broadcasts.cancel', '''
+    UPDATE broadcasts
+    SET status = 'cancelled', finished_at = CURRENT_TIMESTAMP
+    WHERE id = $1 AND status IN ('pending', 'running')
+    RETURNING id
+''')
+
+GET_BROADCAST = queries.register('broadcasts.get', 'SELECT * FROM broadcasts WHERE id = $1')
+
+class BroadcastManager:
+    """تخزين رسائل البث الجماعي وتقدم إرسالها.
+
+    الكتابة كلها على المجمع الرئيسي (db.pool)؛ قراءة المستلمين وحدها على bulk_pool
+    لأنه قد يكون نسخة قراءة فقط. دوال محرك الإرسال (claim_next_broadcast وما بعدها)
+    تترك الأخطاء تصل إليه ليعيد المحاولة لاحقاً من آخر نقطة حفظ، بدلاً من اعتبار
+    النتيجة الفارغة نهاية البث.
+    """
+
+    @staticmethod
+    async def create_broadcast(message: str, title: Optional[str] = None, parse_mode: Optional[str] = 'Markdown',
+                               admin_only: bool = False, created_by: Optional[int] = None) -> Optional[int]:
+        """إنشاء بث جديد بانتظار الإرسال"""
+        try:
+            async with db.pool.acquire() as conn:
+                return await CREATE_BROADCAST.fetchval(conn, title, message, parse_mode, admin_only, created_by)
+        except Exception as e:
+            print(f"Error creating broadcast: {e}")
+            return None
+
+    @staticmethod
+    async def get_broadcast(broadcast_id: int) -> Optional[Dict[str, Any]]:
+        """بيانات البث وعدادات تقدمه"""
+        try:
+            async with db.pool.acquire() as conn:
+                row = await GET_BROADCAST.fetchrow(conn, broadcast_id)
+                return dict(row) if row else None
+        except Exception as e:
+            print(f"Error getting broadcast: {e}")
+            return None
+
+    @staticmethod
+    async def cancel_broadcast(broadcast_id: int) -> bool:
+        """إيقاف البث؛ المحرك يتوقف عند نقطة الحفظ التالية"""
+        try:
+            async with db.pool.acquire() as conn:
+                return await CANCEL_BROADCAST.fetchval(conn, broadcast_id) is not None
+        except Exception as e:
+            print(f"Error cancelling broadcast: {e}")
+            return False
+
+    @staticmethod
+    async def claim_next_broadcast(owner: str, lease_seconds: int) -> Optional[Dict[str, Any]]:
+        """حجز أقدم بث متاح باسم owner وتحويله إلى running"""
+        async with db.pool.acquire() as conn:
+            row = await CLAIM_NEXT_BROADCAST.fetchrow(conn, owner, lease_seconds)
+            return dict(row) if row else None
+
+    @staticmethod
+    async def get_recipients(after_user_id: int, limit: int, admin_only: bool = False) -> List[int]:
+        """معرفات المستخدمين التالية بعد after_user_id بترتيب تصاعدي (غير المحظورين إدارياً ومن لم يحظر البوت)"""
+        async with db.bulk_pool.acquire() as conn:
+            rows = await BROADCAST_RECIPIENTS.fetch(conn, after_user_id, limit, admin_only)
+            return [row['user_id'] for row in rows]
+
+    @staticmethod
+    async def save_progress(broadcast_id: int, owner: str, last_user_id: int, sent: int, failed: int,
+                            blocked_user_ids: List[int], batch_seconds: float = 0) -> Optional[str]:
+        """حفظ نقطة الاستئناف وتعليم من حظروا البوت في معاملة واحدة.
+
+        batch_seconds مدة إرسال الدفعة؛ من نشط خلالها أعاد تفعيل البوت فلا يعلم.
+        يعيد حالة البث الحالية، أو None إذا لم يعد owner صاحب الحجز.
+        """
+        async with db.pool.acquire() as conn:
+            async with conn.transaction():
+                status = await SAVE_PROGRESS.fetchval(
+                    conn, broadcast_id, last_user_id, sent, failed, len(blocked_user_ids), owner
+                )
+                if status is not None and blocked_user_ids:
+                    await MARK_BLOCKED.execute(conn, blocked_user_ids, batch_seconds)
+        return status
+
+    @staticmethod
+    async def finish_broadcast(broadcast_id: int, owner: str) -> None:
+        """تعليم البث كمنتهٍ (إلا إذا ألغي أثناء الإرسال أو أخذته نسخة أخرى)"""
+        async with db.pool.acquire() as conn:
+            await FINISH_BROADCAST.execute(conn, broadcast_id, owner)
+
+    @staticmethod
+    async def release_broadcast(broadcast_id: int, owner: str) -> None:
+        """ترك الحجز عند الإيقاف المنظم"""
+        async with db.pool.acquire() as conn:
+            await RELEASE_BROADCAST.execute(conn, broadcast_id, owner)
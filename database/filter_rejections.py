@@ -0,0 +1,134 @@
+import asyncio
+from datetime import date, datetime
+from typing import Dict, Optional, Tuple
+from config import Config
+from .models import db
+from .queries import queries
+
+# سبب الرفض عند عدم تحديده
+REASON_OTHER = 'other'
+
+# الأعمدة مصفوفات متوازية، صف لكل (مهمة، يوم، ساعة، سبب). المهام المحذوفة منذ
+# التسجيل تتجاهل حتى لا يفشل قيد المفتاح الأجنبي الدفعة كلها
+FLUSH_REJECTIONS = queries.register('filters.flush_rejections', '''
+    INSERT INTO filter_rejections (task_id, date, hour, reason, count)
+    SELECT u.task_id, u.date, u.hour, u.reason, u.count
+    FROM unnest($1::integer[], $2::date[], $3::smallint[], $4::varchar[], $5::integer[])
+         AS u(task_id, date, hour, reason, count)
+    WHERE EXISTS (SELECT 1 FROM forwarding_tasks t WHERE t.id = u.task_id)
+    ON CONFLICT (task_id, date, hour, reason)
+    DO UPDATE SET count = filter_rejections.count + EXCLUDED.count
+''')
+
+FLUSH_FILTERED = queries.register('filters.flush_filtered', '''
+    INSERT INTO statistics (task_id, date, hour, messages_filtered)
+    SELECT u.task_id, u.date, u.hour, u.count
+    FROM unnest($1::integer[], $2::date[], $3::integer[], $4::integer[])
+         AS u(task_id, date, hour, count)
+    WHERE EXISTS (SELECT 1 FROM forwarding_tasks t WHERE t.id = u.task_id)
+    ON CONFLICT (task_id, date, hour)
+    DO UPDATE SET messages_filtered = statistics.messages_filtered + EXCLUDED.messages_filtered
+''')
+
+FLUSH_TASK_FILTERED = queries.register('filters.flush_task_filtered', '''
+    UPDATE forwarding_tasks t
+    SET total_filtered = t.total_filtered + u.count,
+        success_rate = (t.total_forwarded::decimal / GREATEST(t.total_forwarded + t.total_filtered + u.count, 1)) * 100
+    FROM unnest($1::integer[], $2::integer[]) AS u(task_id, count)
+    WHERE t.id = u.task_id
+''')
+
+RejectionKey = Tuple[int, date, int, str]
+
+class FilterRejectionBuffer:
+    """عدادات الرسائل المرفوضة في الذاكرة تكتب دفعة واحدة كل FILTER_STATS_FLUSH_SECONDS.
+
+    كل دفعة ثلاث عبارات في معاملة واحدة مهما كان عدد الرسائل، بدلاً من عبارتين لكل رسالة.
+    """
+
+    def __init__(self, flush_interval: float = Config.FILTER_STATS_FLUSH_SECONDS,
+                 max_pending: int = Config.FILTER_STATS_MAX_PENDING):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._counts: Dict[RejectionKey, int] = {}
+        self._flush_now: Optional[asyncio.Event] = None
+        self._running = False
+        self.flushed = 0
+        self.failed_flushes = 0
+
+    def add(self, task_id: int, reason: Optional[str] = None) -> None:
+        """تسجيل رسالة مرفوضة؛ بدون أي اتصال بقاعدة البيانات"""
+        now = datetime.now()
+        key = (task_id, now.date(), now.hour, reason or REASON_OTHER)
+        self._counts[key] = self._counts.get(key, 0) + 1
+
+        if len(self._counts) >= self.max_pending and self._flush_now is not None:
+            self._flush_now.set()
+
+    @property
+    def pending(self) -> int:
+        return sum(self._counts.values())
+
+    async def flush(self) -> int:
+        """كتابة العدادات المتراكمة؛ يعيد عدد الرسائل المكتوبة"""
+        if not self._counts:
+            return 0
+
+        counts, self._counts = self._counts, {}
+
+        # ترتيب ثابت للصفوف حتى تقفل بالترتيب نفسه في كل دفعة
+        rows = sorted(counts.items())
+        hourly: Dict[Tuple[int, date, int], int] = {}
+        per_task: Dict[int, int] = {}
+        for (task_id, day, hour, _), count in rows:
+            hourly[(task_id, day, hour)] = hourly.get((task_id, day, hour), 0) + count
+            per_task[task_id] = per_task.get(task_id, 0) + count
+
+        try:
+            async with db.hot_pool.acquire() as conn:
+                async with conn.transaction():
+                    await FLUSH_REJECTIONS.execute(
+                        conn,
+                        [key[0] for key, _ in rows], [key[1] for key, _ in rows],
+                        [key[2] for key, _ in rows], [key[3] for key, _ in rows],
+                        [count for _, count in rows]
+                    )
+                    await FLUSH_FILTERED.execute(
+                        conn,
+                        [key[0] for key in hourly], [key[1] for key in hourly],
+                        [key[2] for key in hourly], list(hourly.values())
+                    )
+                    await FLUSH_TASK_FILTERED.execute(conn, list(per_task), list(per_task.values()))
+        except Exception as e:
+            print(f"Error flushing filter rejections: {e}")
+            # إعادة العدادات إلى المخزن لتكتب مع الدفعة التالية
+            for key, count in counts.items():
+                self._counts[key] = self._counts.get(key, 0) + count
+            self.failed_flushes += 1
+            return 0
+
+        written = sum(per_task.values())
+        self.flushed += written
+        return written
+
+    async def run(self):
+        """الكتابة دورياً، أو فوراً عند بلوغ max_pending"""
+        self._flush_now = asyncio.Event()
+        self._running = True
+        while self._running:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            await self.flush()
+
+    async def stop(self):
+        """إيقاف الكتابة الدورية وكتابة ما تبقى"""
+        self._running = False
+        if self._flush_now is not None:
+            self._flush_now.set()
+        await self.flush()
+
+# Global filter rejection buffer
+filter_rejections = FilterRejectionBuffer()
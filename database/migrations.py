@@ -0,0 +1,717 @@
+import time
+import asyncio
+import logging
+from typing import List, NamedTuple, Tuple
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+# مفتاح القفل الاستشاري المشترك بين كل النسخ التي تشغل الترحيلات
+MIGRATION_LOCK_ID = 0x7466_7764_6d69_67  # "tfwdmig"
+MIGRATION_LOCK_WAIT_SECONDS = 600  # أطول ترحيل متوقع تنتظره النسخ الأخرى
+MIGRATION_LOCK_POLL_SECONDS = 1
+
+class Migration(NamedTuple):
+    """خطوة ترحيل مرقمة؛ يجب أن يكون SQL قابلاً لإعادة التنفيذ"""
+    version: int
+    name: str
+    sql: str
+
+BASELINE_SQL = '''
+-- الجداول الأساسية
+CREATE TABLE IF NOT EXISTS users (
+    user_id BIGINT PRIMARY KEY,
+    username VARCHAR(255),
+    first_name VARCHAR(255),
+    last_name VARCHAR(255),
+    is_admin BOOLEAN DEFAULT FALSE,
+    is_active BOOLEAN DEFAULT TRUE,
+    is_banned BOOLEAN DEFAULT FALSE,
+    ban_reason TEXT,
+    last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    subscription_type VARCHAR(20) DEFAULT 'free',
+    language_code VARCHAR(10) DEFAULT 'ar',
+    timezone VARCHAR(50) DEFAULT 'UTC',
+    total_tasks_created INTEGER DEFAULT 0,
+    total_messages_forwarded BIGINT DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS forwarding_tasks (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    task_name VARCHAR(255) NOT NULL,
+    source_chat_id BIGINT NOT NULL,
+    target_chat_id BIGINT NOT NULL,
+    task_type VARCHAR(50) NOT NULL,
+    is_active BOOLEAN DEFAULT TRUE,
+    settings JSONB DEFAULT '{}',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    description TEXT,
+    priority INTEGER DEFAULT 1,
+    last_message_time TIMESTAMP,
+    total_forwarded BIGINT DEFAULT 0,
+    total_filtered BIGINT DEFAULT 0,
+    error_count INTEGER DEFAULT 0,
+    success_rate DECIMAL(5,2) DEFAULT 0.00,
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS statistics (
+    id SERIAL PRIMARY KEY,
+    task_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+    hour INTEGER DEFAULT EXTRACT(HOUR FROM CURRENT_TIMESTAMP),
+    messages_forwarded INTEGER DEFAULT 0,
+    messages_filtered INTEGER DEFAULT 0,
+    messages_failed INTEGER DEFAULT 0,
+    bytes_transferred BIGINT DEFAULT 0,
+    processing_time_ms INTEGER DEFAULT 0,
+    filter_breakdown JSONB DEFAULT '{}',
+    error_breakdown JSONB DEFAULT '{}',
+    last_message_time TIMESTAMP,
+    FOREIGN KEY (task_id) REFERENCES forwarding_tasks(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS error_logs (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT,
+    error_type VARCHAR(50) DEFAULT 'general',
+    error_category VARCHAR(50) DEFAULT 'system',
+    error_message TEXT,
+    error_code VARCHAR(20),
+    stack_trace TEXT,
+    context_data JSONB,
+    severity VARCHAR(20) DEFAULT 'error',
+    is_resolved BOOLEAN DEFAULT FALSE,
+    resolved_at TIMESTAMP,
+    resolved_by BIGINT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    task_id INTEGER,
+    session_id INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS userbot_sessions (
+    user_id BIGINT PRIMARY KEY,
+    session_data BYTEA NOT NULL,
+    is_active BOOLEAN DEFAULT TRUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    api_id INTEGER,
+    api_hash VARCHAR(255),
+    phone_number VARCHAR(20),
+    last_connected TIMESTAMP,
+    connection_errors INTEGER DEFAULT 0,
+    session_info JSONB DEFAULT '{}',
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+
+-- أعمدة أضيفت لاحقاً إلى قواعد البيانات القديمة
+ALTER TABLE users
+    ADD COLUMN IF NOT EXISTS subscription_type VARCHAR(20) DEFAULT 'free',
+    ADD COLUMN IF NOT EXISTS language_code VARCHAR(10) DEFAULT 'ar',
+    ADD COLUMN IF NOT EXISTS timezone VARCHAR(50) DEFAULT 'UTC',
+    ADD COLUMN IF NOT EXISTS total_tasks_created INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS total_messages_forwarded BIGINT DEFAULT 0;
+
+ALTER TABLE forwarding_tasks
+    ADD COLUMN IF NOT EXISTS settings JSONB DEFAULT '{}',
+    ADD COLUMN IF NOT EXISTS description TEXT,
+    ADD COLUMN IF NOT EXISTS priority INTEGER DEFAULT 1,
+    ADD COLUMN IF NOT EXISTS last_message_time TIMESTAMP,
+    ADD COLUMN IF NOT EXISTS total_forwarded BIGINT DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS total_filtered BIGINT DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS error_count INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS success_rate DECIMAL(5,2) DEFAULT 0.00;
+
+ALTER TABLE statistics
+    ADD COLUMN IF NOT EXISTS hour INTEGER DEFAULT EXTRACT(HOUR FROM CURRENT_TIMESTAMP),
+    ADD COLUMN IF NOT EXISTS messages_failed INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS bytes_transferred BIGINT DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS processing_time_ms INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS filter_breakdown JSONB DEFAULT '{}',
+    ADD COLUMN IF NOT EXISTS error_breakdown JSONB DEFAULT '{}',
+    ADD COLUMN IF NOT EXISTS last_message_time TIMESTAMP;
+
+ALTER TABLE userbot_sessions
+    ADD COLUMN IF NOT EXISTS api_id INTEGER,
+    ADD COLUMN IF NOT EXISTS api_hash VARCHAR(255),
+    ADD COLUMN IF NOT EXISTS phone_number VARCHAR(20),
+    ADD COLUMN IF NOT EXISTS last_connected TIMESTAMP,
+    ADD COLUMN IF NOT EXISTS connection_errors INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS session_info JSONB DEFAULT '{}';
+
+ALTER TABLE error_logs
+    ADD COLUMN IF NOT EXISTS task_id INTEGER,
+    ADD COLUMN IF NOT EXISTS session_id INTEGER,
+    ADD COLUMN IF NOT EXISTS error_type VARCHAR(50) DEFAULT 'general',
+    ADD COLUMN IF NOT EXISTS error_category VARCHAR(50) DEFAULT 'system',
+    ADD COLUMN IF NOT EXISTS error_code VARCHAR(20),
+    ADD COLUMN IF NOT EXISTS stack_trace TEXT,
+    ADD COLUMN IF NOT EXISTS context_data JSONB,
+    ADD COLUMN IF NOT EXISTS severity VARCHAR(20) DEFAULT 'error',
+    ADD COLUMN IF NOT EXISTS is_resolved BOOLEAN DEFAULT FALSE,
+    ADD COLUMN IF NOT EXISTS resolved_at TIMESTAMP,
+    ADD COLUMN IF NOT EXISTS resolved_by BIGINT;
+
+-- القيد الفريد يشمل الساعة بدلاً من (task_id, date)
+ALTER TABLE statistics DROP CONSTRAINT IF EXISTS statistics_task_id_date_key;
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'statistics_task_id_date_hour_key') THEN
+        ALTER TABLE statistics ADD CONSTRAINT statistics_task_id_date_hour_key UNIQUE (task_id, date, hour);
+    END IF;
+END $$;
+
+-- الجداول الجديدة
+CREATE TABLE IF NOT EXISTS user_settings (
+    user_id BIGINT PRIMARY KEY,
+    notifications_enabled BOOLEAN DEFAULT TRUE,
+    task_notifications BOOLEAN DEFAULT TRUE,
+    error_notifications BOOLEAN DEFAULT TRUE,
+    stats_notifications BOOLEAN DEFAULT FALSE,
+    system_notifications BOOLEAN DEFAULT TRUE,
+    dark_mode BOOLEAN DEFAULT FALSE,
+    auto_backup BOOLEAN DEFAULT FALSE,
+    backup_frequency VARCHAR(20) DEFAULT 'weekly',
+    chart_type VARCHAR(20) DEFAULT 'bar',
+    stats_period INTEGER DEFAULT 7,
+    ui_language VARCHAR(10) DEFAULT 'ar',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS active_sessions (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    session_token VARCHAR(255) UNIQUE NOT NULL,
+    device_info JSONB,
+    ip_address INET,
+    user_agent TEXT,
+    is_active BOOLEAN DEFAULT TRUE,
+    last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+
+-- message_filters أعيدت تسميته إلى task_filters
+DO $$
+BEGIN
+    IF to_regclass('message_filters') IS NOT NULL AND to_regclass('task_filters') IS NULL THEN
+        ALTER TABLE message_filters RENAME TO task_filters;
+    END IF;
+END $$;
+
+CREATE TABLE IF NOT EXISTS task_filters (
+    id SERIAL PRIMARY KEY,
+    task_id INTEGER NOT NULL,
+    filter_category VARCHAR(50) NOT NULL,
+    filter_type VARCHAR(50) NOT NULL,
+    filter_value TEXT,
+    filter_config JSONB DEFAULT '{}',
+    is_active BOOLEAN DEFAULT TRUE,
+    priority INTEGER DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (task_id) REFERENCES forwarding_tasks(id) ON DELETE CASCADE
+);
+
+ALTER TABLE task_filters
+    ADD COLUMN IF NOT EXISTS filter_category VARCHAR(50) DEFAULT 'text',
+    ADD COLUMN IF NOT EXISTS filter_config JSONB DEFAULT '{}',
+    ADD COLUMN IF NOT EXISTS priority INTEGER DEFAULT 1,
+    ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+CREATE TABLE IF NOT EXISTS notifications (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT,
+    notification_type VARCHAR(50) NOT NULL,
+    title VARCHAR(255) NOT NULL,
+    message TEXT NOT NULL,
+    data JSONB DEFAULT '{}',
+    is_read BOOLEAN DEFAULT FALSE,
+    is_sent BOOLEAN DEFAULT FALSE,
+    priority INTEGER DEFAULT 1,
+    scheduled_at TIMESTAMP,
+    sent_at TIMESTAMP,
+    expires_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS backup_files (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    backup_name VARCHAR(255) NOT NULL,
+    backup_type VARCHAR(50) DEFAULT 'manual',
+    file_path TEXT,
+    file_size BIGINT,
+    backup_data JSONB,
+    compression_type VARCHAR(20) DEFAULT 'gzip',
+    checksum VARCHAR(255),
+    is_encrypted BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS activity_logs (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT,
+    session_id INTEGER,
+    activity_type VARCHAR(50) NOT NULL,
+    activity_category VARCHAR(50) NOT NULL,
+    description TEXT,
+    target_type VARCHAR(50),
+    target_id INTEGER,
+    old_values JSONB,
+    new_values JSONB,
+    ip_address INET,
+    user_agent TEXT,
+    success BOOLEAN DEFAULT TRUE,
+    error_message TEXT,
+    processing_time_ms INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE SET NULL,
+    FOREIGN KEY (session_id) REFERENCES active_sessions(id) ON DELETE SET NULL
+);
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'fk_error_logs_task_id') THEN
+        ALTER TABLE error_logs ADD CONSTRAINT fk_error_logs_task_id
+            FOREIGN KEY (task_id) REFERENCES forwarding_tasks(id) ON DELETE SET NULL;
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'fk_error_logs_session_id') THEN
+        ALTER TABLE error_logs ADD CONSTRAINT fk_error_logs_session_id
+            FOREIGN KEY (session_id) REFERENCES active_sessions(id) ON DELETE SET NULL;
+    END IF;
+END $$;
+
+-- Users indexes
+CREATE INDEX IF NOT EXISTS idx_users_is_active ON users(is_active) WHERE is_active = TRUE;
+CREATE INDEX IF NOT EXISTS idx_users_is_admin ON users(is_admin) WHERE is_admin = TRUE;
+CREATE INDEX IF NOT EXISTS idx_users_last_activity ON users(last_activity);
+CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at);
+
+-- User settings indexes
+CREATE INDEX IF NOT EXISTS idx_user_settings_notifications ON user_settings(notifications_enabled);
+
+-- Active sessions indexes
+CREATE INDEX IF NOT EXISTS idx_active_sessions_user_id ON active_sessions(user_id);
+CREATE INDEX IF NOT EXISTS idx_active_sessions_is_active ON active_sessions(is_active) WHERE is_active = TRUE;
+CREATE INDEX IF NOT EXISTS idx_active_sessions_expires_at ON active_sessions(expires_at);
+
+-- Forwarding tasks indexes
+CREATE INDEX IF NOT EXISTS idx_forwarding_tasks_user_id ON forwarding_tasks(user_id);
+CREATE INDEX IF NOT EXISTS idx_forwarding_tasks_is_active ON forwarding_tasks(is_active) WHERE is_active = TRUE;
+CREATE INDEX IF NOT EXISTS idx_forwarding_tasks_source_chat ON forwarding_tasks(source_chat_id);
+CREATE INDEX IF NOT EXISTS idx_forwarding_tasks_target_chat ON forwarding_tasks(target_chat_id);
+CREATE INDEX IF NOT EXISTS idx_forwarding_tasks_priority ON forwarding_tasks(priority);
+CREATE INDEX IF NOT EXISTS idx_forwarding_tasks_updated_at ON forwarding_tasks(updated_at);
+
+-- Task filters indexes
+CREATE INDEX IF NOT EXISTS idx_task_filters_task_id ON task_filters(task_id);
+CREATE INDEX IF NOT EXISTS idx_task_filters_category ON task_filters(filter_category);
+CREATE INDEX IF NOT EXISTS idx_task_filters_type ON task_filters(filter_type);
+CREATE INDEX IF NOT EXISTS idx_task_filters_is_active ON task_filters(is_active) WHERE is_active = TRUE;
+
+-- Statistics indexes
+CREATE INDEX IF NOT EXISTS idx_statistics_task_id ON statistics(task_id);
+CREATE INDEX IF NOT EXISTS idx_statistics_date ON statistics(date);
+CREATE INDEX IF NOT EXISTS idx_statistics_task_date ON statistics(task_id, date);
+CREATE INDEX IF NOT EXISTS idx_statistics_hour ON statistics(date, hour);
+
+-- Userbot sessions indexes
+CREATE INDEX IF NOT EXISTS idx_userbot_sessions_is_active ON userbot_sessions(is_active) WHERE is_active = TRUE;
+CREATE INDEX IF NOT EXISTS idx_userbot_sessions_last_connected ON userbot_sessions(last_connected);
+
+-- Notifications indexes
+CREATE INDEX IF NOT EXISTS idx_notifications_user_id ON notifications(user_id);
+CREATE INDEX IF NOT EXISTS idx_notifications_type ON notifications(notification_type);
+CREATE INDEX IF NOT EXISTS idx_notifications_is_read ON notifications(is_read) WHERE is_read = FALSE;
+CREATE INDEX IF NOT EXISTS idx_notifications_is_sent ON notifications(is_sent);
+CREATE INDEX IF NOT EXISTS idx_notifications_scheduled_at ON notifications(scheduled_at);
+CREATE INDEX IF NOT EXISTS idx_notifications_created_at ON notifications(created_at);
+
+-- Backup files indexes
+CREATE INDEX IF NOT EXISTS idx_backup_files_user_id ON backup_files(user_id);
+CREATE INDEX IF NOT EXISTS idx_backup_files_type ON backup_files(backup_type);
+CREATE INDEX IF NOT EXISTS idx_backup_files_created_at ON backup_files(created_at);
+CREATE INDEX IF NOT EXISTS idx_backup_files_expires_at ON backup_files(expires_at);
+
+-- Activity logs indexes
+CREATE INDEX IF NOT EXISTS idx_activity_logs_user_id ON activity_logs(user_id);
+CREATE INDEX IF NOT EXISTS idx_activity_logs_type ON activity_logs(activity_type);
+CREATE INDEX IF NOT EXISTS idx_activity_logs_category ON activity_logs(activity_category);
+CREATE INDEX IF NOT EXISTS idx_activity_logs_created_at ON activity_logs(created_at);
+CREATE INDEX IF NOT EXISTS idx_activity_logs_success ON activity_logs(success);
+
+-- Error logs indexes
+CREATE INDEX IF NOT EXISTS idx_error_logs_user_id ON error_logs(user_id);
+CREATE INDEX IF NOT EXISTS idx_error_logs_task_id ON error_logs(task_id);
+CREATE INDEX IF NOT EXISTS idx_error_logs_type ON error_logs(error_type);
+CREATE INDEX IF NOT EXISTS idx_error_logs_category ON error_logs(error_category);
+CREATE INDEX IF NOT EXISTS idx_error_logs_severity ON error_logs(severity);
+CREATE INDEX IF NOT EXISTS idx_error_logs_is_resolved ON error_logs(is_resolved) WHERE is_resolved = FALSE;
+CREATE INDEX IF NOT EXISTS idx_error_logs_created_at ON error_logs(created_at);
+'''
+
+TASK_USER_LISTS_SQL = '''
+-- المفتاح الأساسي يغطي البحث والعد والترتيب حسب user_id لكل قائمة
+CREATE TABLE IF NOT EXISTS task_user_lists (
+    task_id INTEGER NOT NULL,
+    list_type VARCHAR(10) NOT NULL CHECK (list_type IN ('whitelist', 'blacklist')),
+    user_id BIGINT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (task_id, list_type, user_id),
+    FOREIGN KEY (task_id) REFERENCES forwarding_tasks(id) ON DELETE CASCADE
+);
+
+-- نقل القوائم المخزنة داخل إعدادات المهام إلى الجدول
+INSERT INTO task_user_lists (task_id, list_type, user_id)
+SELECT t.id, l.list_type, jsonb_array_elements_text(t.settings::jsonb -> l.list_type)::BIGINT
+FROM forwarding_tasks t
+CROSS JOIN (VALUES ('whitelist'), ('blacklist')) AS l(list_type)
+WHERE jsonb_typeof(t.settings::jsonb -> l.list_type) = 'array'
+ON CONFLICT DO NOTHING;
+
+UPDATE forwarding_tasks
+SET settings = settings::jsonb - 'whitelist' - 'blacklist'
+WHERE settings::jsonb ?| ARRAY['whitelist', 'blacklist'];
+'''
+
+STATISTICS_ROLLUPS_SQL = '''
+-- تجميعات يومية وشهرية لجدول statistics (صف لكل مهمة لكل ساعة)
+CREATE TABLE IF NOT EXISTS statistics_daily (
+    task_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+    messages_forwarded BIGINT DEFAULT 0,
+    messages_filtered BIGINT DEFAULT 0,
+    messages_failed BIGINT DEFAULT 0,
+    bytes_transferred BIGINT DEFAULT 0,
+    processing_time_ms BIGINT DEFAULT 0,
+    active_hours INTEGER DEFAULT 0,
+    filter_breakdown JSONB DEFAULT '{}',
+    error_breakdown JSONB DEFAULT '{}',
+    last_message_time TIMESTAMP,
+    PRIMARY KEY (task_id, date),
+    FOREIGN KEY (task_id) REFERENCES forwarding_tasks(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS statistics_monthly (
+    task_id INTEGER NOT NULL,
+    month DATE NOT NULL,
+    messages_forwarded BIGINT DEFAULT 0,
+    messages_filtered BIGINT DEFAULT 0,
+    messages_failed BIGINT DEFAULT 0,
+    bytes_transferred BIGINT DEFAULT 0,
+    processing_time_ms BIGINT DEFAULT 0,
+    active_days INTEGER DEFAULT 0,
+    filter_breakdown JSONB DEFAULT '{}',
+    error_breakdown JSONB DEFAULT '{}',
+    last_message_time TIMESTAMP,
+    PRIMARY KEY (task_id, month),
+    FOREIGN KEY (task_id) REFERENCES forwarding_tasks(id) ON DELETE CASCADE
+);
+
+-- آخر يوم مكتمل تم تجميعه؛ ما بعده يقرأ من الجدول الساعي
+CREATE TABLE IF NOT EXISTS statistics_rollup_state (
+    name VARCHAR(50) PRIMARY KEY,
+    rolled_through DATE NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_statistics_daily_date ON statistics_daily(date);
+'''
+
+STATISTICS_PARTITIONS_SQL = '''
+-- statistics مقسم شهرياً حسب date؛ الاستعلامات بمدى تاريخ تقرأ الأقسام المعنية فقط
+-- والاحتفاظ يصبح حذف قسم كامل. القيد الفريد (task_id, date, hour) يغني عن
+-- فهارس task_id و(task_id, date)، فيبقى فهرسان بدلاً من خمسة
+DO $$
+DECLARE
+    first_month DATE;
+    month_start DATE;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('statistics')) THEN
+        RETURN;
+    END IF;
+
+    ALTER TABLE statistics RENAME TO statistics_unpartitioned;
+    ALTER INDEX IF EXISTS statistics_task_id_date_hour_key RENAME TO statistics_unpartitioned_key;
+    DROP INDEX IF EXISTS idx_statistics_task_id, idx_statistics_date, idx_statistics_task_date, idx_statistics_hour;
+
+    CREATE TABLE statistics (
+        task_id INTEGER NOT NULL,
+        date DATE NOT NULL,
+        hour INTEGER DEFAULT EXTRACT(HOUR FROM CURRENT_TIMESTAMP),
+        messages_forwarded INTEGER DEFAULT 0,
+        messages_filtered INTEGER DEFAULT 0,
+        messages_failed INTEGER DEFAULT 0,
+        bytes_transferred BIGINT DEFAULT 0,
+        processing_time_ms INTEGER DEFAULT 0,
+        filter_breakdown JSONB DEFAULT '{}',
+        error_breakdown JSONB DEFAULT '{}',
+        last_message_time TIMESTAMP,
+        FOREIGN KEY (task_id) REFERENCES forwarding_tasks(id) ON DELETE CASCADE,
+        CONSTRAINT statistics_task_id_date_hour_key UNIQUE (task_id, date, hour)
+    ) PARTITION BY RANGE (date);
+
+    CREATE INDEX idx_statistics_hour ON statistics (date, hour);
+
+    SELECT date_trunc('month', COALESCE(MIN(date), CURRENT_DATE))::date
+    INTO first_month FROM statistics_unpartitioned;
+
+    month_start := first_month;
+    WHILE month_start <= (date_trunc('month', CURRENT_DATE) + INTERVAL '3 months')::date LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF statistics FOR VALUES FROM (%L) TO (%L)',
+            'statistics_p' || to_char(month_start, 'YYYY_MM'),
+            month_start, (month_start + INTERVAL '1 month')::date
+        );
+        month_start := (month_start + INTERVAL '1 month')::date;
+    END LOOP;
+
+    -- الصفوف القديمة تنقل بعد الترحيل على دفعات (backfill_statistics)، فلا تقفل
+    -- الكتابة على statistics طوال النسخ
+END $$;
+'''
+
+FILTER_REJECTIONS_SQL = '''
+-- عدد الرسائل المرفوضة لكل مهمة وساعة وسبب؛ يحل محل statistics.filter_breakdown
+-- الذي كان || يستبدل العدد فيه بـ 1 بدلاً من زيادته
+CREATE TABLE IF NOT EXISTS filter_rejections (
+    task_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+    hour SMALLINT NOT NULL,
+    reason VARCHAR(32) NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (task_id, date, hour, reason),
+    FOREIGN KEY (task_id) REFERENCES forwarding_tasks(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_filter_rejections_date ON filter_rejections(date);
+'''
+
+# نص البحث في أسماء المستخدمين؛ يجب أن يطابق USER_SEARCH_TEXT في user_manager حرفياً
+# حتى يستخدم المخطط الفهرس. pg_trgm إضافة موثوقة منذ PostgreSQL 13 فيكفي مالك قاعدة
+# البيانات لإنشائها؛ إن تعذر ذلك يبقى البحث يعمل بـ LIKE دون فهرس
+USERS_SEARCH_SQL = '''
+DO $$
+BEGIN
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    CREATE INDEX IF NOT EXISTS idx_users_search_trgm ON users USING gin (
+        (lower(COALESCE(username, '') || ' ' || COALESCE(first_name, '') || ' ' || COALESCE(last_name, '')))
+        gin_trgm_ops
+    );
+EXCEPTION WHEN insufficient_privilege OR undefined_file OR feature_not_supported THEN
+    RAISE NOTICE 'pg_trgm unavailable, user search falls back to LIKE: %', SQLERRM;
+END $$;
+'''
+
+# رسائل البث الجماعي؛ last_user_id نقطة الاستئناف (المستخدمون يمرون بترتيب user_id).
+# claimed_by/claimed_at مهلة حجز تجددها كل نقطة حفظ، فلا ترسل نسختان البث نفسه.
+# users.blocked_at منفصل عن is_active (الحظر الإداري): من حظر البوت يستبعد من البث فقط
+BROADCASTS_SQL = '''
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id SERIAL PRIMARY KEY,
+    title VARCHAR(255),
+    message TEXT NOT NULL,
+    parse_mode VARCHAR(16),
+    admin_only BOOLEAN NOT NULL DEFAULT FALSE,
+    status VARCHAR(16) NOT NULL DEFAULT 'pending',
+    last_user_id BIGINT NOT NULL DEFAULT 0,
+    sent INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    blocked INTEGER NOT NULL DEFAULT 0,
+    claimed_by VARCHAR(64),
+    claimed_at TIMESTAMP,
+    created_by BIGINT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_broadcasts_unfinished ON broadcasts(id) WHERE status IN ('pending', 'running');
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS blocked_at TIMESTAMP;
+'''
+
+# claimed_at مهلة حجز: SKIP LOCKED يمنع التعارض أثناء الحجز فقط، وclaimed_at يمنع نسخة أخرى
+# من أخذ الصفوف نفسها أثناء إرسالها، ويعيدها للطابور إذا توقفت النسخة الحاجزة. الفهرس يطابق
+# ترتيب الحجز، وعمودا الجدولة والانتهاء فيه حتى يستبعد الشرطان قبل قراءة الجدول
+NOTIFICATION_DISPATCH_SQL = '''
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP;
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS attempts SMALLINT NOT NULL DEFAULT 0;
+
+CREATE INDEX IF NOT EXISTS idx_notifications_pending
+    ON notifications(priority DESC, created_at, scheduled_at, expires_at)
+    WHERE is_sent = FALSE;
+
+DROP INDEX IF EXISTS idx_notifications_is_sent;
+'''
+
+# عمود يكتبه UserManager (update_user والاستعادة والصلاحيات) ولم يكن في المخطط الأساسي
+USERS_UPDATED_AT_SQL = '''
+ALTER TABLE users ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+'''
+
+# حالة نهائية للإشعار الذي لن يرسل (حظر البوت، انتهت صلاحيته، استنفد المحاولات) حتى يخرج
+# من فهرس الطابور ويحذفه التنظيف، بدلاً من بقائه is_sent = FALSE إلى الأبد
+NOTIFICATION_FAILED_SQL = '''
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS failed_at TIMESTAMP;
+
+UPDATE notifications SET failed_at = CURRENT_TIMESTAMP
+WHERE is_sent = FALSE AND failed_at IS NULL AND expires_at <= CURRENT_TIMESTAMP;
+
+DROP INDEX IF EXISTS idx_notifications_pending;
+CREATE INDEX idx_notifications_pending
+    ON notifications(priority DESC, created_at, scheduled_at, expires_at)
+    WHERE is_sent = FALSE AND failed_at IS NULL;
+'''
+
+# الترتيب مهم: كل خطوة تبني على ما قبلها. لا تعدّل خطوة بعد نشرها، أضف خطوة جديدة
+MIGRATIONS: List[Migration] = [
+    Migration(1, 'baseline schema', BASELINE_SQL),
+    Migration(2, 'task user lists table', TASK_USER_LISTS_SQL),
+    Migration(3, 'statistics daily and monthly rollups', STATISTICS_ROLLUPS_SQL),
+    Migration(4, 'monthly statistics partitions', STATISTICS_PARTITIONS_SQL),
+    Migration(5, 'filter rejection counters', FILTER_REJECTIONS_SQL),
+    Migration(6, 'trigram user search', USERS_SEARCH_SQL),
+    Migration(7, 'broadcasts', BROADCASTS_SQL),
+    Migration(8, 'notification dispatch claims', NOTIFICATION_DISPATCH_SQL),
+    Migration(9, 'users updated_at', USERS_UPDATED_AT_SQL),
+    Migration(10, 'notification failed state', NOTIFICATION_FAILED_SQL),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+# نقل دفعة من statistics_unpartitioned (الترحيل 4) في معاملة قصيرة. الحذف والإدراج معاً
+# يجعلان النقل قابلاً للاستئناف بعد أي توقف، والدمج يجمع ما كتب في الجدول الجديد للساعة نفسها
+BACKFILL_STATISTICS_BATCH = '''
+WITH moved AS (
+    DELETE FROM statistics_unpartitioned
+    WHERE ctid IN (SELECT ctid FROM statistics_unpartitioned LIMIT $1)
+    RETURNING task_id, date, hour, messages_forwarded, messages_filtered, messages_failed,
+              bytes_transferred, processing_time_ms, filter_breakdown, error_breakdown, last_message_time
+)
+INSERT INTO statistics
+    (task_id, date, hour, messages_forwarded, messages_filtered, messages_failed,
+     bytes_transferred, processing_time_ms, filter_breakdown, error_breakdown, last_message_time)
+SELECT * FROM moved
+ON CONFLICT (task_id, date, hour) DO UPDATE SET
+    messages_forwarded = statistics.messages_forwarded + EXCLUDED.messages_forwarded,
+    messages_filtered = statistics.messages_filtered + EXCLUDED.messages_filtered,
+    messages_failed = statistics.messages_failed + EXCLUDED.messages_failed,
+    bytes_transferred = statistics.bytes_transferred + EXCLUDED.bytes_transferred,
+    processing_time_ms = statistics.processing_time_ms + EXCLUDED.processing_time_ms,
+    filter_breakdown = EXCLUDED.filter_breakdown || statistics.filter_breakdown,
+    error_breakdown = EXCLUDED.error_breakdown || statistics.error_breakdown,
+    last_message_time = GREATEST(statistics.last_message_time, EXCLUDED.last_message_time)
+'''
+
+BACKFILL_BATCH_SIZE = 10000
+
+async def get_schema_state(conn: asyncpg.Connection) -> Tuple[int, bool]:
+    """(رقم آخر ترحيل مطبق، هل بقي نقل بيانات معلق) في رحلة واحدة؛ (0, False) قبل أول ترحيل"""
+    try:
+        row = await conn.fetchrow('''
+            SELECT COALESCE(MAX(version), 0) AS version,
+                   to_regclass('statistics_unpartitioned') IS NOT NULL AS backfill_pending
+            FROM schema_version
+        ''')
+        return row['version'], row['backfill_pending']
+    except asyncpg.UndefinedTableError:
+        return 0, False
+
+async def get_schema_version(conn: asyncpg.Connection) -> int:
+    """رقم آخر ترحيل مطبق، أو 0 إذا لم يوجد جدول schema_version بعد"""
+    return (await get_schema_state(conn))[0]
+
+async def needs_migration(conn: asyncpg.Connection) -> bool:
+    version, backfill_pending = await get_schema_state(conn)
+    return version < LATEST_VERSION or backfill_pending
+
+async def backfill_statistics(conn: asyncpg.Connection, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """نقل الإحصائيات القديمة إلى الجدول المقسم على دفعات ثم حذف الجدول القديم.
+
+    الكتابة الجديدة تذهب إلى statistics طوال النقل؛ الشاشات التي تقرأ الفترات القديمة
+    ترى بيانات ناقصة حتى ينتهي. يعيد عدد الصفوف المنقولة.
+    """
+    if await conn.fetchval("SELECT to_regclass('statistics_unpartitioned')") is None:
+        return 0
+
+    moved = 0
+    while True:
+        async with conn.transaction():
+            result = await conn.execute(BACKFILL_STATISTICS_BATCH, batch_size)
+        count = int(result.split()[-1])
+        moved += count
+        if count < batch_size:
+            break
+        logger.info(f"Statistics backfill: {moved} rows moved")
+
+    await conn.execute('DROP TABLE IF EXISTS statistics_unpartitioned')
+    logger.info(f"✅ Statistics backfill complete: {moved} rows")
+    return moved
+
+async def acquire_migration_lock(conn: asyncpg.Connection, wait_seconds: float) -> None:
+    """انتظار القفل الاستشاري بمهلة محددة بدلاً من pg_advisory_lock الذي ينتظر بلا حد
+    أو حتى يقطعه statement_timeout"""
+    deadline = time.monotonic() + wait_seconds
+    while not await conn.fetchval('SELECT pg_try_advisory_lock($1)', MIGRATION_LOCK_ID):
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"Migration lock still held by another instance after {wait_seconds:.0f}s")
+        await asyncio.sleep(MIGRATION_LOCK_POLL_SECONDS)
+
+async def run_migrations(conn: asyncpg.Connection, lock_wait_seconds: float = MIGRATION_LOCK_WAIT_SECONDS) -> int:
+    """تطبيق الترحيلات المعلقة وإرجاع عدد الخطوات المطبقة.
+
+    الإقلاع العادي يكتفي باستعلام واحد للتحقق من الإصدار. عند وجود ترحيلات
+    معلقة يؤخذ قفل استشاري حتى لا تتسابق عدة نسخ تبدأ في الوقت نفسه،
+    ثم يعاد فحص الإصدار لأن نسخة أخرى ربما أنهت الترحيل أثناء الانتظار.
+
+    بعض الخطوات طويلة (نسخ الإحصائيات، بناء فهرس GIN)، فيجب أن يكون الاتصال مخصصاً
+    بدون command_timeout؛ statement_timeout يلغى هنا للجلسة.
+    """
+    if not await needs_migration(conn):
+        return 0
+
+    await conn.execute('SET statement_timeout = 0')
+    await acquire_migration_lock(conn, lock_wait_seconds)
+    try:
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                duration_ms INTEGER
+            )
+        ''')
+        current = await get_schema_version(conn)
+
+        applied = 0
+        for migration in MIGRATIONS:
+            if migration.version <= current:
+                continue
+
+            start = time.perf_counter()
+            async with conn.transaction():
+                await conn.execute(migration.sql)
+                duration_ms = int((time.perf_counter() - start) * 1000)
+                await conn.execute(
+                    'INSERT INTO schema_version (version, name, duration_ms) VALUES ($1, $2, $3)',
+                    migration.version, migration.name, duration_ms
+                )
+            applied += 1
+            logger.info(f"✅ Migration {migration.version} applied: {migration.name} ({duration_ms}ms)")
+
+        # تحت القفل نفسه حتى لا تنقل نسختان الصفوف معاً
+        await backfill_statistics(conn)
+        return applied
+    finally:
+        await conn.execute('SELECT pg_advisory_unlock($1)', MIGRATION_LOCK_ID)
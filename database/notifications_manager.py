@@ -1,6 +1,53 @@
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 from .models import db
+from .queries import queries
+
+# حجز دفعة ذرياً: النسخ المتزامنة تتخطى الصفوف المقفلة بدلاً من انتظارها أو تكرارها
+CLAIM_NOTIFICATIONS = queries.register('notifications.claim', '''
+    UPDATE notifications n
+    SET claimed_at = CURRENT_TIMESTAMP, attempts = n.attempts + 1
+    WHERE n.id IN (
+        SELECT id FROM notifications
+        WHERE is_sent = FALSE AND failed_at IS NULL
+          AND (scheduled_at IS NULL OR scheduled_at <= CURRENT_TIMESTAMP)
+          AND (expires_at IS NULL OR expires_at > CURRENT_TIMESTAMP)
+          AND (claimed_at IS NULL OR claimed_at < CURRENT_TIMESTAMP - $2 * INTERVAL '1 second')
+          AND attempts < $3
+        ORDER BY priority DESC, created_at
+        LIMIT $1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING n.id, n.user_id, n.notification_type, n.title, n.message, n.priority
+''')
+
+MARK_SENT = queries.register('notifications.mark_sent', '''
+    UPDATE notifications
+    SET is_sent = TRUE, sent_at = CURRENT_TIMESTAMP, claimed_at = NULL
+    WHERE id = ANY($1::integer[])
+''')
+
+# إعادة المحاولة مع الدفعة التالية؛ attempts زادت عند الحجز، ومن استنفدها ينتهي فاشلاً
+RELEASE_CLAIMS = queries.register('notifications.release', '''
+    UPDATE notifications
+    SET claimed_at = NULL, failed_at = CASE WHEN attempts >= $2 THEN CURRENT_TIMESTAMP END
+    WHERE id = ANY($1::integer[])
+''')
+
+# لا فائدة من إعادة المحاولة (المستخدم حظر البوت)
+ABANDON = queries.register('notifications.abandon', '''
+    UPDATE notifications SET failed_at = CURRENT_TIMESTAMP, claimed_at = NULL WHERE id = ANY($1::integer[])
+''')
+
+# ما انتهت صلاحيته قبل إرساله، أو استنفد محاولاته وانتهت مهلة حجزه (توقفت النسخة أثناء
+# المحاولة الأخيرة)؛ المحجوز حالياً يتركه لنتيجة الإرسال
+FAIL_DEAD = queries.register('notifications.fail_dead', '''
+    UPDATE notifications
+    SET failed_at = CURRENT_TIMESTAMP, claimed_at = NULL
+    WHERE is_sent = FALSE AND failed_at IS NULL
+      AND (claimed_at IS NULL OR claimed_at < CURRENT_TIMESTAMP - $1 * INTERVAL '1 second')
+      AND (expires_at <= CURRENT_TIMESTAMP OR attempts >= $2)
+''')
 
 class NotificationsManager:
     @staticmethod
@@ -17,7 +64,11 @@ class NotificationsManager:
                     RETURNING id
                 ''', user_id, notification_type, title, message, 
                     data or {}, priority, scheduled_at)
-                return notification_id
+            
+            if scheduled_at is None:
+                from utils.notification_dispatcher import notification_dispatcher
+                notification_dispatcher.wake()
+            return notification_id
         except Exception as e:
             print(f"Error creating notification: {e}")
             return None
@@ -72,14 +123,48 @@ class NotificationsManager:
             print(f"Error marking notification as sent: {e}")
             return False
     
+    @staticmethod
+    async def claim_notifications(limit: int, lease_seconds: int, max_attempts: int) -> List[Dict[str, Any]]:
+        """حجز دفعة من الإشعارات المستحقة (الأعلى أولوية ثم الأقدم) لإرسالها.
+
+        الأخطاء تصل إلى المرسل ليعيد المحاولة؛ ما حجز ولم يؤكد يعود للطابور بعد lease_seconds.
+        على المجمع الرئيسي: bulk_pool قد يكون نسخة قراءة فقط.
+        """
+        async with db.pool.acquire() as conn:
+            rows = await CLAIM_NOTIFICATIONS.fetch(conn, limit, lease_seconds, max_attempts)
+            return [dict(row) for row in rows]
+
+    @staticmethod
+    async def complete_notifications(sent_ids: List[int], failed_ids: List[int],
+                                     abandoned_ids: List[int], max_attempts: int) -> None:
+        """تأكيد نتيجة دفعة في معاملة واحدة: المرسلة تعلم كمرسلة، والفاشلة تعاد للطابور
+        ما لم تستنفد max_attempts، والمتروكة تنتهي فاشلة"""
+        async with db.pool.acquire() as conn:
+            async with conn.transaction():
+                if sent_ids:
+                    await MARK_SENT.execute(conn, sent_ids)
+                if failed_ids:
+                    await RELEASE_CLAIMS.execute(conn, failed_ids, max_attempts)
+                if abandoned_ids:
+                    await ABANDON.execute(conn, abandoned_ids)
+
+    @staticmethod
+    async def fail_dead_notifications(lease_seconds: int, max_attempts: int) -> int:
+        """تعليم الإشعارات التي لن ترسل كفاشلة لتخرج من الطابور؛ يعيد عددها"""
+        async with db.pool.acquire() as conn:
+            result = await FAIL_DEAD.execute(conn, lease_seconds, max_attempts)
+            return int(result.split()[-1]) if result.split() else 0
+
     @staticmethod
     async def get_pending_notifications() -> List[Dict[str, Any]]:
-        """الحصول على الإشعارات المعلقة للإرسال"""
+        """الإشعارات المعلقة للعرض فقط؛ الإرسال يحجز صفوفه عبر claim_notifications"""
         try:
             async with db.pool.acquire() as conn:
                 rows = await conn.fetch('''
-                    SELECT * FROM notifications 
-                    WHERE is_sent = FALSE 
+                    SELECT id, user_id, notification_type, title, priority, scheduled_at, expires_at,
+                           attempts, claimed_at, created_at
+                    FROM notifications 
+                    WHERE is_sent = FALSE AND failed_at IS NULL
                     AND (scheduled_at IS NULL OR scheduled_at <= CURRENT_TIMESTAMP)
                     AND (expires_at IS NULL OR expires_at > CURRENT_TIMESTAMP)
                     ORDER BY priority DESC, created_at ASC
@@ -92,13 +177,13 @@ class NotificationsManager:
     
     @staticmethod
     async def cleanup_old_notifications(days: int = 30) -> int:
-        """تنظيف الإشعارات القديمة"""
+        """تنظيف الإشعارات القديمة: المقروءة والفاشلة (لن ترسل أبداً)"""
         try:
             async with db.pool.acquire() as conn:
                 result = await conn.execute('''
                     DELETE FROM notifications 
                     WHERE created_at < CURRENT_TIMESTAMP - INTERVAL '%s days'
-                    AND is_read = TRUE
+                    AND (is_read = TRUE OR failed_at IS NOT NULL)
                 ''' % days)
                 return int(result.split()[-1]) if result.split() else 0
         except Exception as e:
@@ -108,28 +193,10 @@ class NotificationsManager:
     @staticmethod
     async def create_system_notification(title: str, message: str, 
                                        admin_only: bool = False) -> int:
-        """إنشاء إشعار نظام لجميع المستخدمين أو المديرين فقط"""
-        try:
-            from .user_manager import UserManager
-            users = await UserManager.get_all_users()
-            
-            if admin_only:
-                users = [user for user in users if user.get('is_admin', False)]
-            
-            count = 0
-            for user in users:
-                if user.get('is_active', True):
-                    notification_id = await NotificationsManager.create_notification(
-                        user_id=user['user_id'],
-                        notification_type='system',
-                        title=title,
-                        message=message,
-                        priority=2
-                    )
-                    if notification_id:
-                        count += 1
-            
-            return count
-        except Exception as e:
-            print(f"Error creating system notification: {e}")
-            return 0
+        """إنشاء إشعار نظام لجميع المستخدمين أو المديرين فقط
+
+        يسجل بثاً واحداً يرسله محرك البث على دفعات، بدلاً من صف لكل مستخدم؛ يعيد رقم البث أو 0.
+        """
+        from utils.broadcaster import broadcaster
+        broadcast_id = await broadcaster.enqueue(message, title=title, admin_only=admin_only)
+        return broadcast_id or 0
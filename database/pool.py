@@ -0,0 +1,130 @@
+import os
+import sys
+import time
+import logging
+from typing import Any, Dict, List, Optional
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class AcquireStats:
+    """أزمنة الانتظار والحجز لموضع استدعاء واحد"""
+
+    __slots__ = ('count', 'timeouts', 'wait_total', 'wait_max', 'hold_total', 'hold_max')
+
+    def __init__(self):
+        self.count = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.hold_total = 0.0
+        self.hold_max = 0.0
+
+    def as_dict(self, site: str) -> Dict[str, Any]:
+        count = self.count or 1
+        return {
+            'site': site,
+            'count': self.count,
+            'timeouts': self.timeouts,
+            'wait_avg_ms': self.wait_total / count * 1000,
+            'wait_max_ms': self.wait_max * 1000,
+            'hold_avg_ms': self.hold_total / count * 1000,
+            'hold_max_ms': self.hold_max * 1000
+        }
+
+class InstrumentedPool:
+    """غلاف حول asyncpg.Pool يسجل زمن انتظار الاتصال وزمن حجزه لكل موضع استدعاء.
+
+    يبقى الاستخدام كما هو: async with db.pool.acquire() as conn
+    """
+
+    def __init__(self, pool, name: str = 'default',
+                 acquire_timeout: float = Config.DB_ACQUIRE_TIMEOUT,
+                 slow_acquire_ms: float = Config.DB_SLOW_ACQUIRE_MS):
+        self._pool = pool
+        self.name = name
+        self.acquire_timeout = acquire_timeout
+        self.slow_acquire = slow_acquire_ms / 1000
+        self.sites: Dict[str, AcquireStats] = {}
+
+    def acquire(self, *, timeout: Optional[float] = None) -> '_InstrumentedAcquire':
+        caller = sys._getframe(1)
+        site = f"{os.path.splitext(os.path.basename(caller.f_code.co_filename))[0]}.{caller.f_code.co_name}"
+        return _InstrumentedAcquire(self, site, timeout or self.acquire_timeout)
+
+    async def release(self, conn) -> None:
+        await self._pool.release(conn)
+
+    async def close(self) -> None:
+        await self._pool.close()
+
+    def __getattr__(self, name: str) -> Any:
+        # fetch/execute/get_size... مباشرة على المجمع الأصلي
+        return getattr(self._pool, name)
+
+    def _record(self, site: str, waited: float, held: Optional[float]) -> None:
+        stats = self.sites.get(site)
+        if stats is None:
+            stats = self.sites[site] = AcquireStats()
+
+        if held is None:
+            stats.timeouts += 1
+            return
+
+        stats.count += 1
+        stats.wait_total += waited
+        stats.hold_total += held
+        if waited > stats.wait_max:
+            stats.wait_max = waited
+        if held > stats.hold_max:
+            stats.hold_max = held
+
+    def stats(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """مواضع الاستدعاء مرتبة حسب إجمالي زمن الانتظار"""
+        ordered = sorted(self.sites.items(), key=lambda item: item[1].wait_total, reverse=True)
+        result = [stats.as_dict(site) for site, stats in ordered]
+        return result[:limit] if limit else result
+
+    def usage(self) -> Dict[str, Any]:
+        """حجم المجمع الحالي والاتصالات الخاملة"""
+        return {
+            'name': self.name,
+            'size': self._pool.get_size(),
+            'idle': self._pool.get_idle_size(),
+            'min_size': self._pool.get_min_size(),
+            'max_size': self._pool.get_max_size()
+        }
+
+class _InstrumentedAcquire:
+    __slots__ = ('pool', 'site', 'timeout', 'conn', 'requested_at', 'acquired_at')
+
+    def __init__(self, pool: InstrumentedPool, site: str, timeout: float):
+        self.pool = pool
+        self.site = site
+        self.timeout = timeout
+        self.conn = None
+
+    async def __aenter__(self):
+        self.requested_at = time.perf_counter()
+        try:
+            self.conn = await self.pool._pool.acquire(timeout=self.timeout)
+        except Exception:
+            self.pool._record(self.site, time.perf_counter() - self.requested_at, None)
+            logger.warning(f"Pool '{self.pool.name}' acquire failed at {self.site} "
+                           f"after {time.perf_counter() - self.requested_at:.2f}s")
+            raise
+
+        self.acquired_at = time.perf_counter()
+        waited = self.acquired_at - self.requested_at
+        if waited > self.pool.slow_acquire:
+            logger.warning(f"Pool '{self.pool.name}' slow acquire at {self.site}: {waited * 1000:.0f}ms "
+                           f"(size={self.pool._pool.get_size()}, idle={self.pool._pool.get_idle_size()})")
+        return self.conn
+
+    async def __aexit__(self, exc_type, exc, tb):
+        held = time.perf_counter() - self.acquired_at
+        try:
+            await self.pool._pool.release(self.conn)
+        finally:
+            self.conn = None
+            self.pool._record(self.site, self.acquired_at - self.requested_at, held)
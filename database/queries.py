@@ -0,0 +1,92 @@
+import time
+from typing import Any, Dict, List, Optional
+
+class Query:
+    """استعلام مسجل بنص ثابت ومعاملات $n فقط.
+
+    يخزن asyncpg العبارات المجهزة لكل اتصال حسب نص الاستعلام، لذا فإن
+    تثبيت النص يعني أن الاستعلام يُجهَّز مرة واحدة لكل اتصال ثم يعاد استخدامه.
+    """
+
+    __slots__ = ('name', 'sql', 'calls', 'errors', 'total_time', 'max_time')
+
+    def __init__(self, name: str, sql: str):
+        self.name = name
+        self.sql = sql
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    async def _run(self, method, args, timeout: Optional[float]):
+        start = time.perf_counter()
+        try:
+            return await method(self.sql, *args, timeout=timeout)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.calls += 1
+            self.total_time += elapsed
+            if elapsed > self.max_time:
+                self.max_time = elapsed
+
+    async def execute(self, conn, *args, timeout: Optional[float] = None) -> str:
+        return await self._run(conn.execute, args, timeout)
+
+    async def fetch(self, conn, *args, timeout: Optional[float] = None) -> List[Any]:
+        return await self._run(conn.fetch, args, timeout)
+
+    async def fetchrow(self, conn, *args, timeout: Optional[float] = None) -> Optional[Any]:
+        return await self._run(conn.fetchrow, args, timeout)
+
+    async def fetchval(self, conn, *args, timeout: Optional[float] = None) -> Any:
+        return await self._run(conn.fetchval, args, timeout)
+
+    async def executemany(self, conn, args, timeout: Optional[float] = None) -> None:
+        return await self._run(conn.executemany, (args,), timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'calls': self.calls,
+            'errors': self.errors,
+            'total_ms': self.total_time * 1000,
+            'avg_ms': (self.total_time / self.calls * 1000) if self.calls else 0.0,
+            'max_ms': self.max_time * 1000
+        }
+
+class QueryRegistry:
+    """سجل الاستعلامات الساخنة مع عدد الاستدعاءات وزمن التنفيذ لكل استعلام"""
+
+    def __init__(self):
+        self.queries: Dict[str, Query] = {}
+
+    def register(self, name: str, sql: str) -> Query:
+        """تسجيل استعلام باسم فريد"""
+        if name in self.queries:
+            raise ValueError(f"Query '{name}' is already registered")
+        query = Query(name, sql)
+        self.queries[name] = query
+        return query
+
+    def __len__(self) -> int:
+        return len(self.queries)
+
+    def stats(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """إحصائيات الاستعلامات مرتبة حسب إجمالي الزمن"""
+        stats = sorted(
+            (query.stats() for query in self.queries.values()),
+            key=lambda item: item['total_ms'],
+            reverse=True
+        )
+        return stats[:limit] if limit else stats
+
+    def reset(self) -> None:
+        for query in self.queries.values():
+            query.calls = query.errors = 0
+            query.total_time = query.max_time = 0.0
+
+# Global query registry instance
+queries = QueryRegistry()
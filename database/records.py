@@ -0,0 +1,83 @@
+import ujson
+from typing import Any, Dict, Iterator
+
+# أعمدة جدول المهام بالترتيب المستخدم في الاستعلامات وفي TaskRecord
+TASK_COLUMNS = (
+    'id', 'user_id', 'task_name', 'source_chat_id', 'target_chat_id', 'task_type',
+    'is_active', 'settings', 'created_at', 'updated_at', 'description', 'priority',
+    'last_message_time', 'total_forwarded', 'total_filtered', 'error_count', 'success_rate'
+)
+TASK_SELECT = ', '.join(TASK_COLUMNS)
+
+class TaskRecord:
+    """سجل مهمة بـ __slots__ بدلاً من dict(row)، مع الإبقاء على الوصول task['key']"""
+
+    __slots__ = TASK_COLUMNS
+
+    def __init__(self, id, user_id, task_name, source_chat_id, target_chat_id, task_type,
+                 is_active, settings, created_at, updated_at, description, priority,
+                 last_message_time, total_forwarded, total_filtered, error_count, success_rate):
+        self.id = id
+        self.user_id = user_id
+        self.task_name = task_name
+        self.source_chat_id = source_chat_id
+        self.target_chat_id = target_chat_id
+        self.task_type = task_type
+        self.is_active = is_active
+        self.settings = settings
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.description = description
+        self.priority = priority
+        self.last_message_time = last_message_time
+        self.total_forwarded = total_forwarded
+        self.total_filtered = total_filtered
+        self.error_count = error_count
+        self.success_rate = success_rate
+
+    @classmethod
+    def from_row(cls, row) -> 'TaskRecord':
+        """بناء السجل من صف بأعمدة TASK_COLUMNS (الإعدادات مفكوكة مسبقاً بواسطة codec)"""
+        record = cls(*row)
+        settings = record.settings
+        if settings is None:
+            record.settings = {}
+        elif isinstance(settings, str):
+            # قواعد بيانات قديمة يكون فيها العمود TEXT لا JSONB
+            record.settings = ujson.loads(settings) if settings else {}
+        return record
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key not in TASK_COLUMNS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in TASK_COLUMNS
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(TASK_COLUMNS)
+
+    def __len__(self) -> int:
+        return len(TASK_COLUMNS)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default) if key in TASK_COLUMNS else default
+
+    def keys(self):
+        return TASK_COLUMNS
+
+    def items(self):
+        return ((name, getattr(self, name)) for name in TASK_COLUMNS)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.items())
+
+    def __repr__(self) -> str:
+        return f"TaskRecord(id={self.id!r}, task_name={self.task_name!r})"
@@ -1,6 +1,201 @@
+import numpy as np
 from typing import Dict, Any, List
 from datetime import datetime, date, timedelta
 from .models import db
+from .queries import queries
+from .filter_rejections import filter_rejections
+
+UPSERT_FORWARDED = queries.register('stats.upsert_forwarded', '''
+    INSERT INTO statistics 
+    (task_id, messages_forwarded, bytes_transferred, processing_time_ms, 
+     last_message_time, date, hour)
+    VALUES ($1, 1, $2, $3, CURRENT_TIMESTAMP, CURRENT_DATE, $4)
+    ON CONFLICT (task_id, date, hour)
+    DO UPDATE SET 
+        messages_forwarded = statistics.messages_forwarded + 1,
+        bytes_transferred = statistics.bytes_transferred + $2,
+        processing_time_ms = statistics.processing_time_ms + $3,
+        last_message_time = CURRENT_TIMESTAMP
+''')
+
+TASK_FORWARDED = queries.register('stats.task_forwarded', '''
+    UPDATE forwarding_tasks 
+    SET total_forwarded = total_forwarded + 1,
+        last_message_time = CURRENT_TIMESTAMP,
+        success_rate = (total_forwarded::decimal / GREATEST(total_forwarded + total_filtered, 1)) * 100
+    WHERE id = $1
+''')
+
+UPSERT_FAILED = queries.register('stats.upsert_failed', '''
+    INSERT INTO statistics 
+    (task_id, messages_failed, error_breakdown, date, hour)
+    VALUES ($1, 1, CASE WHEN $2::text IS NULL THEN '{}'::jsonb ELSE jsonb_build_object($2::text, 1) END, CURRENT_DATE, $3)
+    ON CONFLICT (task_id, date, hour)
+    DO UPDATE SET 
+        messages_failed = statistics.messages_failed + 1,
+        error_breakdown = CASE WHEN $2::text IS NULL THEN statistics.error_breakdown
+            ELSE statistics.error_breakdown || jsonb_build_object(
+                $2::text, COALESCE((statistics.error_breakdown ->> $2::text)::integer, 0) + 1)
+        END
+''')
+
+TASK_FAILED = queries.register('stats.task_failed', '''
+    UPDATE forwarding_tasks 
+    SET error_count = error_count + 1
+    WHERE id = $1
+''')
+
+# الأيام المكتملة تقرأ من statistics_daily وما بعد آخر تجميع من الجدول الساعي،
+# فمدة 90 يوماً تعني نحو 90 صفاً لكل مهمة بدلاً من نحو 2160
+ROLLED_THROUGH = '''
+    SELECT COALESCE(MAX(rolled_through), DATE '1970-01-01') AS through
+    FROM statistics_rollup_state WHERE name = 'daily'
+'''
+
+# date - integer يبقى date، فعدد الأيام معامل عادي بدلاً من '%s days'
+DAILY_ROWS = f'''
+    WITH w AS ({ROLLED_THROUGH})
+    SELECT task_id, date, messages_forwarded, messages_filtered, messages_failed,
+           bytes_transferred, processing_time_ms, active_hours, last_message_time
+    FROM statistics_daily, w
+    WHERE task_id = $1 AND date >= CURRENT_DATE - $2::integer AND date <= w.through
+    UNION ALL
+    SELECT task_id, date,
+           SUM(messages_forwarded)::bigint, SUM(messages_filtered)::bigint, SUM(messages_failed)::bigint,
+           SUM(bytes_transferred)::bigint, SUM(processing_time_ms)::bigint, COUNT(*)::integer,
+           MAX(last_message_time)
+    FROM statistics, w
+    WHERE task_id = $1 AND date >= CURRENT_DATE - $2::integer AND date > w.through
+    GROUP BY task_id, date
+'''
+
+TASK_STATS = queries.register('stats.task_stats', f'''
+    {DAILY_ROWS}
+    ORDER BY date DESC
+''')
+
+# الأشهر من statistics_monthly مع الأيام غير المجمعة بعد من الجدول الساعي
+MONTHLY_STATS = queries.register('stats.monthly_stats', f'''
+    WITH w AS ({ROLLED_THROUGH}),
+    months AS (
+        SELECT month, messages_forwarded, messages_filtered, messages_failed,
+               bytes_transferred, processing_time_ms, active_days
+        FROM statistics_monthly
+        WHERE task_id = $1
+          AND month >= (date_trunc('month', CURRENT_DATE) - make_interval(months => $2 - 1))::date
+        UNION ALL
+        SELECT date_trunc('month', date)::date,
+               SUM(messages_forwarded), SUM(messages_filtered), SUM(messages_failed),
+               SUM(bytes_transferred), SUM(processing_time_ms), COUNT(DISTINCT date)
+        FROM statistics, w
+        WHERE task_id = $1 AND date > w.through
+          AND date >= (date_trunc('month', CURRENT_DATE) - make_interval(months => $2 - 1))::date
+        GROUP BY 1
+    )
+    SELECT month,
+           SUM(messages_forwarded)::bigint AS messages_forwarded,
+           SUM(messages_filtered)::bigint AS messages_filtered,
+           SUM(messages_failed)::bigint AS messages_failed,
+           SUM(bytes_transferred)::bigint AS bytes_transferred,
+           SUM(processing_time_ms)::bigint AS processing_time_ms,
+           SUM(active_days)::integer AS active_days
+    FROM months
+    GROUP BY month
+    ORDER BY month DESC
+''')
+
+# العدادات الإجمالية في forwarding_tasks لا تتأثر بحذف الصفوف الساعية القديمة
+USER_STATS = queries.register('stats.user_stats', '''
+    SELECT 
+        COUNT(*) as total_tasks,
+        COUNT(CASE WHEN is_active THEN 1 END) as active_tasks,
+        COALESCE(SUM(total_forwarded), 0) as total_forwarded,
+        COALESCE(SUM(total_filtered), 0) as total_filtered
+    FROM forwarding_tasks
+    WHERE user_id = $1
+''')
+
+HOURLY_STATS = queries.register('stats.hourly_stats', '''
+    SELECT * FROM statistics 
+    WHERE task_id = $1 AND date = $2
+    ORDER BY hour
+''')
+
+PERFORMANCE_METRICS = queries.register('stats.performance_metrics', f'''
+    SELECT 
+        SUM(messages_forwarded) as total_forwarded,
+        SUM(messages_filtered) as total_filtered,
+        SUM(messages_failed) as total_failed,
+        SUM(bytes_transferred) as total_bytes,
+        SUM(processing_time_ms)::decimal / NULLIF(SUM(messages_forwarded), 0) as avg_processing_time,
+        COUNT(DISTINCT date) as active_days
+    FROM ({DAILY_ROWS}) daily
+''')
+
+# عدادات مجمعة في فترات متساوية [$2, $3) بطول $4 ثانية لعدة مهام، والفترات الخالية
+# أصفار من generate_series. النتيجة صف واحد من مصفوفات مرتبة حسب الفترة
+TIME_SERIES = queries.register('stats.time_series', '''
+    WITH buckets AS (
+        SELECT generate_series($2::timestamp, $3::timestamp - make_interval(secs => $4), make_interval(secs => $4)) AS bucket
+    ),
+    counts AS (
+        SELECT $2::timestamp + make_interval(secs => FLOOR(
+                   EXTRACT(EPOCH FROM (s.date + s.hour * INTERVAL '1 hour' - $2::timestamp)) / $4) * $4) AS bucket,
+               SUM(s.messages_forwarded) AS forwarded,
+               SUM(s.messages_filtered) AS filtered,
+               SUM(s.messages_failed) AS failed,
+               SUM(s.processing_time_ms) AS processing_ms
+        FROM statistics s
+        WHERE s.task_id = ANY($1::integer[])
+          AND s.date >= $2::date AND s.date <= $3::date
+          AND s.date + s.hour * INTERVAL '1 hour' >= $2::timestamp
+          AND s.date + s.hour * INTERVAL '1 hour' < $3::timestamp
+        GROUP BY 1
+    )
+    SELECT array_agg(COALESCE(c.forwarded, 0)::bigint ORDER BY b.bucket) AS forwarded,
+           array_agg(COALESCE(c.filtered, 0)::bigint ORDER BY b.bucket) AS filtered,
+           array_agg(COALESCE(c.failed, 0)::bigint ORDER BY b.bucket) AS failed,
+           array_agg(COALESCE(c.processing_ms, 0)::bigint ORDER BY b.bucket) AS processing_ms
+    FROM buckets b
+    LEFT JOIN counts c ON c.bucket = b.bucket
+''')
+
+# أسباب الرفض لعدة مهام؛ المفتاح الأساسي (task_id, date, ...) يغطي الشرطين
+FILTER_REJECTION_TOTALS = queries.register('stats.filter_rejection_totals', '''
+    SELECT reason, SUM(count)::bigint AS count
+    FROM filter_rejections
+    WHERE task_id = ANY($1::integer[]) AND date >= CURRENT_DATE - $2::integer
+    GROUP BY reason
+    ORDER BY count DESC
+''')
+
+# كل أرقام التقرير اليومي في استعلام واحد بدلاً من استعلام لكل مهمة
+DAILY_REPORT = queries.register('stats.daily_report', '''
+    WITH users_summary AS (
+        SELECT 
+            COUNT(*) as total_users,
+            COUNT(*) FILTER (WHERE is_active) as active_users,
+            COUNT(*) FILTER (WHERE created_at >= $1::date AND created_at < $1::date + 1) as new_users,
+            COALESCE(array_agg(user_id) FILTER (WHERE is_admin AND is_active), '{}') as admin_ids
+        FROM users
+    ),
+    tasks_summary AS (
+        SELECT 
+            COUNT(*) as total_tasks,
+            COUNT(*) FILTER (WHERE is_active) as active_tasks
+        FROM forwarding_tasks
+    ),
+    messages_summary AS (
+        SELECT 
+            COALESCE(SUM(messages_forwarded), 0) as forwarded,
+            COALESCE(SUM(messages_filtered), 0) as filtered,
+            COALESCE(SUM(messages_failed), 0) as failed,
+            COUNT(DISTINCT task_id) as tasks_with_traffic
+        FROM statistics
+        WHERE date = $1::date
+    )
+    SELECT * FROM users_summary, tasks_summary, messages_summary
+''')
 
 class StatisticsManager:
     @staticmethod
@@ -8,29 +203,12 @@ class StatisticsManager:
                                 processing_time_ms: int = 0) -> bool:
         """تسجيل رسالة معاد توجيهها مع تفاصيل إضافية"""
         try:
-            async with db.pool.acquire() as conn:
+            async with db.hot_pool.acquire() as conn:
                 current_hour = datetime.now().hour
-                await conn.execute('''
-                    INSERT INTO statistics 
-                    (task_id, messages_forwarded, bytes_transferred, processing_time_ms, 
-                     last_message_time, date, hour)
-                    VALUES ($1, 1, $2, $3, CURRENT_TIMESTAMP, CURRENT_DATE, $4)
-                    ON CONFLICT (task_id, date, hour)
-                    DO UPDATE SET 
-                        messages_forwarded = statistics.messages_forwarded + 1,
-                        bytes_transferred = statistics.bytes_transferred + $2,
-                        processing_time_ms = statistics.processing_time_ms + $3,
-                        last_message_time = CURRENT_TIMESTAMP
-                ''', task_id, bytes_transferred, processing_time_ms, current_hour)
+                await UPSERT_FORWARDED.execute(conn, task_id, bytes_transferred, processing_time_ms, current_hour)
                 
                 # تحديث إجمالي المهمة
-                await conn.execute('''
-                    UPDATE forwarding_tasks 
-                    SET total_forwarded = total_forwarded + 1,
-                        last_message_time = CURRENT_TIMESTAMP,
-                        success_rate = (total_forwarded::decimal / GREATEST(total_forwarded + total_filtered, 1)) * 100
-                    WHERE id = $1
-                ''', task_id)
+                await TASK_FORWARDED.execute(conn, task_id)
                 
                 return True
         except Exception as e:
@@ -39,67 +217,22 @@ class StatisticsManager:
     
     @staticmethod
     async def increment_filtered(task_id: int, filter_type: str = None) -> bool:
-        """تسجيل رسالة مفلترة مع نوع الفلتر"""
-        try:
-            async with db.pool.acquire() as conn:
-                current_hour = datetime.now().hour
-                
-                # تحديث تفاصيل الفلتر
-                filter_breakdown = {}
-                if filter_type:
-                    filter_breakdown[filter_type] = 1
-                
-                await conn.execute('''
-                    INSERT INTO statistics 
-                    (task_id, messages_filtered, filter_breakdown, date, hour)
-                    VALUES ($1, 1, $2, CURRENT_DATE, $3)
-                    ON CONFLICT (task_id, date, hour)
-                    DO UPDATE SET 
-                        messages_filtered = statistics.messages_filtered + 1,
-                        filter_breakdown = statistics.filter_breakdown || $2
-                ''', task_id, filter_breakdown, current_hour)
-                
-                # تحديث إجمالي المهمة
-                await conn.execute('''
-                    UPDATE forwarding_tasks 
-                    SET total_filtered = total_filtered + 1,
-                        success_rate = (total_forwarded::decimal / GREATEST(total_forwarded + total_filtered, 1)) * 100
-                    WHERE id = $1
-                ''', task_id)
-                
-                return True
-        except Exception as e:
-            print(f"Error incrementing filtered: {e}")
-            return False
+        """تسجيل رسالة مفلترة مع سبب الرفض (تكتب دفعة واحدة مع غيرها)"""
+        filter_rejections.add(task_id, filter_type)
+        return True
     
     @staticmethod
     async def increment_failed(task_id: int, error_type: str = None) -> bool:
         """تسجيل رسالة فاشلة مع نوع الخطأ"""
         try:
-            async with db.pool.acquire() as conn:
+            async with db.hot_pool.acquire() as conn:
                 current_hour = datetime.now().hour
                 
-                # تحديث تفاصيل الخطأ
-                error_breakdown = {}
-                if error_type:
-                    error_breakdown[error_type] = 1
-                
-                await conn.execute('''
-                    INSERT INTO statistics 
-                    (task_id, messages_failed, error_breakdown, date, hour)
-                    VALUES ($1, 1, $2, CURRENT_DATE, $3)
-                    ON CONFLICT (task_id, date, hour)
-                    DO UPDATE SET 
-                        messages_failed = statistics.messages_failed + 1,
-                        error_breakdown = statistics.error_breakdown || $2
-                ''', task_id, error_breakdown, current_hour)
+                # زيادة عداد نوع الخطأ داخل error_breakdown
+                await UPSERT_FAILED.execute(conn, task_id, error_type, current_hour)
                 
                 # تحديث عداد الأخطاء في المهمة
-                await conn.execute('''
-                    UPDATE forwarding_tasks 
-                    SET error_count = error_count + 1
-                    WHERE id = $1
-                ''', task_id)
+                await TASK_FAILED.execute(conn, task_id)
                 
                 return True
         except Exception as e:
@@ -110,32 +243,66 @@ class StatisticsManager:
     async def get_task_stats(task_id: int, days: int = 7) -> List[Dict[str, Any]]:
         """Get task statistics for specified days"""
         try:
-            async with db.pool.acquire() as conn:
-                rows = await conn.fetch('''
-                    SELECT * FROM statistics 
-                    WHERE task_id = $1 AND date >= CURRENT_DATE - INTERVAL '%s days'
-                    ORDER BY date DESC
-                ''' % days, task_id)
+            async with db.bulk_pool.acquire() as conn:
+                rows = await TASK_STATS.fetch(conn, task_id, days)
                 return [dict(row) for row in rows]
         except Exception as e:
             print(f"Error getting task stats: {e}")
             return []
     
+    @staticmethod
+    async def get_task_stats_monthly(task_id: int, months: int = 12) -> List[Dict[str, Any]]:
+        """إحصائيات شهرية للفترات الطويلة"""
+        try:
+            async with db.bulk_pool.acquire() as conn:
+                rows = await MONTHLY_STATS.fetch(conn, task_id, months)
+                return [dict(row) for row in rows]
+        except Exception as e:
+            print(f"Error getting monthly task stats: {e}")
+            return []
+    
+    @staticmethod
+    async def get_time_series(task_ids: List[int], start: datetime, end: datetime,
+                              bucket_seconds: int = 3600) -> Dict[str, np.ndarray]:
+        """سلسلة زمنية مجمعة للفترة [start, end) بدقة bucket_seconds (مضاعف للساعة).
+
+        تعيد مصفوفات NumPy متساوية الطول: bucket (بداية كل فترة) و forwarded و filtered و failed
+        و processing_ms (مجموع زمن المعالجة في الفترة). إذا لم يكن المدى مضاعفاً لـ bucket_seconds
+        تسقط الفترة الجزئية الأخيرة، كما في generate_series.
+        المصدر الجدول الساعي، فالمدى المتاح هو فترة الاحتفاظ STATS_HOURLY_RETENTION_DAYS.
+        """
+        try:
+            async with db.bulk_pool.acquire() as conn:
+                row = await TIME_SERIES.fetchrow(conn, task_ids, start, end, bucket_seconds)
+        except Exception as e:
+            print(f"Error getting time series: {e}")
+            return {}
+        
+        # عدد الفترات الكاملة، وهو طول المصفوفات التي يعيدها generate_series
+        count = max(0, int((end - start).total_seconds() // bucket_seconds))
+        series = {'bucket': np.datetime64(start, 's') + np.arange(count) * np.timedelta64(bucket_seconds, 's')}
+        for column in ('forwarded', 'filtered', 'failed', 'processing_ms'):
+            values = row[column] if row and row[column] else None
+            series[column] = np.array(values, dtype=np.int64) if values else np.zeros(count, dtype=np.int64)
+        return series
+    
+    @staticmethod
+    async def get_filter_rejections(task_ids: List[int], days: int = 30) -> Dict[str, int]:
+        """عدد الرسائل المرفوضة لكل سبب خلال آخر days يوماً، الأكثر أولاً"""
+        try:
+            async with db.bulk_pool.acquire() as conn:
+                rows = await FILTER_REJECTION_TOTALS.fetch(conn, task_ids, days)
+                return {row['reason']: row['count'] for row in rows}
+        except Exception as e:
+            print(f"Error getting filter rejections: {e}")
+            return {}
+    
     @staticmethod
     async def get_user_stats(user_id: int) -> Dict[str, Any]:
         """Get overall statistics for user"""
         try:
             async with db.pool.acquire() as conn:
-                result = await conn.fetchrow('''
-                    SELECT 
-                        COUNT(ft.id) as total_tasks,
-                        COUNT(CASE WHEN ft.is_active THEN 1 END) as active_tasks,
-                        COALESCE(SUM(s.messages_forwarded), 0) as total_forwarded,
-                        COALESCE(SUM(s.messages_filtered), 0) as total_filtered
-                    FROM forwarding_tasks ft
-                    LEFT JOIN statistics s ON ft.id = s.task_id
-                    WHERE ft.user_id = $1
-                ''', user_id)
+                result = await USER_STATS.fetchrow(conn, user_id)
                 return dict(result) if result else {}
         except Exception as e:
             print(f"Error getting user stats: {e}")
@@ -145,15 +312,11 @@ class StatisticsManager:
     async def get_hourly_stats(task_id: int, date_filter: date = None) -> List[Dict[str, Any]]:
         """الحصول على إحصائيات بالساعة"""
         try:
-            async with db.pool.acquire() as conn:
+            async with db.bulk_pool.acquire() as conn:
                 if date_filter is None:
                     date_filter = date.today()
                 
-                rows = await conn.fetch('''
-                    SELECT * FROM statistics 
-                    WHERE task_id = $1 AND date = $2
-                    ORDER BY hour
-                ''', task_id, date_filter)
+                rows = await HOURLY_STATS.fetch(conn, task_id, date_filter)
                 return [dict(row) for row in rows]
         except Exception as e:
             print(f"Error getting hourly stats: {e}")
@@ -163,18 +326,8 @@ class StatisticsManager:
     async def get_performance_metrics(task_id: int, days: int = 7) -> Dict[str, Any]:
         """الحصول على مقاييس الأداء"""
         try:
-            async with db.pool.acquire() as conn:
-                result = await conn.fetchrow('''
-                    SELECT 
-                        SUM(messages_forwarded) as total_forwarded,
-                        SUM(messages_filtered) as total_filtered,
-                        SUM(messages_failed) as total_failed,
-                        SUM(bytes_transferred) as total_bytes,
-                        AVG(processing_time_ms) as avg_processing_time,
-                        COUNT(DISTINCT date) as active_days
-                    FROM statistics 
-                    WHERE task_id = $1 AND date >= CURRENT_DATE - INTERVAL '%s days'
-                ''' % days, task_id)
+            async with db.bulk_pool.acquire() as conn:
+                result = await PERFORMANCE_METRICS.fetchrow(conn, task_id, days)
                 
                 if result:
                     metrics = dict(result)
@@ -196,11 +349,22 @@ class StatisticsManager:
             print(f"Error getting performance metrics: {e}")
             return {}
     
+    @staticmethod
+    async def get_daily_report(report_date: date = None) -> Dict[str, Any]:
+        """مجاميع التقرير اليومي (المستخدمون، المهام، الرسائل، معرفات المديرين)"""
+        try:
+            async with db.bulk_pool.acquire() as conn:
+                row = await DAILY_REPORT.fetchrow(conn, report_date or date.today())
+                return dict(row) if row else {}
+        except Exception as e:
+            print(f"Error getting daily report: {e}")
+            return {}
+    
     @staticmethod
     async def get_system_overview() -> Dict[str, Any]:
         """الحصول على نظرة عامة على النظام"""
         try:
-            async with db.pool.acquire() as conn:
+            async with db.bulk_pool.acquire() as conn:
                 # إحصائيات المستخدمين
                 users_stats = await conn.fetchrow('''
                     SELECT 
@@ -0,0 +1,263 @@
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+from config import Config
+from .models import db
+from .queries import queries
+
+logger = logging.getLogger(__name__)
+
+# قفل استشاري للمعاملة حتى لا تجمّع نسختان الأيام نفسها
+ROLLUP_LOCK_ID = 0x7466_7764_726f_6c  # "tfwdrol"
+
+# دمج عدادات JSONB لعدة صفوف: {"links": 2} + {"links": 1} = {"links": 3}
+def _breakdown_totals(table: str, column: str, period: str, where: str) -> str:
+    return f'''
+        SELECT task_id, period, jsonb_object_agg(key, total) AS breakdown
+        FROM (
+            SELECT s.task_id, {period} AS period, b.key, SUM(b.value::bigint) AS total
+            FROM {table} s, jsonb_each_text(s.{column}) b
+            WHERE {where}
+            GROUP BY 1, 2, 3
+        ) k
+        GROUP BY 1, 2
+    '''
+
+ROLLUP_STATE = queries.register('rollup.state', '''
+    SELECT rolled_through FROM statistics_rollup_state WHERE name = 'daily'
+''')
+
+ROLLUP_BOUNDS = queries.register('rollup.bounds', '''
+    SELECT MIN(date) - 1 AS first_day, CURRENT_DATE - 1 AS last_closed_day FROM statistics
+''')
+
+ROLLUP_LOCK = queries.register('rollup.lock', '''
+    SELECT pg_try_advisory_xact_lock($1)
+''')
+
+# الأيام ($1, $2] من الجدول الساعي إلى statistics_daily
+ROLLUP_DAILY = queries.register('rollup.daily', f'''
+    WITH totals AS (
+        SELECT task_id, date,
+               SUM(messages_forwarded) AS messages_forwarded,
+               SUM(messages_filtered) AS messages_filtered,
+               SUM(messages_failed) AS messages_failed,
+               SUM(bytes_transferred) AS bytes_transferred,
+               SUM(processing_time_ms) AS processing_time_ms,
+               COUNT(*) AS active_hours,
+               MAX(last_message_time) AS last_message_time
+        FROM statistics
+        WHERE date > $1 AND date <= $2
+        GROUP BY task_id, date
+    ),
+    filters AS (
+        SELECT task_id, date AS period, jsonb_object_agg(reason, total) AS breakdown
+        FROM (
+            SELECT task_id, date, reason, SUM(count) AS total
+            FROM filter_rejections
+            WHERE date > $1 AND date <= $2
+            GROUP BY 1, 2, 3
+        ) r
+        GROUP BY 1, 2
+    ),
+    errors AS ({_breakdown_totals('statistics', 'error_breakdown', 's.date', 's.date > $1 AND s.date <= $2')})
+    INSERT INTO statistics_daily
+        (task_id, date, messages_forwarded, messages_filtered, messages_failed,
+         bytes_transferred, processing_time_ms, active_hours,
+         filter_breakdown, error_breakdown, last_message_time)
+    SELECT t.task_id, t.date, t.messages_forwarded, t.messages_filtered, t.messages_failed,
+           t.bytes_transferred, t.processing_time_ms, t.active_hours,
+           COALESCE(f.breakdown, '{{}}'), COALESCE(e.breakdown, '{{}}'), t.last_message_time
+    FROM totals t
+    LEFT JOIN filters f ON f.task_id = t.task_id AND f.period = t.date
+    LEFT JOIN errors e ON e.task_id = t.task_id AND e.period = t.date
+    ON CONFLICT (task_id, date) DO UPDATE SET
+        messages_forwarded = EXCLUDED.messages_forwarded,
+        messages_filtered = EXCLUDED.messages_filtered,
+        messages_failed = EXCLUDED.messages_failed,
+        bytes_transferred = EXCLUDED.bytes_transferred,
+        processing_time_ms = EXCLUDED.processing_time_ms,
+        active_hours = EXCLUDED.active_hours,
+        filter_breakdown = EXCLUDED.filter_breakdown,
+        error_breakdown = EXCLUDED.error_breakdown,
+        last_message_time = EXCLUDED.last_message_time
+''')
+
+_MONTH = "date_trunc('month', s.date)::date"
+_IN_MONTH_BOUNDS = "s.date > (SELECT lo FROM bounds) AND s.date <= (SELECT hi FROM bounds)"
+
+# الأشهر التي تلمس الأيام ($1, $2] تعاد من statistics_daily بالكامل
+ROLLUP_MONTHLY = queries.register('rollup.monthly', f'''
+    WITH bounds AS (
+        SELECT date_trunc('month', $1::date + 1)::date - 1 AS lo,
+               (date_trunc('month', $2::date) + INTERVAL '1 month')::date - 1 AS hi
+    ),
+    totals AS (
+        SELECT task_id, date_trunc('month', date)::date AS month,
+               SUM(messages_forwarded) AS messages_forwarded,
+               SUM(messages_filtered) AS messages_filtered,
+               SUM(messages_failed) AS messages_failed,
+               SUM(bytes_transferred) AS bytes_transferred,
+               SUM(processing_time_ms) AS processing_time_ms,
+               COUNT(*) AS active_days,
+               MAX(last_message_time) AS last_message_time
+        FROM statistics_daily, bounds
+        WHERE date > bounds.lo AND date <= bounds.hi
+        GROUP BY 1, 2
+    ),
+    filters AS ({_breakdown_totals('statistics_daily', 'filter_breakdown', _MONTH, _IN_MONTH_BOUNDS)}),
+    errors AS ({_breakdown_totals('statistics_daily', 'error_breakdown', _MONTH, _IN_MONTH_BOUNDS)})
+    INSERT INTO statistics_monthly
+        (task_id, month, messages_forwarded, messages_filtered, messages_failed,
+         bytes_transferred, processing_time_ms, active_days,
+         filter_breakdown, error_breakdown, last_message_time)
+    SELECT t.task_id, t.month, t.messages_forwarded, t.messages_filtered, t.messages_failed,
+           t.bytes_transferred, t.processing_time_ms, t.active_days,
+           COALESCE(f.breakdown, '{{}}'), COALESCE(e.breakdown, '{{}}'), t.last_message_time
+    FROM totals t
+    LEFT JOIN filters f ON f.task_id = t.task_id AND f.period = t.month
+    LEFT JOIN errors e ON e.task_id = t.task_id AND e.period = t.month
+    ON CONFLICT (task_id, month) DO UPDATE SET
+        messages_forwarded = EXCLUDED.messages_forwarded,
+        messages_filtered = EXCLUDED.messages_filtered,
+        messages_failed = EXCLUDED.messages_failed,
+        bytes_transferred = EXCLUDED.bytes_transferred,
+        processing_time_ms = EXCLUDED.processing_time_ms,
+        active_days = EXCLUDED.active_days,
+        filter_breakdown = EXCLUDED.filter_breakdown,
+        error_breakdown = EXCLUDED.error_breakdown,
+        last_message_time = EXCLUDED.last_message_time
+''')
+
+SAVE_ROLLUP_STATE = queries.register('rollup.save_state', '''
+    INSERT INTO statistics_rollup_state (name, rolled_through, updated_at)
+    VALUES ('daily', $1, CURRENT_TIMESTAMP)
+    ON CONFLICT (name) DO UPDATE SET rolled_through = $1, updated_at = CURRENT_TIMESTAMP
+''')
+
+# عدادات أسباب الرفض تتبع فترة احتفاظ الجدول الساعي
+PRUNE_FILTER_REJECTIONS = queries.register('rollup.prune_filter_rejections', '''
+    DELETE FROM filter_rejections WHERE date < $1
+''')
+
+# أقسام statistics الشهرية بالاسم statistics_pYYYY_MM
+LIST_PARTITIONS = queries.register('rollup.list_partitions', '''
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'statistics'::regclass
+    ORDER BY c.relname
+''')
+
+PARTITION_PREFIX = 'statistics_p'
+
+def _partition_name(month_start: date) -> str:
+    return f"{PARTITION_PREFIX}{month_start:%Y_%m}"
+
+def _partition_month(name: str) -> Optional[date]:
+    try:
+        return datetime.strptime(name[len(PARTITION_PREFIX):], '%Y_%m').date()
+    except ValueError:
+        return None
+
+def _next_month(month_start: date) -> date:
+    return (month_start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+class StatisticsRollup:
+    """تجميع الإحصائيات الساعية إلى جداول يومية وشهرية وصيانة أقسام الجدول الساعي"""
+
+    @staticmethod
+    async def rollup() -> int:
+        """تجميع الأيام المكتملة منذ آخر تشغيل؛ يعيد عدد الأيام المجمعة"""
+        rolled_days = 0
+        async with db.pool.acquire() as conn:
+            while True:
+                async with conn.transaction():
+                    if not await ROLLUP_LOCK.fetchval(conn, ROLLUP_LOCK_ID):
+                        logger.info("Statistics rollup already running elsewhere")
+                        return rolled_days
+                    await conn.execute(f"SET LOCAL statement_timeout = {Config.DB_BULK_STATEMENT_TIMEOUT_MS}")
+
+                    bounds = await ROLLUP_BOUNDS.fetchrow(conn)
+                    through = await ROLLUP_STATE.fetchval(conn) or bounds['first_day']
+                    last_closed_day = bounds['last_closed_day']
+                    if through is None or through >= last_closed_day:
+                        return rolled_days
+
+                    upto = min(through + timedelta(days=Config.STATS_ROLLUP_BATCH_DAYS), last_closed_day)
+                    await ROLLUP_DAILY.execute(conn, through, upto)
+                    await ROLLUP_MONTHLY.execute(conn, through, upto)
+                    await SAVE_ROLLUP_STATE.execute(conn, upto)
+
+                rolled_days += (upto - through).days
+                logger.info(f"Statistics rolled up through {upto}")
+
+    @staticmethod
+    async def ensure_partitions() -> int:
+        """إنشاء أقسام الشهر الحالي والأشهر القادمة إن لم تكن موجودة"""
+        created = 0
+        async with db.pool.acquire() as conn:
+            existing = {row['relname'] for row in await LIST_PARTITIONS.fetch(conn)}
+            month_start = date.today().replace(day=1)
+            for _ in range(Config.STATS_PARTITIONS_AHEAD + 1):
+                name = _partition_name(month_start)
+                if name not in existing:
+                    await conn.execute(
+                        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF statistics "
+                        f"FOR VALUES FROM ('{month_start}') TO ('{_next_month(month_start)}')"
+                    )
+                    created += 1
+                    logger.info(f"Created statistics partition {name}")
+                month_start = _next_month(month_start)
+        return created
+
+    @staticmethod
+    async def drop_expired_partitions() -> int:
+        """فصل وحذف الأقسام الشهرية التي انتهت فترة احتفاظها وتم تجميعها بالكامل،
+        وحذف عدادات أسباب الرفض الأقدم من الفترة نفسها"""
+        dropped = 0
+        async with db.pool.acquire() as conn:
+            through = await ROLLUP_STATE.fetchval(conn)
+            if through is None:
+                return 0
+
+            cutoff = min(date.today() - timedelta(days=Config.STATS_HOURLY_RETENTION_DAYS),
+                         through + timedelta(days=1))
+
+            for row in await LIST_PARTITIONS.fetch(conn):
+                month_start = _partition_month(row['relname'])
+                if month_start is None or _next_month(month_start) > cutoff:
+                    continue
+
+                async with conn.transaction():
+                    await conn.execute(f"ALTER TABLE statistics DETACH PARTITION {row['relname']}")
+                    await conn.execute(f"DROP TABLE {row['relname']}")
+                dropped += 1
+                logger.info(f"Dropped statistics partition {row['relname']}")
+
+            await PRUNE_FILTER_REJECTIONS.execute(conn, cutoff)
+
+        return dropped
+
+    @staticmethod
+    async def run_once() -> Dict[str, int]:
+        created_partitions = await StatisticsRollup.ensure_partitions()
+        rolled_days = await StatisticsRollup.rollup()
+        dropped_partitions = await StatisticsRollup.drop_expired_partitions()
+        return {
+            'created_partitions': created_partitions,
+            'rolled_days': rolled_days,
+            'dropped_partitions': dropped_partitions
+        }
+
+    @staticmethod
+    async def schedule_rollups():
+        """صيانة الأقسام والتجميع دورياً في الخلفية"""
+        while True:
+            try:
+                await StatisticsRollup.run_once()
+            except Exception as e:
+                logger.error(f"Error in statistics rollup: {e}")
+
+            await asyncio.sleep(Config.STATS_ROLLUP_INTERVAL_SECONDS)
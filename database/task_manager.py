@@ -1,7 +1,58 @@
-import json
-from typing import Optional, List, Dict, Any, Tuple
+from typing import Optional, List, Dict, Any, Set, Tuple
 from datetime import datetime
 from .models import db
+from .queries import queries
+from .records import TaskRecord, TASK_SELECT
+from utils.user_id_set import UserIdSet
+
+GET_TASK = queries.register(
+    'tasks.get', f'SELECT {TASK_SELECT} FROM forwarding_tasks WHERE id = $1'
+)
+GET_USER_TASKS = queries.register(
+    'tasks.by_user',
+    f'SELECT {TASK_SELECT} FROM forwarding_tasks WHERE user_id = $1 ORDER BY created_at DESC'
+)
+GET_ACTIVE_TASKS = queries.register(
+    'tasks.active', f'SELECT {TASK_SELECT} FROM forwarding_tasks WHERE is_active = TRUE'
+)
+UPDATE_SETTINGS = queries.register('tasks.update_settings', '''
+    UPDATE forwarding_tasks 
+    SET settings = $1, updated_at = CURRENT_TIMESTAMP 
+    WHERE id = $2
+''')
+# NULL يعني عكس الحالة الحالية، في جولة واحدة بدلاً من SELECT ثم UPDATE
+TOGGLE_TASK = queries.register('tasks.toggle', '''
+    UPDATE forwarding_tasks SET is_active = COALESCE($2, NOT is_active) WHERE id = $1
+''')
+ADD_LIST_USER = queries.register('user_lists.add', '''
+    INSERT INTO task_user_lists (task_id, list_type, user_id)
+    VALUES ($1, $2, $3)
+    ON CONFLICT DO NOTHING
+''')
+REMOVE_LIST_USER = queries.register('user_lists.remove', '''
+    DELETE FROM task_user_lists
+    WHERE task_id = $1 AND list_type = $2 AND user_id = $3
+''')
+GET_LIST_PAGE = queries.register('user_lists.page', '''
+    SELECT user_id FROM task_user_lists
+    WHERE task_id = $1 AND list_type = $2
+    ORDER BY user_id
+    LIMIT $3 OFFSET $4
+''')
+COUNT_LISTS = queries.register('user_lists.counts', '''
+    SELECT list_type, COUNT(*) AS total FROM task_user_lists
+    WHERE task_id = $1
+    GROUP BY list_type
+''')
+TASKS_WITH_LISTS = queries.register('user_lists.tasks_with_lists', '''
+    SELECT DISTINCT task_id FROM task_user_lists
+    WHERE task_id = ANY($1::int[])
+''')
+LOAD_LISTS = queries.register('user_lists.load', '''
+    SELECT task_id, list_type, user_id FROM task_user_lists
+    WHERE task_id = ANY($1::int[])
+    ORDER BY task_id, list_type, user_id
+''')
 
 class TaskManager:
     @staticmethod
@@ -19,44 +70,30 @@ class TaskManager:
                     (user_id, task_name, source_chat_id, target_chat_id, task_type, settings)
                     VALUES ($1, $2, $3, $4, $5, $6)
                     RETURNING id
-                ''', user_id, task_name, source_chat_id, target_chat_id, task_type, json.dumps(settings))
+                ''', user_id, task_name, source_chat_id, target_chat_id, task_type, settings)
                 return task_id
         except Exception as e:
             print(f"Error creating task: {e}")
             return None
     
     @staticmethod
-    async def get_task(task_id: int) -> Optional[Dict[str, Any]]:
+    async def get_task(task_id: int) -> Optional[TaskRecord]:
         """Get task by ID"""
         try:
             async with db.pool.acquire() as conn:
-                row = await conn.fetchrow(
-                    'SELECT * FROM forwarding_tasks WHERE id = $1', task_id
-                )
-                if row:
-                    task = dict(row)
-                    task['settings'] = json.loads(task['settings']) if task['settings'] else {}
-                    return task
-                return None
+                row = await GET_TASK.fetchrow(conn, task_id)
+                return TaskRecord.from_row(row) if row else None
         except Exception as e:
             print(f"Error getting task: {e}")
             return None
     
     @staticmethod
-    async def get_user_tasks(user_id: int) -> List[Dict[str, Any]]:
+    async def get_user_tasks(user_id: int) -> List[TaskRecord]:
         """Get all tasks for a user"""
         try:
             async with db.pool.acquire() as conn:
-                rows = await conn.fetch(
-                    'SELECT * FROM forwarding_tasks WHERE user_id = $1 ORDER BY created_at DESC',
-                    user_id
-                )
-                tasks = []
-                for row in rows:
-                    task = dict(row)
-                    task['settings'] = json.loads(task['settings']) if task['settings'] else {}
-                    tasks.append(task)
-                return tasks
+                rows = await GET_USER_TASKS.fetch(conn, user_id)
+                return [TaskRecord.from_row(row) for row in rows]
         except Exception as e:
             print(f"Error getting user tasks: {e}")
             return []
@@ -66,11 +103,7 @@ class TaskManager:
         """Update task settings"""
         try:
             async with db.pool.acquire() as conn:
-                await conn.execute('''
-                    UPDATE forwarding_tasks 
-                    SET settings = $1, updated_at = CURRENT_TIMESTAMP 
-                    WHERE id = $2
-                ''', json.dumps(settings), task_id)
+                await UPDATE_SETTINGS.execute(conn, settings, task_id)
                 return True
         except Exception as e:
             print(f"Error updating task settings: {e}")
@@ -81,17 +114,7 @@ class TaskManager:
         """Toggle task active status"""
         try:
             async with db.pool.acquire() as conn:
-                if is_active is None:
-                    # Toggle current status
-                    current_status = await conn.fetchval(
-                        'SELECT is_active FROM forwarding_tasks WHERE id = $1', task_id
-                    )
-                    is_active = not current_status
-                
-                await conn.execute(
-                    'UPDATE forwarding_tasks SET is_active = $1 WHERE id = $2',
-                    is_active, task_id
-                )
+                await TOGGLE_TASK.execute(conn, task_id, is_active)
                 return True
         except Exception as e:
             print(f"Error toggling task: {e}")
@@ -109,19 +132,12 @@ class TaskManager:
             return False
     
     @staticmethod
-    async def get_active_tasks() -> List[Dict[str, Any]]:
+    async def get_active_tasks() -> List[TaskRecord]:
         """Get all active tasks"""
         try:
-            async with db.pool.acquire() as conn:
-                rows = await conn.fetch(
-                    'SELECT * FROM forwarding_tasks WHERE is_active = TRUE'
-                )
-                tasks = []
-                for row in rows:
-                    task = dict(row)
-                    task['settings'] = json.loads(task['settings']) if task['settings'] else {}
-                    tasks.append(task)
-                return tasks
+            async with db.hot_pool.acquire() as conn:
+                rows = await GET_ACTIVE_TASKS.fetch(conn)
+                return [TaskRecord.from_row(row) for row in rows]
         except Exception as e:
             print(f"Error getting active tasks: {e}")
             return []
@@ -150,7 +166,7 @@ class TaskManager:
                         VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
                         RETURNING id
                     ''', user_id, task_name, description, source_chat_id, target_chat_id, 
-                        task_type, priority, json.dumps(settings))
+                        task_type, priority, settings)
                     
                     # إضافة الفلاتر
                     for filter_data in filters:
@@ -159,7 +175,7 @@ class TaskManager:
                             (task_id, filter_category, filter_type, filter_value, filter_config)
                             VALUES ($1, $2, $3, $4, $5)
                         ''', task_id, filter_data.get('category'), filter_data.get('type'),
-                            filter_data.get('value'), json.dumps(filter_data.get('config', {})))
+                            filter_data.get('value'), filter_data.get('config', {}))
                     
                     # تحديث عداد المهام للمستخدم
                     await conn.execute('''
@@ -180,14 +196,13 @@ class TaskManager:
             async with db.pool.acquire() as conn:
                 # الحصول على المهمة
                 task_row = await conn.fetchrow(
-                    'SELECT * FROM forwarding_tasks WHERE id = $1', task_id
+                    f'SELECT {TASK_SELECT} FROM forwarding_tasks WHERE id = $1', task_id
                 )
                 
                 if not task_row:
                     return None
                 
-                task = dict(task_row)
-                task['settings'] = json.loads(task['settings']) if task['settings'] else {}
+                task = TaskRecord.from_row(task_row).to_dict()
                 
                 # الحصول على الفلاتر
                 filters_rows = await conn.fetch(
@@ -198,7 +213,7 @@ class TaskManager:
                 task['filters'] = []
                 for filter_row in filters_rows:
                     filter_data = dict(filter_row)
-                    filter_data['filter_config'] = json.loads(filter_data['filter_config']) if filter_data['filter_config'] else {}
+                    filter_data['filter_config'] = filter_data['filter_config'] or {}
                     task['filters'].append(filter_data)
                 
                 return task
@@ -219,7 +234,7 @@ class TaskManager:
                     VALUES ($1, $2, $3, $4, $5, $6)
                     RETURNING id
                 ''', task_id, filter_category, filter_type, filter_value,
-                    json.dumps(filter_config or {}), priority)
+                    filter_config or {}, priority)
                 
                 # تحديث وقت تعديل المهمة
                 await conn.execute(
@@ -353,18 +368,21 @@ class TaskManager:
             return False
 
     @staticmethod
-    async def update_user_lists(task_id: int, whitelist: List[int], 
+    async def update_user_lists(task_id: int, whitelist: List[int],
                               blacklist: List[int]) -> bool:
-        """تحديث القوائم البيضاء والسوداء"""
+        """تحديث القوائم البيضاء والسوداء (استبدال كامل)"""
         try:
-            task = await TaskManager.get_task(task_id)
-            if not task:
-                return False
-            
-            settings = task['settings']
-            settings['whitelist'] = whitelist
-            settings['blacklist'] = blacklist
-            return await TaskManager.update_task_settings(task_id, settings)
+            async with db.pool.acquire() as conn:
+                async with conn.transaction():
+                    await conn.execute(
+                        'DELETE FROM task_user_lists WHERE task_id = $1', task_id
+                    )
+                    await ADD_LIST_USER.executemany(
+                        conn,
+                        [(task_id, 'whitelist', user_id) for user_id in whitelist] +
+                        [(task_id, 'blacklist', user_id) for user_id in blacklist]
+                    )
+                return True
         except Exception as e:
             print(f"Error updating user lists: {e}")
             return False
@@ -373,19 +391,9 @@ class TaskManager:
     async def add_to_list(task_id: int, user_id: int, list_type: str) -> bool:
         """إضافة مستخدم لقائمة (whitelist أو blacklist)"""
         try:
-            task = await TaskManager.get_task(task_id)
-            if not task:
-                return False
-            
-            settings = task['settings']
-            current_list = settings.get(list_type, [])
-            
-            if user_id not in current_list:
-                current_list.append(user_id)
-                settings[list_type] = current_list
-                return await TaskManager.update_task_settings(task_id, settings)
-            
-            return True
+            async with db.pool.acquire() as conn:
+                await ADD_LIST_USER.execute(conn, task_id, list_type, user_id)
+                return True
         except Exception as e:
             print(f"Error adding to {list_type}: {e}")
             return False
@@ -394,23 +402,85 @@ class TaskManager:
     async def remove_from_list(task_id: int, user_id: int, list_type: str) -> bool:
         """حذف مستخدم من قائمة"""
         try:
-            task = await TaskManager.get_task(task_id)
-            if not task:
-                return False
-            
-            settings = task['settings']
-            current_list = settings.get(list_type, [])
-            
-            if user_id in current_list:
-                current_list.remove(user_id)
-                settings[list_type] = current_list
-                return await TaskManager.update_task_settings(task_id, settings)
-            
-            return True
+            async with db.pool.acquire() as conn:
+                await REMOVE_LIST_USER.execute(conn, task_id, list_type, user_id)
+                return True
         except Exception as e:
             print(f"Error removing from {list_type}: {e}")
             return False
 
+    @staticmethod
+    async def clear_user_list(task_id: int, list_type: str) -> bool:
+        """مسح قائمة كاملة"""
+        try:
+            async with db.pool.acquire() as conn:
+                await conn.execute(
+                    'DELETE FROM task_user_lists WHERE task_id = $1 AND list_type = $2',
+                    task_id, list_type
+                )
+                return True
+        except Exception as e:
+            print(f"Error clearing {list_type}: {e}")
+            return False
+
+    @staticmethod
+    async def get_user_list(task_id: int, list_type: str, limit: int = 10,
+                            offset: int = 0) -> List[int]:
+        """الحصول على صفحة من معرفات قائمة مرتبة"""
+        try:
+            async with db.pool.acquire() as conn:
+                rows = await GET_LIST_PAGE.fetch(conn, task_id, list_type, limit, offset)
+                return [row['user_id'] for row in rows]
+        except Exception as e:
+            print(f"Error getting {list_type}: {e}")
+            return []
+
+    @staticmethod
+    async def get_user_list_counts(task_id: int) -> Dict[str, int]:
+        """عدد المستخدمين في كل قائمة"""
+        counts = {'whitelist': 0, 'blacklist': 0}
+        try:
+            async with db.pool.acquire() as conn:
+                rows = await COUNT_LISTS.fetch(conn, task_id)
+                for row in rows:
+                    counts[row['list_type']] = row['total']
+        except Exception as e:
+            print(f"Error counting user lists: {e}")
+        return counts
+
+    @staticmethod
+    async def get_tasks_with_user_lists(task_ids: List[int]) -> Set[int]:
+        """المهام التي لديها قائمة بيضاء أو سوداء غير فارغة"""
+        try:
+            async with db.pool.acquire() as conn:
+                rows = await TASKS_WITH_LISTS.fetch(conn, task_ids)
+                return {row['task_id'] for row in rows}
+        except Exception as e:
+            print(f"Error checking task user lists: {e}")
+            return set()
+
+    @staticmethod
+    async def get_task_user_lists(task_ids: List[int]) -> Dict[int, Dict[str, UserIdSet]]:
+        """تحميل قوائم عدة مهام دفعة واحدة كمجموعات مرتبة مضغوطة"""
+        grouped: Dict[int, Dict[str, List[int]]] = {}
+        try:
+            async with db.hot_pool.acquire() as conn:
+                rows = await LOAD_LISTS.fetch(conn, task_ids)
+                for row in rows:
+                    grouped.setdefault(row['task_id'], {}).setdefault(
+                        row['list_type'], []
+                    ).append(row['user_id'])
+        except Exception as e:
+            print(f"Error loading task user lists: {e}")
+
+        return {
+            task_id: {
+                list_type: UserIdSet.from_sorted(user_ids)
+                for list_type, user_ids in lists.items()
+            }
+            for task_id, lists in grouped.items()
+        }
+
     @staticmethod
     async def validate_task_creation(user_id: int, task_name: str, source_chat_id: int, target_chat_id: int) -> Tuple[bool, str]:
         """التحقق من إمكانية إنشاء المهمة"""
@@ -546,7 +616,6 @@ class TaskManager:
             # الحصول على القيم القديمة للتسجيل
             task = await TaskManager.get_task(task_id)
             old_blocked = task['settings'].get('blocked_words', [])
-            old_required = task['settings'].get('required_words', [])  [])
             old_required = task['settings'].get('required_words', [])
             
             # تحديث الفلاتر
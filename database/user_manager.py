@@ -1,5 +1,123 @@
 import asyncpg
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
+from config import Config
+from utils.cache import LRUCache
+from .models import db
+from .queries import queries
+
+CREATE_USER = queries.register('users.create', '''
+    INSERT INTO users (user_id, username, first_name, last_name) 
+    VALUES ($1, $2, $3, $4)
+    ON CONFLICT (user_id) DO NOTHING
+''')
+GET_USER = queries.register('users.get', 'SELECT * FROM users WHERE user_id = $1')
+
+CREATE_OR_UPDATE_USER = queries.register('users.create_or_update', '''
+    INSERT INTO users (user_id, username, first_name, last_name) 
+    VALUES ($1, $2, $3, $4)
+    ON CONFLICT (user_id) DO UPDATE
+    SET username = EXCLUDED.username,
+        first_name = EXCLUDED.first_name,
+        last_name = EXCLUDED.last_name,
+        last_activity = CURRENT_TIMESTAMP,
+        updated_at = CURRENT_TIMESTAMP,
+        blocked_at = NULL
+    RETURNING (xmax = 0) AS created
+''')
+
+USER_PERMISSIONS = queries.register('users.permissions', '''
+    SELECT is_admin, is_active FROM users WHERE user_id = $1
+''')
+
+SET_ADMIN = queries.register('users.set_admin', '''
+    UPDATE users 
+    SET is_admin = $2, updated_at = CURRENT_TIMESTAMP
+    WHERE user_id = $1
+    RETURNING user_id
+''')
+
+SET_ACTIVE = queries.register('users.set_active', '''
+    UPDATE users 
+    SET is_active = $2, updated_at = CURRENT_TIMESTAMP
+    WHERE user_id = $1
+    RETURNING user_id
+''')
+INCREMENT_MESSAGES_FORWARDED = queries.register('users.increment_forwarded', '''
+    UPDATE users 
+    SET total_messages_forwarded = total_messages_forwarded + 1
+    WHERE user_id = $1
+''')
+
+# تصفح بمؤشر على المفتاح الأساسي: كل صفحة قراءة فهرس محدودة مهما كان عدد المستخدمين
+USERS_PAGE_AFTER = queries.register('users.page_after', '''
+    SELECT user_id, username, first_name, is_admin, is_active, last_activity
+    FROM users
+    WHERE user_id > $1
+    ORDER BY user_id
+    LIMIT $2
+''')
+
+USERS_PAGE_BEFORE = queries.register('users.page_before', '''
+    SELECT user_id, username, first_name, is_admin, is_active, last_activity
+    FROM users
+    WHERE user_id < $1
+    ORDER BY user_id DESC
+    LIMIT $2
+''')
+
+USER_COUNTS = queries.register('users.counts', '''
+    SELECT 
+        COUNT(*) AS total_users,
+        COUNT(*) FILTER (WHERE is_active) AS active_users,
+        COUNT(*) FILTER (WHERE is_admin) AS admin_users,
+        COUNT(*) FILTER (WHERE created_at >= CURRENT_DATE) AS new_today,
+        COUNT(*) FILTER (WHERE created_at >= CURRENT_DATE - 7) AS new_week,
+        COUNT(*) FILTER (WHERE created_at >= CURRENT_DATE - 30) AS new_month,
+        COUNT(*) FILTER (WHERE last_activity >= CURRENT_DATE) AS active_today,
+        COUNT(*) FILTER (WHERE last_activity >= CURRENT_DATE - 7) AS active_week
+    FROM users
+''')
+
+# الفهرس الجزئي idx_users_is_admin يغطي الاستعلامين
+ADMIN_IDS = queries.register('users.admin_ids', '''
+    SELECT user_id FROM users WHERE is_admin AND is_active ORDER BY user_id
+''')
+
+ADMINS = queries.register('users.admins', '''
+    SELECT user_id, username, first_name, is_active
+    FROM users
+    WHERE is_admin
+    ORDER BY user_id
+''')
+
+# التعبير نفسه المفهرس بـ idx_users_search_trgm (الترحيل 6)
+USER_SEARCH_TEXT = "lower(COALESCE(username, '') || ' ' || COALESCE(first_name, '') || ' ' || COALESCE(last_name, ''))"
+
+# word_similarity يطابق جزءاً من الاسم مع تحمل الأخطاء الإملائية، و<% يستخدم فهرس GIN
+SEARCH_USERS = queries.register('users.search', f'''
+    SELECT user_id, username, first_name, last_name, is_admin, is_active,
+           word_similarity($1, {USER_SEARCH_TEXT}) AS score
+    FROM users
+    WHERE $1 <% {USER_SEARCH_TEXT}
+    ORDER BY score DESC, user_id
+    LIMIT $2
+''')
+
+# للكلمات القصيرة (أقل من 3 أحرف لا تكوّن ثلاثيات كافية) أو عند غياب pg_trgm
+SEARCH_USERS_LIKE = queries.register('users.search_like', f'''
+    SELECT user_id, username, first_name, last_name, is_admin, is_active
+    FROM users
+    WHERE {USER_SEARCH_TEXT} LIKE '%' || $1 || '%'
+    ORDER BY user_id
+    LIMIT $2
+''')
+
+# مجاميع المستخدمين تتغير ببطء؛ العدّ الكامل مرة كل USER_COUNTS_CACHE_SECONDS
+user_counts_cache = LRUCache(max_entries=1, ttl=Config.USER_COUNTS_CACHE_SECONDS)
+
+# صلاحيات كل مستخدم (مدير، نشط/محظور) لفحوص الأزرار؛ تلغى صراحة عند كل تعديل في هذه
+# العملية، وTTL يحد من قدم البيانات إذا عدلت من خارجها
+permissions_cache = LRUCache(max_entries=Config.PERMISSION_CACHE_MAX_ENTRIES, ttl=Config.PERMISSION_CACHE_SECONDS)
 
 class UserManager:
     """
@@ -11,11 +129,7 @@ class UserManager:
         """Creates a new user in the database."""
         try:
             async with db.pool.acquire() as conn:
-                await conn.execute('''
-                    INSERT INTO users (user_id, username, first_name, last_name) 
-                    VALUES ($1, $2, $3, $4)
-                    ON CONFLICT (user_id) DO NOTHING
-                ''', user_id, username, first_name, last_name)
+                await CREATE_USER.execute(conn, user_id, username, first_name, last_name)
                 return True
         except Exception as e:
             print(f"Error creating user: {e}")
@@ -26,14 +140,28 @@ class UserManager:
         """Retrieves a user from the database by user ID."""
         try:
             async with db.pool.acquire() as conn:
-                user = await conn.fetchrow('''
-                    SELECT * FROM users WHERE user_id = $1
-                ''', user_id)
+                user = await GET_USER.fetchrow(conn, user_id)
                 return dict(user) if user else None
         except Exception as e:
             print(f"Error getting user: {e}")
             return None
 
+    @staticmethod
+    async def create_or_update_user(user_id: int, username: Optional[str], first_name: Optional[str],
+                                    last_name: Optional[str]) -> bool:
+        """إنشاء المستخدم أو تحديث بياناته ووقت آخر نشاط؛ عودته تعيده إلى قائمة البث"""
+        try:
+            async with db.pool.acquire() as conn:
+                created = await CREATE_OR_UPDATE_USER.fetchval(conn, user_id, username, first_name, last_name)
+        except Exception as e:
+            print(f"Error creating or updating user: {e}")
+            return False
+        
+        if created:
+            # قد يكون مخزناً كمستخدم غير موجود
+            UserManager._permissions_changed(user_id)
+        return True
+
     @staticmethod
     async def update_user(user_id: int, username: str, first_name: str, last_name: str) -> bool:
         """Updates an existing user in the database."""
@@ -57,7 +185,8 @@ class UserManager:
                 await conn.execute('''
                     DELETE FROM users WHERE user_id = $1
                 ''', user_id)
-                return True
+            UserManager._permissions_changed(user_id)
+            return True
         except Exception as e:
             print(f"Error deleting user: {e}")
             return False
@@ -75,6 +204,170 @@ class UserManager:
             print(f"Error getting all users: {e}")
             return []
 
+    @staticmethod
+    async def get_users_page(after: Optional[int] = None, before: Optional[int] = None,
+                             limit: int = 5) -> Tuple[List[dict], bool]:
+        """صفحة مستخدمين مرتبة حسب user_id بعد after أو قبل before.
+
+        تعيد (المستخدمين بترتيب تصاعدي، هل توجد صفحة أخرى في اتجاه التصفح).
+        """
+        try:
+            async with db.pool.acquire() as conn:
+                if before is not None:
+                    rows = await USERS_PAGE_BEFORE.fetch(conn, before, limit + 1)
+                else:
+                    rows = await USERS_PAGE_AFTER.fetch(conn, after or 0, limit + 1)
+        except Exception as e:
+            print(f"Error getting users page: {e}")
+            return [], False
+        
+        users = [dict(row) for row in rows[:limit]]
+        if before is not None:
+            users.reverse()
+        return users, len(rows) > limit
+
+    @staticmethod
+    async def search_users(term: str, limit: int = 10) -> List[dict]:
+        """بحث تقريبي بالمعرف أو الاسم الأول أو الأخير، الأقرب أولاً"""
+        term = term.strip().lstrip('@').lower()
+        if not term:
+            return []
+        
+        try:
+            async with db.pool.acquire() as conn:
+                if len(term) >= 3:
+                    try:
+                        rows = await SEARCH_USERS.fetch(conn, term, limit)
+                        return [dict(row) for row in rows]
+                    except asyncpg.UndefinedFunctionError:
+                        pass  # pg_trgm غير مثبتة
+                
+                pattern = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+                rows = await SEARCH_USERS_LIKE.fetch(conn, pattern, limit)
+                return [dict(row) for row in rows]
+        except Exception as e:
+            print(f"Error searching users: {e}")
+            return []
+
+    @staticmethod
+    async def get_user_counts(refresh: bool = False) -> Dict[str, int]:
+        """مجاميع المستخدمين (الإجمالي، النشطون، المديرون، الجدد، النشاط) من ذاكرة مؤقتة قصيرة"""
+        if not refresh:
+            counts = user_counts_cache.get('counts')
+            if counts is not None:
+                return counts
+        
+        try:
+            async with db.pool.acquire() as conn:
+                row = await USER_COUNTS.fetchrow(conn)
+        except Exception as e:
+            print(f"Error counting users: {e}")
+            return {}
+        
+        counts = dict(row)
+        user_counts_cache.set('counts', counts)
+        return counts
+
+    @staticmethod
+    async def get_admin_ids() -> List[int]:
+        """معرفات المديرين النشطين"""
+        try:
+            async with db.pool.acquire() as conn:
+                rows = await ADMIN_IDS.fetch(conn)
+                return [row['user_id'] for row in rows]
+        except Exception as e:
+            print(f"Error getting admin ids: {e}")
+            return []
+
+    @staticmethod
+    async def get_admins() -> List[dict]:
+        """جميع المديرين (نشطين وغير نشطين)"""
+        try:
+            async with db.pool.acquire() as conn:
+                rows = await ADMINS.fetch(conn)
+                return [dict(row) for row in rows]
+        except Exception as e:
+            print(f"Error getting admins: {e}")
+            return []
+
+    @staticmethod
+    async def get_permissions(user_id: int) -> Dict[str, bool]:
+        """صلاحيات المستخدم {exists, is_admin, is_active} من الذاكرة المؤقتة، أو من قاعدة البيانات عند غيابها"""
+        permissions = permissions_cache.get(user_id)
+        if permissions is not None:
+            return permissions
+        
+        try:
+            async with db.pool.acquire() as conn:
+                row = await USER_PERMISSIONS.fetchrow(conn, user_id)
+        except Exception as e:
+            print(f"Error getting user permissions: {e}")
+            # لا نخزن نتيجة الفشل
+            return {'exists': False, 'is_admin': False, 'is_active': False}
+        
+        permissions = {
+            'exists': row is not None,
+            'is_admin': bool(row and row['is_admin']),
+            'is_active': bool(row is None or row['is_active']),
+        }
+        permissions_cache.set(user_id, permissions)
+        return permissions
+
+    @staticmethod
+    async def is_admin(user_id: int) -> bool:
+        """هل المستخدم مدير غير محظور؛ المدير الرئيسي دائماً بدون استعلام"""
+        if user_id == Config.ADMIN_USER_ID:
+            return True
+        permissions = await UserManager.get_permissions(user_id)
+        return permissions['is_admin'] and permissions['is_active']
+
+    @staticmethod
+    async def is_banned(user_id: int) -> bool:
+        """هل المستخدم محظور (is_active = FALSE)"""
+        permissions = await UserManager.get_permissions(user_id)
+        return permissions['exists'] and not permissions['is_active']
+
+    @staticmethod
+    def _permissions_changed(user_id: int) -> None:
+        """إلغاء الصلاحيات المخزنة للمستخدم والمجاميع التي تعتمد عليها"""
+        permissions_cache.invalidate(user_id)
+        user_counts_cache.clear()
+
+    @staticmethod
+    async def set_admin(user_id: int, is_admin: bool) -> bool:
+        """منح صلاحيات المدير أو سحبها"""
+        try:
+            async with db.pool.acquire() as conn:
+                updated = await SET_ADMIN.fetchval(conn, user_id, is_admin)
+        except Exception as e:
+            print(f"Error setting admin: {e}")
+            return False
+        finally:
+            UserManager._permissions_changed(user_id)
+        return updated is not None
+
+    @staticmethod
+    async def ban_user(user_id: int) -> bool:
+        """حظر المستخدم"""
+        return await UserManager._set_active(user_id, False)
+
+    @staticmethod
+    async def unban_user(user_id: int) -> bool:
+        """إلغاء حظر المستخدم"""
+        return await UserManager._set_active(user_id, True)
+
+    @staticmethod
+    async def _set_active(user_id: int, is_active: bool) -> bool:
+        try:
+            async with db.pool.acquire() as conn:
+                updated = await SET_ACTIVE.fetchval(conn, user_id, is_active)
+        except Exception as e:
+            print(f"Error setting user active state: {e}")
+            return False
+        finally:
+            UserManager._permissions_changed(user_id)
+        return updated is not None
+
     @staticmethod
     async def increment_tasks_created(user_id: int) -> bool:
         """Increments the total_tasks_created count for a user."""
@@ -95,11 +388,7 @@ class UserManager:
         """Increments the total_messages_forwarded count for a user."""
         try:
             async with db.pool.acquire() as conn:
-                await conn.execute('''
-                    UPDATE users 
-                    SET total_messages_forwarded = total_messages_forwarded + 1
-                    WHERE user_id = $1
-                ''', user_id)
+                await INCREMENT_MESSAGES_FORWARDED.execute(conn, user_id)
                 return True
         except Exception as e:
             print(f"Error incrementing messages forwarded: {e}")
@@ -132,4 +421,3 @@ class UserManager:
         except Exception as e:
             print(f"Error updating user from backup: {e}")
             return False
-import database as db
@@ -1,9 +1,12 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from database.user_manager import UserManager
+from database.user_manager import UserManager, permissions_cache
 from database.task_manager import TaskManager
 from database.statistics_manager import StatisticsManager
+from database.models import db
+from database.queries import queries
 from utils.keyboard_builder import KeyboardBuilder
+from utils.chart_renderer import chart_renderer, chart_cache
 from config import Config
 
 class AdminHandlers:
@@ -49,7 +52,7 @@ class AdminHandlers:
             await update.callback_query.answer("❌ غير مصرح لك بالوصول لهذه الميزة")
             return
         
-        users = await UserManager.get_all_users()
+        users, _ = await UserManager.get_users_page(limit=10)
         
         if not users:
             text = "📭 لا يوجد مستخدمين مسجلين"
@@ -58,7 +61,7 @@ class AdminHandlers:
             text = "👥 **قائمة المستخدمين:**\n\n"
             keyboard = []
             
-            for user in users[:10]:  # Show first 10 users
+            for user in users:  # Show first 10 users
                 name = user['first_name'] or user['username'] or f"User {user['user_id']}"
                 status = "👑 مدير" if user['is_admin'] else "👤 مستخدم"
                 active = "🟢" if user['is_active'] else "🔴"
@@ -89,12 +92,12 @@ class AdminHandlers:
             return
         
         # Get system stats
-        users = await UserManager.get_all_users()
+        counts = await UserManager.get_user_counts()
         all_tasks = await TaskManager.get_active_tasks()
         
-        total_users = len(users)
-        active_users = len([u for u in users if u['is_active']])
-        admin_users = len([u for u in users if u['is_admin']])
+        total_users = counts.get('total_users', 0)
+        active_users = counts.get('active_users', 0)
+        admin_users = counts.get('admin_users', 0)
         total_tasks = len(all_tasks)
         
         text = f"""
@@ -113,6 +116,33 @@ class AdminHandlers:
 • قاعدة البيانات: 🟢 متصلة
         """
         
+        # الاستعلامات الأكثر استهلاكاً للوقت منذ بدء التشغيل
+        hot_queries = [q for q in queries.stats(limit=5) if q['calls']]
+        if hot_queries:
+            text += "\n⏱️ **أكثر الاستعلامات استهلاكاً للوقت:**\n"
+            for q in hot_queries:
+                text += f"• `{q['name']}`: {q['calls']} استدعاء، متوسط {q['avg_ms']:.1f}ms، أقصى {q['max_ms']:.1f}ms\n"
+        
+        # انتظار الحصول على اتصال من كل مجمع حسب موضع الاستدعاء
+        text += "\n🔌 **مجمعات الاتصالات:**\n"
+        for pool in db.pools.values():
+            usage = pool.usage()
+            text += f"• {usage['name']}: {usage['size']}/{usage['max_size']} (خامل: {usage['idle']})\n"
+            for site in pool.stats(limit=3):
+                if site['count'] or site['timeouts']:
+                    text += (f"  - `{site['site']}`: {site['count']} مرة، انتظار {site['wait_avg_ms']:.1f}/{site['wait_max_ms']:.1f}ms، "
+                             f"حجز {site['hold_avg_ms']:.1f}/{site['hold_max_ms']:.1f}ms"
+                             + (f"، مهلة {site['timeouts']}" if site['timeouts'] else "") + "\n")
+        
+        # ذاكرة المخططات المرسلة
+        charts = chart_renderer.stats()
+        cached = chart_cache.stats()
+        text += (f"\n📈 **المخططات:** {charts['rendered']} رسم، {charts['rejected']} مرفوض، "
+                 f"ذاكرة {cached['entries']} عنصر (إصابة {cached['hit_rate']:.1f}%)\n")
+        
+        permissions = permissions_cache.stats()
+        text += f"🔐 **الصلاحيات:** {permissions['entries']} مستخدم في الذاكرة (إصابة {permissions['hit_rate']:.1f}%)\n"
+        
         keyboard = [[InlineKeyboardButton("🔙 العودة", callback_data="admin_menu")]]
         
         await update.callback_query.edit_message_text(
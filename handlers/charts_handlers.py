@@ -1,16 +1,73 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
+from telegram.error import BadRequest
 from database.statistics_manager import StatisticsManager
 from database.task_manager import TaskManager
 from database.user_manager import UserManager
 from utils.error_handler import ErrorHandler
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
+from utils.chart_renderer import chart_renderer, chart_cache, chart_fingerprint, ChartQueueFull
+from utils.message_processor import (
+    REASON_BLACKLIST, REASON_WHITELIST, REASON_MEDIA_TYPE, REASON_BLOCKED_WORD, REASON_REQUIRED_WORD,
+    REASON_LINK, REASON_MENTION, REASON_FORWARDED, REASON_INLINE_KEYBOARD, REASON_DUPLICATE,
+    REASON_NEAR_DUPLICATE
+)
+from database.filter_rejections import REASON_OTHER
 from datetime import datetime, timedelta
-import io
-import base64
+
+FILTER_REASON_LABELS = {
+    REASON_BLACKLIST: 'القائمة السوداء',
+    REASON_WHITELIST: 'خارج القائمة البيضاء',
+    REASON_MEDIA_TYPE: 'نوع الوسائط',
+    REASON_BLOCKED_WORD: 'كلمات محظورة',
+    REASON_REQUIRED_WORD: 'كلمات مطلوبة مفقودة',
+    REASON_LINK: 'روابط',
+    REASON_MENTION: 'إشارات',
+    REASON_FORWARDED: 'رسائل محولة',
+    REASON_INLINE_KEYBOARD: 'أزرار مضمنة',
+    REASON_DUPLICATE: 'مكررة',
+    REASON_NEAR_DUPLICATE: 'شبه مكررة',
+    REASON_OTHER: 'أخرى',
+}
 
 class ChartsHandlers:
+    @staticmethod
+    async def _send_chart(update: Update, context: ContextTypes.DEFAULT_TYPE, kind: str, data,
+                          caption: str, done_text: str = "✅ تم إنشاء الرسم البياني", period: str = ''):
+        """إرسال المخطط؛ إعادة إرسال file_id المحفوظ إن لم تتغير البيانات وإلا الرسم في عملية منفصلة"""
+        cache_key = (kind, update.effective_user.id, period, chart_fingerprint(data))
+        
+        file_id = chart_cache.get(cache_key)
+        if file_id:
+            try:
+                await context.bot.send_photo(
+                    chat_id=update.effective_chat.id,
+                    photo=file_id,
+                    caption=caption,
+                    parse_mode='Markdown'
+                )
+                await update.callback_query.answer(done_text)
+                return
+            except BadRequest:
+                # file_id لم يعد صالحاً: نعيد الرسم
+                chart_cache.invalidate(cache_key)
+        
+        try:
+            image = await chart_renderer.render(kind, data)
+        except ChartQueueFull:
+            await update.callback_query.answer("⏳ يتم إنشاء رسوم أخرى الآن، حاول بعد قليل")
+            return
+        
+        message = await context.bot.send_photo(
+            chat_id=update.effective_chat.id,
+            photo=image,
+            caption=caption,
+            parse_mode='Markdown'
+        )
+        if message.photo:
+            chart_cache.set(cache_key, message.photo[-1].file_id)
+        
+        await update.callback_query.answer(done_text)
+    
     @staticmethod
     async def charts_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """قائمة الرسوم البيانية"""
@@ -57,46 +114,15 @@ class ChartsHandlers:
                 await update.callback_query.answer("❌ لا توجد مهام لإنشاء رسم بياني")
                 return
             
-            # إنشاء الرسم البياني
-            fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 6))
-            
-            # رسم دائري لحالة المهام
-            labels = ['نشطة', 'متوقفة']
-            sizes = [active_tasks, inactive_tasks]
-            colors = ['#4CAF50', '#F44336']
-            
-            ax1.pie(sizes, labels=labels, colors=colors, autopct='%1.1f%%', startangle=90)
-            ax1.set_title('حالة المهام')
-            
-            # رسم بياني لأنواع المهام
             forward_tasks = len([t for t in tasks if t['task_type'] == 'forward'])
             copy_tasks = len([t for t in tasks if t['task_type'] == 'copy'])
             
-            task_types = ['توجيه', 'نسخ']
-            task_counts = [forward_tasks, copy_tasks]
-            
-            ax2.bar(task_types, task_counts, color=['#2196F3', '#FF9800'])
-            ax2.set_title('أنواع المهام')
-            ax2.set_ylabel('عدد المهام')
-            
-            plt.tight_layout()
-            
-            # حفظ الرسم كصورة
-            img_buffer = io.BytesIO()
-            plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight')
-            img_buffer.seek(0)
-            plt.close()
-            
-            # إرسال الصورة
-            await context.bot.send_photo(
-                chat_id=update.effective_chat.id,
-                photo=img_buffer,
-                caption="📊 **رسم بياني للمهام**",
-                parse_mode='Markdown'
+            await ChartsHandlers._send_chart(
+                update, context, 'tasks',
+                (active_tasks, inactive_tasks, forward_tasks, copy_tasks),
+                "📊 **رسم بياني للمهام**"
             )
             
-            await update.callback_query.answer("✅ تم إنشاء الرسم البياني")
-            
         except Exception as e:
             await ErrorHandler.log_error(update, context, e, "tasks_chart")
             await update.callback_query.answer("❌ فشل في إنشاء الرسم البياني")
@@ -114,67 +140,22 @@ class ChartsHandlers:
                 await update.callback_query.answer("❌ لا توجد مهام لإنشاء رسم بياني")
                 return
             
-            # جمع البيانات لكل مهمة
-            dates = []
-            forwarded_counts = []
-            filtered_counts = []
-            
-            for i in range(30):
-                date = datetime.now().date() - timedelta(days=i)
-                dates.append(date)
-                
-                daily_forwarded = 0
-                daily_filtered = 0
-                
-                for task in tasks:
-                    stats = await StatisticsManager.get_task_stats(task['id'], days=1)
-                    for stat in stats:
-                        if stat['date'] == date:
-                            daily_forwarded += stat['messages_forwarded']
-                            daily_filtered += stat['messages_filtered']
-                
-                forwarded_counts.append(daily_forwarded)
-                filtered_counts.append(daily_filtered)
-            
-            # عكس القوائم لعرض التواريخ من الأقدم للأحدث
-            dates.reverse()
-            forwarded_counts.reverse()
-            filtered_counts.reverse()
-            
-            # إنشاء الرسم البياني
-            fig, ax = plt.subplots(figsize=(12, 6))
-            
-            ax.plot(dates, forwarded_counts, label='رسائل موجهة', color='#4CAF50', linewidth=2)
-            ax.plot(dates, filtered_counts, label='رسائل مرشحة', color='#F44336', linewidth=2)
-            
-            ax.set_title('إحصائيات الرسائل - آخر 30 يوم')
-            ax.set_xlabel('التاريخ')
-            ax.set_ylabel('عدد الرسائل')
-            ax.legend()
-            ax.grid(True, alpha=0.3)
-            
-            # تنسيق التواريخ
-            ax.xaxis.set_major_formatter(mdates.DateFormatter('%m/%d'))
-            ax.xaxis.set_major_locator(mdates.DayLocator(interval=5))
-            plt.xticks(rotation=45)
-            
-            plt.tight_layout()
-            
-            # حفظ الرسم كصورة
-            img_buffer = io.BytesIO()
-            plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight')
-            img_buffer.seek(0)
-            plt.close()
-            
-            # إرسال الصورة
-            await context.bot.send_photo(
-                chat_id=update.effective_chat.id,
-                photo=img_buffer,
-                caption="📈 **رسم بياني للرسائل - آخر 30 يوم**",
-                parse_mode='Markdown'
+            # مجاميع يومية لكل المهام في استعلام واحد
+            end = datetime.combine(datetime.now().date() + timedelta(days=1), datetime.min.time())
+            start = end - timedelta(days=30)
+            series = await StatisticsManager.get_time_series(
+                [task['id'] for task in tasks], start, end, bucket_seconds=86400
             )
+            if not series:
+                await update.callback_query.answer("❌ فشل في إنشاء الرسم البياني")
+                return
             
-            await update.callback_query.answer("✅ تم إنشاء الرسم البياني")
+            await ChartsHandlers._send_chart(
+                update, context, 'messages',
+                (start.date().toordinal(), series['forwarded'], series['filtered']),
+                "📈 **رسم بياني للرسائل - آخر 30 يوم**",
+                period='30d'
+            )
             
         except Exception as e:
             await ErrorHandler.log_error(update, context, e, "messages_chart")
@@ -193,62 +174,22 @@ class ChartsHandlers:
                 await update.callback_query.answer("❌ لا توجد مهام لإنشاء رسم بياني")
                 return
             
-            # إنشاء قائمة الساعات لآخر 7 أيام
-            hours = []
-            activity_counts = []
-            
-            for day in range(7):
-                for hour in range(24):
-                    dt = datetime.now() - timedelta(days=day, hours=23-hour)
-                    hours.append(dt)
-                    
-                    # حساب النشاط في هذه الساعة (مبسط)
-                    hour_activity = 0
-                    for task in tasks:
-                        if task['is_active']:
-                            # محاكاة بيانات النشاط
-                            hour_activity += max(0, 10 - abs(12 - hour))  # ذروة النشاط في منتصف النهار
-                    
-                    activity_counts.append(hour_activity)
-            
-            # عكس القوائم
-            hours.reverse()
-            activity_counts.reverse()
-            
-            # إنشاء الرسم البياني
-            fig, ax = plt.subplots(figsize=(14, 6))
+            # 168 فترة ساعية مجمعة في قاعدة البيانات، تنتهي بالساعة الحالية
+            end = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+            start = end - timedelta(days=7)
+            series = await StatisticsManager.get_time_series([task['id'] for task in tasks], start, end)
             
-            ax.plot(hours, activity_counts, color='#2196F3', linewidth=1.5, alpha=0.8)
-            ax.fill_between(hours, activity_counts, alpha=0.3, color='#2196F3')
-            
-            ax.set_title('النشاط الزمني - آخر 7 أيام')
-            ax.set_xlabel('الوقت')
-            ax.set_ylabel('مستوى النشاط')
-            ax.grid(True, alpha=0.3)
-            
-            # تنسيق التواريخ
-            ax.xaxis.set_major_formatter(mdates.DateFormatter('%m/%d %H:%M'))
-            ax.xaxis.set_major_locator(mdates.HourLocator(interval=12))
-            plt.xticks(rotation=45)
-            
-            plt.tight_layout()
-            
-            # حفظ الرسم كصورة
-            img_buffer = io.BytesIO()
-            plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight')
-            img_buffer.seek(0)
-            plt.close()
+            if not series:
+                await update.callback_query.answer("❌ فشل في إنشاء الرسم البياني")
+                return
             
-            # إرسال الصورة
-            await context.bot.send_photo(
-                chat_id=update.effective_chat.id,
-                photo=img_buffer,
-                caption="⏰ **الرسم البياني الزمني للنشاط**",
-                parse_mode='Markdown'
+            await ChartsHandlers._send_chart(
+                update, context, 'timeline',
+                (start.timestamp(), 3600, series['forwarded'], series['filtered']),
+                "⏰ **الرسم البياني الزمني للنشاط**",
+                period='7d'
             )
             
-            await update.callback_query.answer("✅ تم إنشاء الرسم البياني")
-            
         except Exception as e:
             await ErrorHandler.log_error(update, context, e, "timeline_chart")
             await update.callback_query.answer("❌ فشل في إنشاء الرسم البياني")
@@ -265,63 +206,21 @@ class ChartsHandlers:
                 await update.callback_query.answer("❌ لا توجد مهام لإنشاء رسم بياني")
                 return
             
-            # تحليل الفلاتر المستخدمة
-            media_filters_count = 0
-            text_filters_count = 0
-            advanced_filters_count = 0
-            user_lists_count = 0
-            
-            for task in tasks:
-                settings = task.get('settings', {})
-                
-                if settings.get('media_filters', {}).get('enabled'):
-                    media_filters_count += 1
-                
-                if settings.get('blocked_words') or settings.get('required_words'):
-                    text_filters_count += 1
-                
-                if settings.get('advanced_filters'):
-                    advanced_filters_count += 1
-                
-                if settings.get('whitelist') or settings.get('blacklist'):
-                    user_lists_count += 1
-            
-            # إنشاء الرسم البياني
-            fig, ax = plt.subplots(figsize=(10, 6))
-            
-            filter_types = ['فلاتر الوسائط', 'فلاتر النص', 'فلاتر متقدمة', 'قوائم المستخدمين']
-            filter_counts = [media_filters_count, text_filters_count, advanced_filters_count, user_lists_count]
-            colors = ['#4CAF50', '#2196F3', '#FF9800', '#9C27B0']
+            # الرسائل المرفوضة لكل سبب خلال آخر 30 يوم
+            rejections = await StatisticsManager.get_filter_rejections([task['id'] for task in tasks], days=30)
             
-            bars = ax.bar(filter_types, filter_counts, color=colors)
-            ax.set_title('استخدام الفلاتر في المهام')
-            ax.set_ylabel('عدد المهام')
-            
-            # إضافة قيم على الأعمدة
-            for bar, count in zip(bars, filter_counts):
-                height = bar.get_height()
-                ax.text(bar.get_x() + bar.get_width()/2., height + 0.1,
-                       f'{count}', ha='center', va='bottom')
-            
-            plt.xticks(rotation=45)
-            plt.tight_layout()
-            
-            # حفظ الرسم كصورة
-            img_buffer = io.BytesIO()
-            plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight')
-            img_buffer.seek(0)
-            plt.close()
+            if not rejections:
+                await update.callback_query.answer("❌ لا توجد رسائل مرفوضة خلال آخر 30 يوم")
+                return
             
-            # إرسال الصورة
-            await context.bot.send_photo(
-                chat_id=update.effective_chat.id,
-                photo=img_buffer,
-                caption="🎯 **رسم بياني لاستخدام الفلاتر**",
-                parse_mode='Markdown'
+            await ChartsHandlers._send_chart(
+                update, context, 'filters',
+                (tuple(FILTER_REASON_LABELS.get(reason, reason) for reason in rejections),
+                 tuple(rejections.values())),
+                "🎯 **أسباب رفض الرسائل - آخر 30 يوم**",
+                period='30d'
             )
             
-            await update.callback_query.answer("✅ تم إنشاء الرسم البياني")
-            
         except Exception as e:
             await ErrorHandler.log_error(update, context, e, "filters_chart")
             await update.callback_query.answer("❌ فشل في إنشاء الرسم البياني")
@@ -337,55 +236,23 @@ class ChartsHandlers:
             return
         
         try:
-            users = await UserManager.get_all_users()
+            counts = await UserManager.get_user_counts()
             
-            if not users:
+            if not counts.get('total_users'):
                 await update.callback_query.answer("❌ لا توجد بيانات مستخدمين")
                 return
             
             # تحليل بيانات المستخدمين
-            total_users = len(users)
-            active_users = len([u for u in users if u['is_active']])
-            admin_users = len([u for u in users if u['is_admin']])
-            banned_users = total_users - active_users
-            
-            # إنشاء الرسم البياني
-            fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 6))
-            
-            # رسم دائري لحالة المستخدمين
-            labels1 = ['نشطين', 'محظورين']
-            sizes1 = [active_users, banned_users]
-            colors1 = ['#4CAF50', '#F44336']
-            
-            ax1.pie(sizes1, labels=labels1, colors=colors1, autopct='%1.1f%%', startangle=90)
-            ax1.set_title('حالة المستخدمين')
-            
-            # رسم بياني لأنواع المستخدمين
-            user_types = ['مستخدمين عاديين', 'مديرين']
-            user_counts = [total_users - admin_users, admin_users]
-            
-            ax2.bar(user_types, user_counts, color=['#2196F3', '#FF9800'])
-            ax2.set_title('أنواع المستخدمين')
-            ax2.set_ylabel('العدد')
-            
-            plt.tight_layout()
-            
-            # حفظ الرسم كصورة
-            img_buffer = io.BytesIO()
-            plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight')
-            img_buffer.seek(0)
-            plt.close()
-            
-            # إرسال الصورة
-            await context.bot.send_photo(
-                chat_id=update.effective_chat.id,
-                photo=img_buffer,
-                caption="👥 **رسم بياني للمستخدمين**",
-                parse_mode='Markdown'
+            total_users = counts['total_users']
+            active_users = counts['active_users']
+            admin_users = counts['admin_users']
+            
+            await ChartsHandlers._send_chart(
+                update, context, 'users',
+                (total_users, active_users, admin_users),
+                "👥 **رسم بياني للمستخدمين**"
             )
             
-            await update.callback_query.answer("✅ تم إنشاء الرسم البياني")
-            
         except Exception as e:
             await ErrorHandler.log_error(update, context, e, "users_chart")
             await update.callback_query.answer("❌ فشل في إنشاء الرسم البياني")
@@ -404,63 +271,20 @@ class ChartsHandlers:
                 await update.callback_query.answer("❌ لا توجد مهام لإنشاء رسم بياني")
                 return
             
-            # إنشاء رسم بياني متعدد الأجزاء
-            fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(15, 10))
-            
-            # الرسم الأول: حالة المهام
             active_tasks = len([t for t in tasks if t['is_active']])
             inactive_tasks = len([t for t in tasks if not t['is_active']])
-            
-            ax1.pie([active_tasks, inactive_tasks], labels=['نشطة', 'متوقفة'], 
-                   colors=['#4CAF50', '#F44336'], autopct='%1.1f%%')
-            ax1.set_title('حالة المهام')
-            
-            # الرسم الثاني: أنواع المهام
             forward_tasks = len([t for t in tasks if t['task_type'] == 'forward'])
             copy_tasks = len([t for t in tasks if t['task_type'] == 'copy'])
-            
-            ax2.bar(['توجيه', 'نسخ'], [forward_tasks, copy_tasks], 
-                   color=['#2196F3', '#FF9800'])
-            ax2.set_title('أنواع المهام')
-            ax2.set_ylabel('العدد')
-            
-            # الرسم الثالث: إحصائيات الرسائل
             forwarded = user_stats.get('total_forwarded', 0)
             filtered = user_stats.get('total_filtered', 0)
             
-            ax3.bar(['موجهة', 'مرشحة'], [forwarded, filtered], 
-                   color=['#4CAF50', '#F44336'])
-            ax3.set_title('إحصائيات الرسائل')
-            ax3.set_ylabel('العدد')
-            
-            # الرسم الرابع: معدل النجاح
-            if forwarded + filtered > 0:
-                success_rate = (forwarded / (forwarded + filtered)) * 100
-                ax4.pie([success_rate, 100-success_rate], 
-                       labels=[f'نجح {success_rate:.1f}%', f'فشل {100-success_rate:.1f}%'],
-                       colors=['#4CAF50', '#F44336'], autopct='%1.1f%%')
-            else:
-                ax4.text(0.5, 0.5, 'لا توجد بيانات', ha='center', va='center')
-            ax4.set_title('معدل النجاح')
-            
-            plt.tight_layout()
-            
-            # حفظ الرسم كصورة
-            img_buffer = io.BytesIO()
-            plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight')
-            img_buffer.seek(0)
-            plt.close()
-            
-            # إرسال الصورة
-            await context.bot.send_photo(
-                chat_id=update.effective_chat.id,
-                photo=img_buffer,
-                caption="📊 **الرسم البياني الشامل**",
-                parse_mode='Markdown'
+            await ChartsHandlers._send_chart(
+                update, context, 'comprehensive',
+                (active_tasks, inactive_tasks, forward_tasks, copy_tasks, forwarded, filtered),
+                "📊 **الرسم البياني الشامل**",
+                "✅ تم إنشاء الرسم البياني الشامل"
             )
             
-            await update.callback_query.answer("✅ تم إنشاء الرسم البياني الشامل")
-            
         except Exception as e:
             await ErrorHandler.log_error(update, context, e, "comprehensive_chart")
             await update.callback_query.answer("❌ فشل في إنشاء الرسم البياني")
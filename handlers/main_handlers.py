@@ -3,6 +3,7 @@ from telegram.ext import ContextTypes
 from database.user_manager import UserManager
 from database.statistics_manager import StatisticsManager
 from utils.keyboard_builder import KeyboardBuilder
+from utils.task_analytics import TaskAnalytics, WEEKDAY_NAMES
 from config import Config
 from database.task_manager import TaskManager
 
@@ -241,27 +242,36 @@ class MainHandlers:
             await update.callback_query.answer("❌ المهمة غير موجودة")
             return
         
-        # إحصائيات آخر 7 أيام
-        stats = await StatisticsManager.get_task_stats(task_id, days=7)
+        # تحليلات السلسلة الساعية لآخر STATS_ANALYTICS_DAYS يوماً
+        analytics = await TaskAnalytics.get_task_analytics(task_id)
         
         text = f"📊 **إحصائيات مفصلة: {task['task_name']}**\n\n"
         
-        total_forwarded = sum(s['messages_forwarded'] for s in stats)
-        total_filtered = sum(s['messages_filtered'] for s in stats)
-        total_processed = total_forwarded + total_filtered
-        
-        text += f"📈 **الإجمالي (7 أيام):**\n"
-        text += f"• الرسائل المُعالجة: {total_processed:,}\n"
-        text += f"• الرسائل المُوجهة: {total_forwarded:,}\n"
-        text += f"• الرسائل المُرشحة: {total_filtered:,}\n"
-        
-        if total_processed > 0:
-            success_rate = (total_forwarded / total_processed) * 100
-            text += f"• معدل النجاح: {success_rate:.1f}%\n\n"
-        
-        text += f"📅 **تفاصيل يومية:**\n"
-        for stat in stats[-5:]:  # آخر 5 أيام
-            text += f"• {stat['date']}: {stat['messages_forwarded']} مُوجه, {stat['messages_filtered']} مُرشح\n"
+        if not analytics:
+            text += "❌ تعذر تحميل الإحصائيات\n"
+        else:
+            text += f"📈 **الإجمالي ({analytics['days']} يوم):**\n"
+            text += f"• الرسائل المُعالجة: {analytics['total_processed']:,}\n"
+            text += f"• الرسائل المُوجهة: {analytics['total_forwarded']:,}\n"
+            text += f"• الرسائل المُرشحة: {analytics['total_filtered']:,}\n"
+            text += f"• الرسائل الفاشلة: {analytics['total_failed']:,}\n"
+            
+            if analytics['total_processed'] > 0:
+                text += f"• معدل النجاح: {analytics['success_rate']:.1f}%\n"
+                text += f"• معدل الترشيح: {analytics['filter_rate']:.1f}%\n"
+                text += f"• معدل الأخطاء: {analytics['error_rate']:.1f}%\n"
+            
+            text += f"\n⚡ **الأداء:**\n"
+            text += f"• زمن المعالجة: متوسط {analytics['avg_processing_ms']:.0f}ms، "
+            text += f"p50 {analytics['processing_p50_ms']:.0f}ms، p95 {analytics['processing_p95_ms']:.0f}ms\n"
+            text += f"• رسائل/ساعة: p50 {analytics['hourly_p50']:.0f}، p95 {analytics['hourly_p95']:.0f}، أقصى {analytics['hourly_max']}\n"
+            text += f"• آخر 24 ساعة: {analytics['last_24h_rate']:.1f} رسالة/ساعة (السابقة: {analytics['previous_24h_rate']:.1f})\n"
+            text += f"• ساعة الذروة: {analytics['peak_hour']:02d}:00، يوم الذروة: {WEEKDAY_NAMES[analytics['peak_weekday']]}\n"
+            
+            text += f"\n📅 **تفاصيل يومية:**\n"
+            for day, forwarded, filtered in zip(analytics['daily_dates'][:5], analytics['daily_forwarded'][:5],
+                                                analytics['daily_filtered'][:5]):
+                text += f"• {day}: {forwarded} مُوجه, {filtered} مُرشح\n"
         
         keyboard = [
             [
@@ -317,17 +327,15 @@ class MainHandlers:
             return
         
         # الحصول على إحصائيات المستخدمين
-        users = await UserManager.get_all_users()
-        active_users = len([u for u in users if u['is_active']])
-        admin_users = len([u for u in users if u['is_admin']])
+        counts = await UserManager.get_user_counts()
         
         text = f"""
 👥 **إدارة المستخدمين**
 
 📊 **الإحصائيات:**
-• إجمالي المستخدمين: {len(users)}
-• المستخدمين النشطين: {active_users}
-• المديرين: {admin_users}
+• إجمالي المستخدمين: {counts.get('total_users', 0)}
+• المستخدمين النشطين: {counts.get('active_users', 0)}
+• المديرين: {counts.get('admin_users', 0)}
 
 اختر العملية التي تريد تنفيذها:
         """
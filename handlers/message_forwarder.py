@@ -1,16 +1,19 @@
 import asyncio
-from typing import Dict, Any, List
+from typing import Dict, List
 from telegram import Bot, Message
 from telegram.error import TelegramError
 from database.task_manager import TaskManager
 from database.statistics_manager import StatisticsManager
-from utils.message_processor import MessageProcessor
+from utils.message_processor import MessageProcessor, message_entities, REASON_DUPLICATE, REASON_NEAR_DUPLICATE
+from utils.duplicate_filter import duplicate_suppressor
+from utils.task_model import ForwardingTask, CompiledSettings
 from config import Config
 
 class MessageForwarder:
     def __init__(self, bot: Bot):
         self.bot = bot
-        self.active_tasks: Dict[int, Dict[str, Any]] = {}
+        self.active_tasks: Dict[int, ForwardingTask] = {}
+        self.tasks_by_source: Dict[int, List[ForwardingTask]] = {}
         self.running = False
     
     async def start_monitoring(self):
@@ -27,9 +30,22 @@ class MessageForwarder:
     
     async def load_active_tasks(self):
         """Load active tasks from database"""
-        tasks = await TaskManager.get_active_tasks()
-        self.active_tasks = {task['id']: task for task in tasks}
-        print(f"Loaded {len(self.active_tasks)} active tasks")
+        records = await TaskManager.get_active_tasks()
+        user_lists = await TaskManager.get_task_user_lists([record['id'] for record in records])
+        
+        # Compile once per reload; tasks with identical settings share one object
+        interned: Dict[bytes, CompiledSettings] = {}
+        active_tasks = {}
+        tasks_by_source: Dict[int, List[ForwardingTask]] = {}
+        for record in records:
+            task = ForwardingTask.from_record(record, user_lists.get(record['id']), interned)
+            active_tasks[task.id] = task
+            tasks_by_source.setdefault(task.source_chat_id, []).append(task)
+        
+        self.active_tasks = active_tasks
+        self.tasks_by_source = tasks_by_source
+        print(f"Loaded {len(self.active_tasks)} active tasks ({len(interned)} distinct settings)")
+        print(f"Filter cache: {MessageProcessor.cache_stats()}")
     
     async def monitoring_loop(self):
         """Main monitoring loop"""
@@ -48,10 +64,7 @@ class MessageForwarder:
             chat_id = message.chat.id
             
             # Find tasks that monitor this chat
-            relevant_tasks = [
-                task for task in self.active_tasks.values()
-                if task['source_chat_id'] == chat_id
-            ]
+            relevant_tasks = self.tasks_by_source.get(chat_id)
             
             if not relevant_tasks:
                 return False
@@ -66,15 +79,25 @@ class MessageForwarder:
             print(f"Error processing message: {e}")
             return False
     
-    async def process_task_message(self, task: Dict[str, Any], message: Message):
+    async def process_task_message(self, task: ForwardingTask, message: Message):
         """Process message for specific task"""
         try:
-            task_id = task['id']
-            processor = MessageProcessor(task['settings'])
+            task_id = task.id
+            processor = task.processor
             
             # Check if message should be forwarded
-            if not await processor.should_forward_message(message):
-                await StatisticsManager.increment_filtered(task_id)
+            reason = await processor.filter_message(message)
+            if reason:
+                await StatisticsManager.increment_filtered(task_id, reason)
+                return
+            
+            # Drop cross-source duplicates before any API call
+            if duplicate_suppressor.is_duplicate(task, message):
+                await StatisticsManager.increment_filtered(task_id, REASON_DUPLICATE)
+                return
+            
+            if processor.is_near_duplicate(message, task.target_chat_id):
+                await StatisticsManager.increment_filtered(task_id, REASON_NEAR_DUPLICATE)
                 return
             
             # Apply delay if configured
@@ -83,7 +106,7 @@ class MessageForwarder:
                 await asyncio.sleep(delay)
             
             # Forward or copy message
-            if task['task_type'] == 'forward':
+            if task.task_type == 'forward':
                 await self.forward_message(task, message, processor)
             else:
                 await self.copy_message(task, message, processor)
@@ -94,11 +117,11 @@ class MessageForwarder:
         except Exception as e:
             print(f"Error processing task message: {e}")
     
-    async def forward_message(self, task: Dict[str, Any], message: Message, 
+    async def forward_message(self, task: ForwardingTask, message: Message, 
                             processor: MessageProcessor):
         """Forward message to target chat"""
         try:
-            target_chat_id = task['target_chat_id']
+            target_chat_id = task.target_chat_id
             
             # Forward the message
             forwarded = await self.bot.forward_message(
@@ -113,15 +136,15 @@ class MessageForwarder:
         except TelegramError as e:
             print(f"Error forwarding message: {e}")
     
-    async def copy_message(self, task: Dict[str, Any], message: Message, 
+    async def copy_message(self, task: ForwardingTask, message: Message, 
                           processor: MessageProcessor):
         """Copy message to target chat"""
         try:
-            target_chat_id = task['target_chat_id']
+            target_chat_id = task.target_chat_id
             
             # Process text
             text = message.text or message.caption or ""
-            processed_text = await processor.process_message_text(text)
+            processed_text = await processor.process_message_text(text, message_entities(message))
             
             # Copy based on message type
             if message.photo:
@@ -184,26 +207,22 @@ class MessageForwarder:
         except TelegramError as e:
             print(f"Error copying message: {e}")
     
-    async def add_inline_buttons(self, task: Dict[str, Any], message: Message):
+    async def add_inline_buttons(self, task: ForwardingTask, message: Message):
         """Add inline buttons to message if configured"""
         try:
-            buttons_config = task['settings'].get('inline_buttons', {})
-            if not buttons_config.get('enabled', False):
-                return
-            
-            buttons = buttons_config.get('buttons', [])
+            buttons = task.settings.inline_buttons
             if not buttons:
                 return
             
             from telegram import InlineKeyboardButton, InlineKeyboardMarkup
             
             keyboard = []
-            for button in buttons:
+            for text, url, callback_data in buttons:
                 keyboard.append([
                     InlineKeyboardButton(
-                        text=button.get('text', ''),
-                        url=button.get('url', ''),
-                        callback_data=button.get('callback_data', '')
+                        text=text,
+                        url=url,
+                        callback_data=callback_data
                     )
                 ])
             
@@ -2,35 +2,32 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from database.user_manager import UserManager
 from database.task_manager import TaskManager
+from database.statistics_manager import StatisticsManager
 from utils.error_handler import ErrorHandler
+from utils.rate_limiter import send_message_limited
+from utils.broadcaster import broadcaster
 from config import Config
-import asyncio
 from datetime import datetime, timedelta
+from typing import Optional
 
 class NotificationsHandlers:
     @staticmethod
-    async def send_system_notification(bot, message: str, admin_only: bool = False):
-        """إرسال إشعار نظام لجميع المستخدمين أو المديرين فقط"""
+    async def send_system_notification(bot, message: str, admin_only: bool = False) -> Optional[int]:
+        """إرسال إشعار نظام للمديرين فوراً، أو لجميع المستخدمين عبر محرك البث
+
+        يعيد رقم البث لإشعارات جميع المستخدمين (None للمديرين أو عند الفشل).
+        """
         try:
-            users = await UserManager.get_all_users()
-            
             if admin_only:
-                users = [user for user in users if user['is_admin']]
+                admin_ids = await UserManager.get_admin_ids()
+                await broadcaster.send_to(bot, admin_ids, f"🔔 **إشعار النظام**\n\n{message}")
+                return None
             
-            for user in users:
-                if user['is_active']:
-                    try:
-                        await bot.send_message(
-                            chat_id=user['user_id'],
-                            text=f"🔔 **إشعار النظام**\n\n{message}",
-                            parse_mode='Markdown'
-                        )
-                        await asyncio.sleep(0.1)  # تجنب حدود الإرسال
-                    except Exception as e:
-                        print(f"Failed to send notification to {user['user_id']}: {e}")
+            return await broadcaster.enqueue(message)
                         
         except Exception as e:
             print(f"Error sending system notification: {e}")
+            return None
     
     @staticmethod
     async def send_task_notification(bot, user_id: int, task_name: str, 
@@ -70,64 +67,44 @@ class NotificationsHandlers:
     async def send_daily_report(bot):
         """إرسال التقرير اليومي للمديرين"""
         try:
-            # الحصول على المديرين
-            users = await UserManager.get_all_users()
-            admins = [user for user in users if user['is_admin'] and user['is_active']]
-            
-            # إنشاء التقرير اليومي
             today = datetime.now().date()
+            report_data = await StatisticsManager.get_daily_report(today)
+            if not report_data:
+                return
             
-            # إحصائيات عامة
-            total_users = len(users)
-            active_users = len([u for u in users if u['is_active']])
-            new_users_today = len([u for u in users if u['created_at'].date() == today])
-            
-            # إحصائيات المهام
-            all_tasks = await TaskManager.get_active_tasks()
-            total_tasks = len(all_tasks)
-            
-            # إحصائيات الرسائل (تقديرية)
-            total_forwarded_today = 0
-            total_filtered_today = 0
-            
-            for task in all_tasks:
-                from database.statistics_manager import StatisticsManager
-                stats = await StatisticsManager.get_task_stats(task['id'], days=1)
-                for stat in stats:
-                    if stat['date'] == today:
-                        total_forwarded_today += stat['messages_forwarded']
-                        total_filtered_today += stat['messages_filtered']
+            total_forwarded_today = report_data['forwarded']
+            total_filtered_today = report_data['filtered']
+            total_today = total_forwarded_today + total_filtered_today
+            success_rate = f"{(total_forwarded_today / total_today * 100):.1f}%" if total_today else "لا توجد رسائل"
             
             report = f"""
 📊 **التقرير اليومي - {today.strftime('%Y-%m-%d')}**
 
 👥 **المستخدمين:**
-• إجمالي المستخدمين: {total_users:,}
-• المستخدمين النشطين: {active_users:,}
-• مستخدمين جدد اليوم: {new_users_today:,}
+• إجمالي المستخدمين: {report_data['total_users']:,}
+• المستخدمين النشطين: {report_data['active_users']:,}
+• مستخدمين جدد اليوم: {report_data['new_users']:,}
 
 📋 **المهام:**
-• إجمالي المهام النشطة: {total_tasks:,}
+• إجمالي المهام النشطة: {report_data['active_tasks']:,}
+• مهام بها نشاط اليوم: {report_data['tasks_with_traffic']:,}
 
 📤 **الرسائل اليوم:**
 • رسائل موجهة: {total_forwarded_today:,}
 • رسائل مرشحة: {total_filtered_today:,}
-• إجمالي الرسائل: {total_forwarded_today + total_filtered_today:,}
+• رسائل فاشلة: {report_data['failed']:,}
+• إجمالي الرسائل: {total_today:,}
 
 📈 **الأداء:**
-• معدل النجاح: {(total_forwarded_today/(total_forwarded_today + total_filtered_today)*100):.1f}% إذا كان هناك رسائل
+• معدل النجاح: {success_rate}
             """
             
-            # إرسال التقرير للمديرين
-            for admin in admins:
+            # إرسال التقرير للمديرين عبر محدد معدل الإرسال
+            for admin_id in report_data['admin_ids']:
                 try:
-                    await bot.send_message(
-                        chat_id=admin['user_id'],
-                        text=report,
-                        parse_mode='Markdown'
-                    )
+                    await send_message_limited(bot, admin_id, report, parse_mode='Markdown')
                 except Exception as e:
-                    print(f"Failed to send daily report to admin {admin['user_id']}: {e}")
+                    print(f"Failed to send daily report to admin {admin_id}: {e}")
                     
         except Exception as e:
             print(f"Error sending daily report: {e}")
@@ -136,9 +113,8 @@ class NotificationsHandlers:
     async def send_error_notification(bot, error_details: dict):
         """إرسال إشعار خطأ للمديرين"""
         try:
-            # الحصول على المديرين
-            users = await UserManager.get_all_users()
-            admins = [user for user in users if user['is_admin'] and user['is_active']]
+            # الحصول على المديرين النشطين
+            admin_ids = await UserManager.get_admin_ids()
             
             message = f"""
 ❌ **إشعار خطأ**
@@ -151,15 +127,11 @@ class NotificationsHandlers:
 يرجى مراجعة السجلات للمزيد من التفاصيل.
             """
             
-            for admin in admins:
+            for admin_id in admin_ids:
                 try:
-                    await bot.send_message(
-                        chat_id=admin['user_id'],
-                        text=message,
-                        parse_mode='Markdown'
-                    )
+                    await send_message_limited(bot, admin_id, message, parse_mode='Markdown')
                 except Exception as e:
-                    print(f"Failed to send error notification to admin {admin['user_id']}: {e}")
+                    print(f"Failed to send error notification to admin {admin_id}: {e}")
                     
         except Exception as e:
             print(f"Error sending error notification: {e}")
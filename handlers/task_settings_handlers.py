@@ -547,6 +547,22 @@ class TaskSettingsHandlers:
                     )
                 ])
             
+            # منع التكرار بين المصادر المتعددة
+            duplicate_enabled = task['settings'].get('duplicate_filter', {}).get('enabled', False)
+            keyboard.append([
+                InlineKeyboardButton(
+                    f"{'✅' if duplicate_enabled else '❌'} 🔁 منع الرسائل المكررة",
+                    callback_data=f"toggle_duplicate_filter_{task_id}"
+                )
+            ])
+            near_duplicate_enabled = task['settings'].get('near_duplicate_filter', {}).get('enabled', False)
+            keyboard.append([
+                InlineKeyboardButton(
+                    f"{'✅' if near_duplicate_enabled else '❌'} 🧬 منع الرسائل المتشابهة",
+                    callback_data=f"toggle_similar_filter_{task_id}"
+                )
+            ])
+            
             keyboard.append([InlineKeyboardButton("🔙 العودة", callback_data=f"task_settings_{task_id}")])
             
             await update.callback_query.edit_message_text(
@@ -587,6 +603,27 @@ class TaskSettingsHandlers:
                     settings = task['settings']
                     settings['media_filters']['enabled'] = not current_state
                     await TaskManager.update_task_settings(task_id, settings)
+            elif filter_type == 'duplicate':
+                # تبديل منع الرسائل المكررة
+                settings = task['settings']
+                duplicate_filter = settings.get('duplicate_filter', {})
+                current_state = duplicate_filter.get('enabled', False)
+                duplicate_filter['enabled'] = not current_state
+                duplicate_filter.setdefault('window_seconds', Config.DUPLICATE_WINDOW_SECONDS)
+                settings['duplicate_filter'] = duplicate_filter
+
+                success = await TaskManager.update_task_settings(task_id, settings)
+            elif filter_type == 'similar':
+                # تبديل منع الرسائل المتشابهة (إعادة نشر مع تعديل بسيط)
+                settings = task['settings']
+                near_duplicate = settings.get('near_duplicate_filter', {})
+                current_state = near_duplicate.get('enabled', False)
+                near_duplicate['enabled'] = not current_state
+                near_duplicate.setdefault('threshold', Config.NEAR_DUPLICATE_THRESHOLD)
+                near_duplicate.setdefault('window_seconds', Config.DUPLICATE_WINDOW_SECONDS)
+                settings['near_duplicate_filter'] = near_duplicate
+
+                success = await TaskManager.update_task_settings(task_id, settings)
             else:
                 # فلاتر متقدمة أخرى
                 advanced_filters = task['settings'].get('advanced_filters', {})
@@ -990,17 +1027,18 @@ class TaskSettingsHandlers:
                 await update.callback_query.answer("❌ المهمة غير موجودة")
                 return
             
-            # الحصول على إعدادات القوائم
-            whitelist = task['settings'].get('whitelist', [])
-            blacklist = task['settings'].get('blacklist', [])
+            # الحصول على أعداد القوائم وأول المستخدمين فقط
+            counts = await TaskManager.get_user_list_counts(task_id)
+            whitelist = await TaskManager.get_user_list(task_id, 'whitelist', limit=5)
+            blacklist = await TaskManager.get_user_list(task_id, 'blacklist', limit=5)
             
             # إنشاء النص
             text = f"""
 👥 **قوائم المستخدمين**
 
 📝 **المهمة:** {task['task_name']}
-⚪ **القائمة البيضاء:** {len(whitelist)} مستخدم
-⚫ **القائمة السوداء:** {len(blacklist)} مستخدم
+⚪ **القائمة البيضاء:** {counts['whitelist']} مستخدم
+⚫ **القائمة السوداء:** {counts['blacklist']} مستخدم
 
 اختر العملية التي تريد تنفيذها:
             """
@@ -1021,17 +1059,17 @@ class TaskSettingsHandlers:
             # إضافة قائمة المستخدمين
             if whitelist:
                 text += "\n\n⚪ **القائمة البيضاء:**\n"
-                for i, user_id in enumerate(whitelist[:5], 1):
+                for i, user_id in enumerate(whitelist, 1):
                     text += f"{i}. `{user_id}`\n"
-                if len(whitelist) > 5:
-                    text += f"... و {len(whitelist) - 5} مستخدمين آخرين\n"
+                if counts['whitelist'] > 5:
+                    text += f"... و {counts['whitelist'] - 5} مستخدمين آخرين\n"
             
             if blacklist:
                 text += "\n⚫ **القائمة السوداء:**\n"
-                for i, user_id in enumerate(blacklist[:5], 1):
+                for i, user_id in enumerate(blacklist, 1):
                     text += f"{i}. `{user_id}`\n"
-                if len(blacklist) > 5:
-                    text += f"... و {len(blacklist) - 5} مستخدمين آخرين\n"
+                if counts['blacklist'] > 5:
+                    text += f"... و {counts['blacklist'] - 5} مستخدمين آخرين\n"
             
             await update.callback_query.edit_message_text(
                 text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown'
@@ -1407,27 +1445,28 @@ class TaskSettingsHandlers:
                 await update.callback_query.answer("❌ المهمة غير موجودة")
                 return
             
-            whitelist = task['settings'].get('whitelist', [])
+            total = (await TaskManager.get_user_list_counts(task_id))['whitelist']
+            whitelist = await TaskManager.get_user_list(task_id, 'whitelist', limit=10)
             
             text = f"""
 📝 **إدارة القائمة البيضاء**
 
 📝 **المهمة:** {task['task_name']}
-📊 **عدد المستخدمين:** {len(whitelist)}
+📊 **عدد المستخدمين:** {total}
 
 اختر المستخدم الذي تريد حذفه:
             """
             
             keyboard = []
-            for i, user_id in enumerate(whitelist[:10]):
+            for user_id in whitelist:
                 keyboard.append([
                     InlineKeyboardButton(
                         f"❌ {user_id}", 
-                        callback_data=f"remove_whitelist_{i}_{task_id}"
+                        callback_data=f"remove_whitelist_{user_id}_{task_id}"
                     )
                 ])
             
-            if len(whitelist) > 10:
+            if total > 10:
                 keyboard.append([
                     InlineKeyboardButton("📄 عرض المزيد", callback_data=f"whitelist_page_2_{task_id}")
                 ])
@@ -1457,27 +1496,28 @@ class TaskSettingsHandlers:
                 await update.callback_query.answer("❌ المهمة غير موجودة")
                 return
             
-            blacklist = task['settings'].get('blacklist', [])
+            total = (await TaskManager.get_user_list_counts(task_id))['blacklist']
+            blacklist = await TaskManager.get_user_list(task_id, 'blacklist', limit=10)
             
             text = f"""
 📝 **إدارة القائمة السوداء**
 
 📝 **المهمة:** {task['task_name']}
-📊 **عدد المستخدمين:** {len(blacklist)}
+📊 **عدد المستخدمين:** {total}
 
 اختر المستخدم الذي تريد حذفه:
             """
             
             keyboard = []
-            for i, user_id in enumerate(blacklist[:10]):
+            for user_id in blacklist:
                 keyboard.append([
                     InlineKeyboardButton(
                         f"❌ {user_id}", 
-                        callback_data=f"remove_blacklist_{i}_{task_id}"
+                        callback_data=f"remove_blacklist_{user_id}_{task_id}"
                     )
                 ])
             
-            if len(blacklist) > 10:
+            if total > 10:
                 keyboard.append([
                     InlineKeyboardButton("📄 عرض المزيد", callback_data=f"blacklist_page_2_{task_id}")
                 ])
@@ -1501,7 +1541,7 @@ class TaskSettingsHandlers:
         """حذف مستخدم من القائمة البيضاء"""
         try:
             data_parts = update.callback_query.data.split('_')
-            user_index = int(data_parts[2])
+            removed_user = int(data_parts[2])
             task_id = int(data_parts[3])
             
             task = await TaskManager.get_task(task_id)
@@ -1509,16 +1549,7 @@ class TaskSettingsHandlers:
                 await update.callback_query.answer("❌ المهمة غير موجودة")
                 return
             
-            whitelist = task['settings'].get('whitelist', [])
-            blacklist = task['settings'].get('blacklist', [])
-            
-            if user_index >= len(whitelist):
-                await update.callback_query.answer("❌ المستخدم غير موجود")
-                return
-            
-            removed_user = whitelist.pop(user_index)
-            
-            success = await TaskManager.update_user_lists(task_id, whitelist, blacklist)
+            success = await TaskManager.remove_from_list(task_id, removed_user, 'whitelist')
             
             if success:
                 await update.callback_query.answer(f"✅ تم حذف المستخدم: {removed_user}")
@@ -1536,7 +1567,7 @@ class TaskSettingsHandlers:
         """حذف مستخدم من القائمة السوداء"""
         try:
             data_parts = update.callback_query.data.split('_')
-            user_index = int(data_parts[2])
+            removed_user = int(data_parts[2])
             task_id = int(data_parts[3])
             
             task = await TaskManager.get_task(task_id)
@@ -1544,16 +1575,7 @@ class TaskSettingsHandlers:
                 await update.callback_query.answer("❌ المهمة غير موجودة")
                 return
             
-            whitelist = task['settings'].get('whitelist', [])
-            blacklist = task['settings'].get('blacklist', [])
-            
-            if user_index >= len(blacklist):
-                await update.callback_query.answer("❌ المستخدم غير موجود")
-                return
-            
-            removed_user = blacklist.pop(user_index)
-            
-            success = await TaskManager.update_user_lists(task_id, whitelist, blacklist)
+            success = await TaskManager.remove_from_list(task_id, removed_user, 'blacklist')
             
             if success:
                 await update.callback_query.answer(f"✅ تم حذف المستخدم: {removed_user}")
@@ -1577,9 +1599,7 @@ class TaskSettingsHandlers:
                 await update.callback_query.answer("❌ المهمة غير موجودة")
                 return
             
-            blacklist = task['settings'].get('blacklist', [])
-            
-            success = await TaskManager.update_user_lists(task_id, [], blacklist)
+            success = await TaskManager.clear_user_list(task_id, 'whitelist')
             
             if success:
                 await update.callback_query.answer("✅ تم حذف جميع المستخدمين من القائمة البيضاء")
@@ -1603,9 +1623,7 @@ class TaskSettingsHandlers:
                 await update.callback_query.answer("❌ المهمة غير موجودة")
                 return
             
-            whitelist = task['settings'].get('whitelist', [])
-            
-            success = await TaskManager.update_user_lists(task_id, whitelist, [])
+            success = await TaskManager.clear_user_list(task_id, 'blacklist')
             
             if success:
                 await update.callback_query.answer("✅ تم حذف جميع المستخدمين من القائمة السوداء")
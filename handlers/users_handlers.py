@@ -13,6 +13,29 @@ class UsersHandlers:
     @staticmethod
     async def view_all_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """عرض جميع المستخدمين مع التصفح"""
+        context.user_data['users_page'] = 1
+        await UsersHandlers._show_users_page(update, context, after=0)
+    
+    @staticmethod
+    async def users_page_navigate(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """الانتقال للصفحة التالية أو السابقة من قائمة المستخدمين"""
+        page = int(context.user_data.get('users_page', 1))
+        
+        if update.callback_query.data == "users_page_next":
+            context.user_data['users_page'] = page + 1
+            await UsersHandlers._show_users_page(
+                update, context, after=context.user_data.get('users_page_last', 0)
+            )
+        else:
+            context.user_data['users_page'] = max(1, page - 1)
+            await UsersHandlers._show_users_page(
+                update, context, before=context.user_data.get('users_page_first')
+            )
+    
+    @staticmethod
+    async def _show_users_page(update: Update, context: ContextTypes.DEFAULT_TYPE,
+                               after: int = None, before: int = None):
+        """صفحة مستخدمين بمؤشر user_id؛ لا تحمّل سوى صفوف الصفحة"""
         user_id = update.effective_user.id
         
         # التحقق من صلاحيات المدير
@@ -20,15 +43,24 @@ class UsersHandlers:
             await update.callback_query.answer("❌ غير مصرح لك بالوصول لهذه الميزة")
             return
         
-        page = int(context.user_data.get('users_page', 1))
         users_per_page = 5
         
-        users = await UserManager.get_all_users()
-        total_pages = (len(users) + users_per_page - 1) // users_per_page
+        if before is not None:
+            page_users, has_prev = await UserManager.get_users_page(before=before, limit=users_per_page)
+            has_next = True
+            if not has_prev:
+                context.user_data['users_page'] = 1
+        else:
+            page_users, has_next = await UserManager.get_users_page(after=after, limit=users_per_page)
+            has_prev = context.user_data.get('users_page', 1) > 1
+        
+        if page_users:
+            context.user_data['users_page_first'] = page_users[0]['user_id']
+            context.user_data['users_page_last'] = page_users[-1]['user_id']
         
-        start_idx = (page - 1) * users_per_page
-        end_idx = start_idx + users_per_page
-        page_users = users[start_idx:end_idx]
+        counts = await UserManager.get_user_counts()
+        total_pages = max(1, (counts.get('total_users', 0) + users_per_page - 1) // users_per_page)
+        page = min(context.user_data.get('users_page', 1), total_pages)
         
         text = f"👥 **جميع المستخدمين** (صفحة {page}/{total_pages})\n\n"
         
@@ -51,11 +83,11 @@ class UsersHandlers:
         
         # أزرار التصفح
         nav_buttons = []
-        if page > 1:
+        if has_prev:
             nav_buttons.append(
                 InlineKeyboardButton("⬅️ السابق", callback_data="users_page_prev")
             )
-        if page < total_pages:
+        if has_next:
             nav_buttons.append(
                 InlineKeyboardButton("التالي ➡️", callback_data="users_page_next")
             )
@@ -232,8 +264,7 @@ class UsersHandlers:
             return
         
         # الحصول على قائمة المديرين
-        users = await UserManager.get_all_users()
-        admins = [user for user in users if user['is_admin']]
+        admins = await UserManager.get_admins()
         
         text = f"👑 **إدارة المديرين** ({len(admins)} مدير)\n\n"
         
@@ -587,26 +618,21 @@ class UsersHandlers:
             await update.callback_query.answer("❌ غير مصرح لك بالوصول لهذه الميزة")
             return
         
-        # الحصول على الإحصائيات
-        users = await UserManager.get_all_users()
-        total_users = len(users)
-        active_users = len([u for u in users if u['is_active']])
-        admin_users = len([u for u in users if u['is_admin']])
+        # الحصول على الإحصائيات (استعلام تجميعي واحد)
+        counts = await UserManager.get_user_counts()
+        total_users = counts.get('total_users', 0)
+        active_users = counts.get('active_users', 0)
+        admin_users = counts.get('admin_users', 0)
         banned_users = total_users - active_users
         
         # إحصائيات التسجيل
-        from datetime import datetime, timedelta
-        today = datetime.now().date()
-        week_ago = today - timedelta(days=7)
-        month_ago = today - timedelta(days=30)
-        
-        new_users_today = len([u for u in users if u['created_at'].date() == today])
-        new_users_week = len([u for u in users if u['created_at'].date() >= week_ago])
-        new_users_month = len([u for u in users if u['created_at'].date() >= month_ago])
+        new_users_today = counts.get('new_today', 0)
+        new_users_week = counts.get('new_week', 0)
+        new_users_month = counts.get('new_month', 0)
         
         # إحصائيات النشاط
-        active_today = len([u for u in users if u['last_activity'].date() == today])
-        active_week = len([u for u in users if u['last_activity'].date() >= week_ago])
+        active_today = counts.get('active_today', 0)
+        active_week = counts.get('active_week', 0)
         
         text = f"""
 📊 **إحصائيات المستخدمين المفصلة**
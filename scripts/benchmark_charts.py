@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+قياس زمن رسم المخطط الزمني لمدى متزايد من البيانات الساعية، مع تقليل النقاط (LTTB) وبدونه
+الاستخدام: python scripts/benchmark_charts.py [--runs N] [--days 7 30 90 365]
+"""
+
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import matplotlib
+matplotlib.use('Agg')
+
+from utils import chart_renderer
+
+def synthetic_series(days: int):
+    """سلسلة ساعية بنمط يومي وضجيج وقفزات متفرقة"""
+    rng = np.random.default_rng(days)
+    hours = np.arange(days * 24)
+    daily = 20 + 15 * np.sin((hours % 24) / 24 * 2 * np.pi)
+    forwarded = rng.poisson(daily).astype(np.int64)
+    forwarded[rng.integers(0, len(hours), max(1, days // 10))] += 500
+    filtered = rng.poisson(daily / 5).astype(np.int64)
+    start = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(days=days)
+    return (start.timestamp(), 3600, forwarded, filtered)
+
+def timed_render(data, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        chart_renderer.render_chart('timeline', data)
+        samples.append((time.perf_counter() - start) * 1000)
+    return sorted(samples)[len(samples) // 2]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=3, help='عدد مرات الرسم لكل قياس (الوسيط)')
+    parser.add_argument('--days', type=int, nargs='+', default=[7, 30, 90, 365, 1095])
+    args = parser.parse_args()
+
+    downsample = chart_renderer.lttb
+    print(f"{'days':>6} {'points':>8} {'lttb':>10} {'raw':>10}")
+    for days in args.days:
+        data = synthetic_series(days)
+
+        chart_renderer.lttb = downsample
+        with_lttb = timed_render(data, args.runs)
+
+        chart_renderer.lttb = lambda x, y, threshold: (x, y)
+        raw = timed_render(data, args.runs)
+
+        print(f"{days:>6} {len(data[2]):>8} {with_lttb:>8.0f}ms {raw:>8.0f}ms")
+
+    chart_renderer.lttb = downsample
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+قياس أداء كشف وحذف الروابط في التعليقات الطويلة
+(الأنماط غير المترجمة السابقة مقابل الكيانات والنمط المترجم مسبقاً)
+"""
+
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import MessageEntity
+from utils.message_processor import LINK_PATTERN, link_spans, cut_spans
+
+# الأنماط كما كانت تمرر إلى re في كل استدعاء
+LEGACY_URL_PATTERN = r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\$$\$$,]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
+LEGACY_TELEGRAM_PATTERN = r'(?:@[a-zA-Z0-9_]+|t\.me/[a-zA-Z0-9_]+)'
+
+def build_caption(paragraphs: int = 40):
+    """تعليق طويل مع روابط وكيانات Telegram المطابقة له"""
+    text = ''
+    entities = []
+    for i in range(paragraphs):
+        text += 'نص عربي طويل للتجربة مع بعض الكلمات الإضافية في كل فقرة ' * 3
+        link = f'https://example.com/post/{i}?ref=channel'
+        entities.append(MessageEntity(MessageEntity.URL, len(text.encode('utf-16-le')) // 2, len(link)))
+        text += link + ' '
+        mention = f'@channel_{i}'
+        entities.append(MessageEntity(MessageEntity.MENTION, len(text.encode('utf-16-le')) // 2, len(mention)))
+        text += mention + '\n'
+    return text, entities
+
+def legacy_contains(text):
+    return bool(re.search(LEGACY_URL_PATTERN, text) or re.search(LEGACY_TELEGRAM_PATTERN, text))
+
+def legacy_remove(text):
+    text = re.sub(LEGACY_URL_PATTERN, '', text)
+    return re.sub(LEGACY_TELEGRAM_PATTERN, '', text)
+
+def clean_caption(paragraphs: int = 40):
+    """تعليق طويل بلا روابط: أسوأ حالة لأن النمط يمسح النص كاملاً"""
+    return 'نص عربي طويل للتجربة مع بعض الكلمات الإضافية في كل فقرة\n' * paragraphs * 3
+
+def run(label, func, number):
+    seconds = timeit.timeit(func, number=number)
+    print(f"{label:<40} {seconds / number * 1e6:10.1f} µs")
+    return seconds
+
+def main():
+    number = 2000
+    text, entities = build_caption()
+    clean = clean_caption()
+    link_types = (MessageEntity.URL, MessageEntity.TEXT_LINK, MessageEntity.MENTION)
+    print(f"📏 طول التعليق: {len(text)} حرف، {len(entities)} كيان\n")
+
+    print("🔍 كشف الروابط (نص بلا روابط)")
+    legacy = run("legacy re.search x2", lambda: legacy_contains(clean), number)
+    compiled = run("precompiled LINK_PATTERN", lambda: LINK_PATTERN.search(clean), number)
+    print(f"{'speedup':<40} {legacy / compiled:10.1f}x\n")
+
+    print("🔍 كشف الروابط (نص مع كيانات)")
+    legacy = run("legacy re.search x2", lambda: legacy_contains(text), number)
+    fast = run("entities", lambda: any(e.type in link_types for e in entities), number)
+    print(f"{'speedup':<40} {legacy / fast:10.1f}x\n")
+
+    print("✂️ حذف الروابط")
+    legacy = run("legacy re.sub x2", lambda: legacy_remove(text), number)
+    compiled = run("precompiled LINK_PATTERN.sub", lambda: LINK_PATTERN.sub('', text), number)
+    spans = link_spans(entities)
+    cut = run("entity offsets", lambda: cut_spans(text, spans), number)
+    print(f"{'speedup (regex / entities)':<40} {legacy / compiled:6.1f}x / {legacy / cut:.1f}x")
+
+    assert LINK_PATTERN.sub('', text) == cut_spans(text, spans)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+قياس زمن تهيئة المخطط عند الإقلاع: الترحيلات المعلقة ثم الإقلاع العادي
+الاستخدام: DATABASE_URL=... python scripts/benchmark_startup.py [--runs N]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+import asyncpg
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from database.migrations import run_migrations, LATEST_VERSION
+
+class CountingConnection:
+    """يعد الرحلات إلى الخادم التي ينفذها run_migrations"""
+
+    def __init__(self, conn: asyncpg.Connection):
+        self.conn = conn
+        self.round_trips = 0
+
+    async def execute(self, *args, **kwargs):
+        self.round_trips += 1
+        return await self.conn.execute(*args, **kwargs)
+
+    async def fetchval(self, *args, **kwargs):
+        self.round_trips += 1
+        return await self.conn.fetchval(*args, **kwargs)
+
+    async def fetchrow(self, *args, **kwargs):
+        self.round_trips += 1
+        return await self.conn.fetchrow(*args, **kwargs)
+
+    def transaction(self):
+        self.round_trips += 2  # BEGIN + COMMIT
+        return self.conn.transaction()
+
+async def timed_boot(conn: asyncpg.Connection):
+    counting = CountingConnection(conn)
+    start = time.perf_counter()
+    applied = await run_migrations(counting)
+    return (time.perf_counter() - start) * 1000, applied, counting.round_trips
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=20, help='عدد مرات قياس الإقلاع العادي')
+    args = parser.parse_args()
+
+    if not Config.DATABASE_URL:
+        sys.exit("DATABASE_URL غير محدد")
+
+    conn = await asyncpg.connect(Config.DATABASE_URL)
+    try:
+        print(f"🗄️ إصدار المخطط المطلوب: {LATEST_VERSION}\n")
+
+        elapsed, applied, round_trips = await timed_boot(conn)
+        print(f"{'first boot':<14} {elapsed:9.1f} ms  {round_trips:4d} round trips  ({applied} migrations)")
+
+        samples = [await timed_boot(conn) for _ in range(args.runs)]
+        times = sorted(sample[0] for sample in samples)
+        print(f"{'normal boot':<14} {times[len(times) // 2]:9.1f} ms  {samples[0][2]:4d} round trips  "
+              f"(median of {args.runs})")
+    finally:
+        await conn.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+قياس تكلفة تحميل المهام النشطة: dict(row) + json.loads مقابل codec ujson + TaskRecord
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import tracemalloc
+from datetime import datetime
+from decimal import Decimal
+
+import ujson
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.records import TaskRecord, TASK_COLUMNS
+
+SETTINGS = {
+    'forward_mode': 'copy',
+    'media_filters': {'enabled': True, 'allowed_types': ['photo', 'video', 'text']},
+    'blocked_words': ['spam', 'ads', 'promo'],
+    'replacements': {'old': 'new'},
+    'advanced_filters': {'block_links': True, 'block_forwarded': False},
+    'delay': {'enabled': False, 'seconds': 0},
+    'header': 'header text',
+    'footer': 'footer text'
+}
+
+def make_rows(count: int, settings_text: str):
+    """صفوف بترتيب TASK_COLUMNS، الإعدادات كنص JSON كما يعيدها asyncpg بدون codec"""
+    now = datetime.now()
+    return [
+        (i, 1000 + i % 500, f'task {i}', -100000 - i, -200000 - i, 'forward',
+         True, settings_text, now, now, None, 1, None, 0, 0, 0, Decimal('0.00'))
+        for i in range(count)
+    ]
+
+def load_legacy(rows):
+    tasks = []
+    for row in rows:
+        task = dict(zip(TASK_COLUMNS, row))
+        task['settings'] = json.loads(task['settings']) if task['settings'] else {}
+        tasks.append(task)
+    return tasks
+
+def load_records(rows):
+    # codec ujson يفك JSONB أثناء قراءة الصف؛ نحاكيه هنا قبل بناء السجل
+    return [
+        TaskRecord.from_row(row[:7] + (ujson.loads(row[7]),) + row[8:])
+        for row in rows
+    ]
+
+def measure(label, loader, rows):
+    # الوقت بدون tracemalloc لأنه يبطئ كل عملية تخصيص، وبدون gc كما يفعل timeit
+    gc.collect()
+    gc.disable()
+    start = time.perf_counter()
+    tasks = loader(rows)
+    elapsed = time.perf_counter() - start
+    gc.enable()
+    del tasks
+
+    gc.collect()
+    tracemalloc.start()
+    tasks = loader(rows)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {elapsed * 1000:9.1f} ms {retained / len(tasks):9.0f} B/task")
+    del tasks
+    return elapsed, retained
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rows = make_rows(count, json.dumps(SETTINGS))
+    print(f"📦 تحميل {count:,} مهمة نشطة\n")
+
+    legacy_time, legacy_memory = measure("dict(row) + json.loads", load_legacy, rows)
+    record_time, record_memory = measure("ujson codec + TaskRecord", load_records, rows)
+
+    print(f"\n⚡ CPU: {legacy_time / record_time:.1f}x  💾 memory: {legacy_memory / record_memory:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+قياس الذاكرة لكل مهمة نشطة: TaskRecord مع إعدادات dict مقابل ForwardingTask مع CompiledSettings
+الاستخدام: python scripts/benchmark_task_memory.py [--variants N] [--legacy-max N]
+"""
+
+import os
+import gc
+import sys
+import argparse
+import tracemalloc
+from datetime import datetime
+from decimal import Decimal
+
+import ujson
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.records import TaskRecord
+from utils.task_model import ForwardingTask
+
+SIZES = (10_000, 100_000, 1_000_000)
+
+def settings_template(variant: int) -> str:
+    """إعدادات واقعية؛ variant يغير التذييل لإنتاج إعدادات مختلفة"""
+    return ujson.dumps({
+        'forward_mode': 'copy',
+        'media_filters': {'enabled': True, 'allowed_types': ['photo', 'video', 'text']},
+        'blocked_words': ['spam', 'ads', 'promo'],
+        'required_words': [],
+        'replacements': {'old': 'new'},
+        'advanced_filters': {'block_links': True, 'block_forwarded': False},
+        'delay': {'enabled': False, 'seconds': 0},
+        'header': '',
+        'footer': f'footer {variant}'
+    }, ensure_ascii=False)
+
+def iter_records(count: int, variants: int):
+    """سجلات كما تعيدها get_active_tasks (الإعدادات مفكوكة بواسطة codec)"""
+    templates = [settings_template(i) for i in range(variants or count)]
+    now = datetime.now()
+    for i in range(count):
+        settings = ujson.loads(templates[i % len(templates)])
+        yield TaskRecord(i, 1000 + i % 500, f'task {i}', -100000 - i % 5000, -200000 - i, 'forward',
+                         True, settings, now, now, 'description', 1, now, 0, 0, 0, Decimal('0.00'))
+
+def build_records(records):
+    return {record['id']: record for record in records}
+
+def build_forwarding_tasks(records):
+    interned = {}
+    return {
+        record['id']: ForwardingTask.from_record(record, None, interned)
+        for record in records
+    }
+
+def bytes_per_task(builder, count: int, variants: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    tasks = builder(iter_records(count, variants))
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del tasks
+    gc.collect()
+    return retained / count
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--variants', type=int, default=100,
+                        help='عدد الإعدادات المختلفة (0 = كل مهمة مختلفة)')
+    parser.add_argument('--legacy-max', type=int, default=100_000,
+                        help='أكبر عدد يقاس للنموذج القديم (1M يحتاج عدة GB)')
+    args = parser.parse_args()
+
+    print(f"💾 الذاكرة لكل مهمة (إعدادات مختلفة: {args.variants or 'الكل'})\n")
+    print(f"{'tasks':>10} {'TaskRecord+dict':>18} {'ForwardingTask':>16} {'ratio':>7}")
+    for count in SIZES:
+        compact = bytes_per_task(build_forwarding_tasks, count, args.variants)
+        if count <= args.legacy_max:
+            legacy = bytes_per_task(build_records, count, args.variants)
+            print(f"{count:>10,} {legacy:>16.0f} B {compact:>14.0f} B {legacy / compact:>6.1f}x")
+        else:
+            print(f"{count:>10,} {'skipped':>18} {compact:>14.0f} B {'':>7}")
+
+if __name__ == "__main__":
+    main()
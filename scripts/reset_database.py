@@ -9,11 +9,26 @@ async def reset_database():
         
         print("🔄 Resetting database...")
         
-        # حذف جميع الجداول بالترتيب الصحيح
+        # حذف جميع الجداول التي تنشئها الترحيلات بالترتيب الصحيح؛ أقسام statistics الشهرية
+        # تحذف مع الجدول الأصل، وmessage_filters الاسم القديم لـ task_filters
         tables_to_drop = [
+            'schema_version',
+            'statistics_rollup_state',
+            'statistics_monthly',
+            'statistics_daily',
+            'statistics_unpartitioned',
+            'filter_rejections',
+            'broadcasts',
+            'notifications',
+            'backup_files',
+            'activity_logs',
+            'active_sessions',
+            'user_settings',
+            'task_user_lists',
             'error_logs',
             'userbot_sessions', 
             'statistics',
+            'task_filters',
             'message_filters',
             'forwarding_tasks',
             'users'
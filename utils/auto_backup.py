@@ -24,7 +24,7 @@ class AutoBackupSystem:
                 "activity_logs", "userbot_sessions", "notifications"
             ]
             
-            async with db.pool.acquire() as conn:
+            async with db.bulk_pool.acquire() as conn:
                 for table in tables:
                     try:
                         # الحصول على بيانات الجدول
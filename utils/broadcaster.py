@@ -0,0 +1,156 @@
+import os
+import time
+import uuid
+import socket
+import asyncio
+from typing import Dict, Iterable, Optional
+from telegram.error import Forbidden
+from config import Config
+from database.broadcast_manager import BroadcastManager
+from .rate_limiter import RateLimiter, send_limiter, send_message_limited
+
+# نتيجة إرسال رسالة واحدة
+SENT = 'sent'
+FAILED = 'failed'
+BLOCKED = 'blocked'  # 403: المستخدم حظر البوت أو حذف حسابه
+
+DEFAULT_TITLE = 'إشعار النظام'
+
+async def send_classified(bot, chat_id: int, text: str, limiter: RateLimiter = send_limiter,
+                          parse_mode: Optional[str] = 'Markdown') -> str:
+    """إرسال رسالة عبر محدد المعدل وإرجاع SENT أو FAILED أو BLOCKED بدلاً من رفع استثناء"""
+    try:
+        await send_message_limited(bot, chat_id, text, limiter, parse_mode=parse_mode)
+        return SENT
+    except Forbidden:
+        return BLOCKED
+    except Exception as e:
+        print(f"Failed to send message to {chat_id}: {e}")
+        return FAILED
+
+class Broadcaster:
+    """محرك البث الجماعي: يمر على المستخدمين بدفعات مرتبة حسب user_id ويرسل عبر
+    محدد المعدل المشترك، ويحفظ نقطة الاستئناف بعد كل دفعة.
+
+    عند إعادة التشغيل يكمل البث من آخر دفعة محفوظة، فأقصى تكرار هو دفعة واحدة
+    (BROADCAST_BATCH_SIZE) كانت قيد الإرسال لحظة التوقف. كل بث محجوز باسم هذه النسخة
+    (owner) بمهلة تجددها نقاط الحفظ، فلا تأخذه نسخة أخرى إلا بعد توقفها.
+    """
+
+    def __init__(self, limiter: RateLimiter = send_limiter, batch_size: int = Config.BROADCAST_BATCH_SIZE,
+                 poll_interval: float = Config.BROADCAST_POLL_SECONDS,
+                 lease_seconds: int = Config.BROADCAST_LEASE_SECONDS):
+        self.limiter = limiter
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.bot = None
+        self.current: Optional[int] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def send_to(self, bot, user_ids: Iterable[int], text: str,
+                      parse_mode: Optional[str] = 'Markdown') -> Dict[str, int]:
+        """إرسال فوري لقائمة قصيرة (المديرين) عبر محدد المعدل نفسه، بدون نقطة استئناف"""
+        results = await asyncio.gather(*(
+            send_classified(bot, user_id, text, self.limiter, parse_mode) for user_id in user_ids
+        ))
+        return {status: results.count(status) for status in (SENT, FAILED, BLOCKED)}
+
+    async def enqueue(self, message: str, title: Optional[str] = None, parse_mode: Optional[str] = 'Markdown',
+                      admin_only: bool = False, created_by: Optional[int] = None) -> Optional[int]:
+        """إنشاء بث وإيقاظ المحرك؛ يعيد رقم البث"""
+        broadcast_id = await BroadcastManager.create_broadcast(message, title, parse_mode, admin_only, created_by)
+        if broadcast_id is not None:
+            self.wake()
+        return broadcast_id
+
+    def wake(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    @staticmethod
+    def format_message(broadcast: dict) -> str:
+        return f"🔔 **{broadcast['title'] or DEFAULT_TITLE}**\n\n{broadcast['message']}"
+
+    async def _deliver(self, broadcast: dict) -> None:
+        """إرسال بث واحد من نقطة استئنافه حتى آخر مستخدم أو حتى إلغائه"""
+        broadcast_id = broadcast['id']
+        text = self.format_message(broadcast)
+        after = broadcast['last_user_id']
+
+        while True:
+            recipients = await BroadcastManager.get_recipients(after, self.batch_size, broadcast['admin_only'])
+            if not recipients:
+                break
+
+            # الرسائل تتداخل حتى يبقى محدد المعدل هو الحد الوحيد، لا زمن رد كل رسالة
+            batch_started = time.monotonic()
+            results = await asyncio.gather(*(
+                send_classified(self.bot, user_id, text, self.limiter, broadcast['parse_mode'])
+                for user_id in recipients
+            ))
+            blocked = [user_id for user_id, result in zip(recipients, results) if result == BLOCKED]
+
+            after = recipients[-1]
+            status = await BroadcastManager.save_progress(
+                broadcast_id, self.owner, after, results.count(SENT), results.count(FAILED), blocked,
+                time.monotonic() - batch_started
+            )
+            if status != 'running':
+                # None: انتهت المهلة وأخذت نسخة أخرى البث
+                print(f"Broadcast {broadcast_id} stopped: {status or 'claimed by another instance'}")
+                return
+
+        await BroadcastManager.finish_broadcast(broadcast_id, self.owner)
+
+    async def run(self):
+        """تنفيذ البثوث المعلقة واحداً بعد الآخر، والانتظار حتى enqueue أو poll_interval"""
+        self._wake = asyncio.Event()
+        while True:
+            self._wake.clear()
+            try:
+                broadcast = await BroadcastManager.claim_next_broadcast(self.owner, self.lease_seconds)
+                if broadcast:
+                    self.current = broadcast['id']
+                    await self._deliver(broadcast)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # يعاد المحاولة من آخر نقطة محفوظة
+                print(f"Error running broadcast: {e}")
+            finally:
+                self.current = None
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, bot) -> None:
+        """بدء المحرك؛ يستأنف أي بث لم يكتمل قبل آخر توقف"""
+        self.bot = bot
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """إيقاف المحرك؛ البث الجاري يبقى running ويترك حجزه فيستأنف عند التشغيل التالي"""
+        if self._task is not None:
+            current = self.current
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+            if current is not None:
+                try:
+                    await BroadcastManager.release_broadcast(current, self.owner)
+                except Exception as e:
+                    print(f"Error releasing broadcast {current}: {e}")
+
+# Global broadcaster instance
+broadcaster = Broadcaster()
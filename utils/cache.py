@@ -0,0 +1,102 @@
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+class LRUCache:
+    """ذاكرة تخزين مؤقت محدودة (عدد عناصر/حجم/مدة صلاحية) مع إخراج الأقدم استخداماً"""
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 0, ttl: float = 0,
+                 sizeof: Optional[Callable[[Hashable, Any], int]] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes  # 0 = بدون حد للحجم
+        self.ttl = ttl  # 0 = بدون انتهاء صلاحية
+        self._sizeof = sizeof or self._default_sizeof
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _default_sizeof(key: Hashable, value: Any) -> int:
+        """تقدير تقريبي لحجم العنصر في الذاكرة"""
+        return sys.getsizeof(key) + sys.getsizeof(value)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """الحصول على قيمة وتحديث ترتيب الاستخدام"""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        value, size, expires_at = entry
+        if expires_at and expires_at <= time.monotonic():
+            self._remove(key, size)
+            self.expirations += 1
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """إضافة أو تحديث قيمة مع احترام حدود الذاكرة"""
+        old = self._data.pop(key, None)
+        if old is not None:
+            self.current_bytes -= old[1]
+
+        size = self._sizeof(key, value)
+        if self.max_bytes and size > self.max_bytes:
+            return
+
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0
+        self._data[key] = (value, size, expires_at)
+        self.current_bytes += size
+
+        while self._data and (
+            len(self._data) > self.max_entries
+            or (self.max_bytes and self.current_bytes > self.max_bytes)
+        ):
+            _, (_, evicted_size, _) = self._data.popitem(last=False)
+            self.current_bytes -= evicted_size
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        """حذف عنصر محدد"""
+        entry = self._data.get(key)
+        if entry is None:
+            return False
+        self._remove(key, entry[1])
+        return True
+
+    def clear(self) -> None:
+        """مسح جميع العناصر مع الإبقاء على العدادات"""
+        self._data.clear()
+        self.current_bytes = 0
+
+    def _remove(self, key: Hashable, size: int) -> None:
+        del self._data[key]
+        self.current_bytes -= size
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and not (entry[2] and entry[2] <= time.monotonic())
+
+    def stats(self) -> Dict[str, Any]:
+        """إحصائيات الاستخدام (نسبة الإصابة والحجم)"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._data),
+            'bytes': self.current_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / lookups * 100) if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
@@ -0,0 +1,259 @@
+import io
+import asyncio
+import hashlib
+import pickle
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+from config import Config
+from .cache import LRUCache
+from .downsample import lttb
+
+logger = logging.getLogger(__name__)
+
+class ChartQueueFull(Exception):
+    """عدد طلبات الرسم المنتظرة تجاوز الحد"""
+
+# ---------------------------------------------------------------------------
+# دوال الرسم: تعمل داخل عملية منفصلة وتستخدم Figure مباشرة بدون pyplot،
+# فلا حالة عامة مشتركة بين الرسوم. البيانات المدخلة أعداد وقوائم بسيطة فقط
+# ---------------------------------------------------------------------------
+
+def _new_figure(width: float, height: float):
+    from matplotlib.figure import Figure
+    return Figure(figsize=(width, height))
+
+def _to_png(fig) -> bytes:
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    FigureCanvasAgg(fig)
+    fig.tight_layout()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=Config.CHART_DPI, bbox_inches='tight')
+    return buffer.getvalue()
+
+def _render_tasks(data: Tuple[int, int, int, int]) -> bytes:
+    """(نشطة، متوقفة، توجيه، نسخ)"""
+    active, inactive, forward, copy = data
+    fig = _new_figure(12, 6)
+    ax1, ax2 = fig.subplots(1, 2)
+
+    ax1.pie([active, inactive], labels=['نشطة', 'متوقفة'], colors=['#4CAF50', '#F44336'],
+            autopct='%1.1f%%', startangle=90)
+    ax1.set_title('حالة المهام')
+
+    ax2.bar(['توجيه', 'نسخ'], [forward, copy], color=['#2196F3', '#FF9800'])
+    ax2.set_title('أنواع المهام')
+    ax2.set_ylabel('عدد المهام')
+    return _to_png(fig)
+
+def _render_messages(data: Tuple[int, Sequence[int], Sequence[int]]) -> bytes:
+    """(ترتيب أول يوم، الموجهة يومياً، المرشحة يومياً)"""
+    import matplotlib.dates as mdates
+
+    first_day, forwarded, filtered = data
+    start = date.fromordinal(first_day)
+    dates = [start + timedelta(days=i) for i in range(len(forwarded))]
+
+    fig = _new_figure(12, 6)
+    ax = fig.subplots()
+    ax.plot(dates, forwarded, label='رسائل موجهة', color='#4CAF50', linewidth=2)
+    ax.plot(dates, filtered, label='رسائل مرشحة', color='#F44336', linewidth=2)
+
+    ax.set_title(f'إحصائيات الرسائل - آخر {len(dates)} يوم')
+    ax.set_xlabel('التاريخ')
+    ax.set_ylabel('عدد الرسائل')
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%m/%d'))
+    ax.xaxis.set_major_locator(mdates.DayLocator(interval=5))
+    ax.tick_params(axis='x', labelrotation=45)
+    return _to_png(fig)
+
+def _plot_points(ax) -> int:
+    """أقصى عدد نقاط مفيد: عرض منطقة الرسم بالبكسل، فالنقاط الزائدة لا تضيف تفصيلاً مرئياً"""
+    return int(ax.get_position().width * ax.figure.get_figwidth() * Config.CHART_DPI * Config.CHART_POINTS_PER_PIXEL)
+
+def _render_timeline(data: Tuple[float, int, Sequence[int], Sequence[int]]) -> bytes:
+    """(طابع زمني لأول فترة، طول الفترة بالثواني، الموجهة، المرشحة) لكل فترة"""
+    import numpy as np
+    import matplotlib.dates as mdates
+
+    first_bucket, bucket_seconds, forwarded, filtered = data
+    buckets = (np.datetime64(datetime.fromtimestamp(first_bucket), 's')
+               + np.arange(len(forwarded)) * np.timedelta64(bucket_seconds, 's'))
+    days = max(1, round(len(buckets) * bucket_seconds / 86400))
+
+    fig = _new_figure(14, 6)
+    ax = fig.subplots()
+
+    max_points = _plot_points(ax)
+    forwarded_x, forwarded_y = lttb(buckets, np.asarray(forwarded), max_points)
+    filtered_x, filtered_y = lttb(buckets, np.asarray(filtered), max_points)
+
+    ax.plot(forwarded_x, forwarded_y, label='رسائل موجهة', color='#2196F3', linewidth=1.5, alpha=0.8)
+    ax.fill_between(forwarded_x, forwarded_y, alpha=0.3, color='#2196F3')
+    ax.plot(filtered_x, filtered_y, label='رسائل مرشحة', color='#F44336', linewidth=1, alpha=0.8)
+
+    ax.set_title(f'النشاط الزمني - آخر {days} أيام')
+    ax.set_xlabel('الوقت')
+    ax.set_ylabel('عدد الرسائل')
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%m/%d %H:%M'))
+    ax.xaxis.set_major_locator(mdates.AutoDateLocator())
+    ax.tick_params(axis='x', labelrotation=45)
+    return _to_png(fig)
+
+def _render_filters(data: Tuple[Sequence[str], Sequence[int]]) -> bytes:
+    """(أسباب الرفض، عدد الرسائل لكل سبب) مرتبة من الأكثر"""
+    reasons, counts = data
+    fig = _new_figure(10, max(4, 0.6 * len(reasons) + 2))
+    ax = fig.subplots()
+
+    positions = range(len(reasons))
+    bars = ax.barh(positions, counts, color='#F44336')
+    ax.set_yticks(positions, labels=reasons)
+    ax.invert_yaxis()
+    ax.set_title('أسباب رفض الرسائل')
+    ax.set_xlabel('عدد الرسائل')
+
+    for bar, count in zip(bars, counts):
+        ax.text(bar.get_width(), bar.get_y() + bar.get_height() / 2.,
+                f' {count:,}', ha='left', va='center')
+
+    return _to_png(fig)
+
+def _render_users(data: Tuple[int, int, int]) -> bytes:
+    """(الإجمالي، النشطون، المديرون)"""
+    total, active, admins = data
+    fig = _new_figure(12, 6)
+    ax1, ax2 = fig.subplots(1, 2)
+
+    ax1.pie([active, total - active], labels=['نشطين', 'محظورين'], colors=['#4CAF50', '#F44336'],
+            autopct='%1.1f%%', startangle=90)
+    ax1.set_title('حالة المستخدمين')
+
+    ax2.bar(['مستخدمين عاديين', 'مديرين'], [total - admins, admins], color=['#2196F3', '#FF9800'])
+    ax2.set_title('أنواع المستخدمين')
+    ax2.set_ylabel('العدد')
+    return _to_png(fig)
+
+def _render_comprehensive(data: Tuple[int, int, int, int, int, int]) -> bytes:
+    """(نشطة، متوقفة، توجيه، نسخ، موجهة، مرشحة)"""
+    active, inactive, forward, copy, forwarded, filtered = data
+    fig = _new_figure(15, 10)
+    (ax1, ax2), (ax3, ax4) = fig.subplots(2, 2)
+
+    ax1.pie([active, inactive], labels=['نشطة', 'متوقفة'],
+            colors=['#4CAF50', '#F44336'], autopct='%1.1f%%')
+    ax1.set_title('حالة المهام')
+
+    ax2.bar(['توجيه', 'نسخ'], [forward, copy], color=['#2196F3', '#FF9800'])
+    ax2.set_title('أنواع المهام')
+    ax2.set_ylabel('العدد')
+
+    ax3.bar(['موجهة', 'مرشحة'], [forwarded, filtered], color=['#4CAF50', '#F44336'])
+    ax3.set_title('إحصائيات الرسائل')
+    ax3.set_ylabel('العدد')
+
+    if forwarded + filtered > 0:
+        success_rate = (forwarded / (forwarded + filtered)) * 100
+        ax4.pie([success_rate, 100 - success_rate],
+                labels=[f'نجح {success_rate:.1f}%', f'فشل {100 - success_rate:.1f}%'],
+                colors=['#4CAF50', '#F44336'], autopct='%1.1f%%')
+    else:
+        ax4.text(0.5, 0.5, 'لا توجد بيانات', ha='center', va='center')
+    ax4.set_title('معدل النجاح')
+    return _to_png(fig)
+
+RENDERERS: Dict[str, Callable[[Any], bytes]] = {
+    'tasks': _render_tasks,
+    'messages': _render_messages,
+    'timeline': _render_timeline,
+    'filters': _render_filters,
+    'users': _render_users,
+    'comprehensive': _render_comprehensive,
+}
+
+def render_chart(kind: str, data: Any) -> bytes:
+    """نقطة الدخول في العملية العاملة"""
+    return RENDERERS[kind](data)
+
+def _init_worker() -> None:
+    import matplotlib
+    matplotlib.use('Agg')
+
+# ---------------------------------------------------------------------------
+
+class ChartRenderer:
+    """خدمة رسم في مجموعة عمليات منفصلة حتى لا تتوقف حلقة asyncio أثناء الرسم.
+
+    عدد الرسوم المتزامنة محدود بعدد العمليات، والطلبات الزائدة تنتظر دورها
+    حتى حد أقصى للطابور ثم ترفض بـ ChartQueueFull.
+    """
+
+    def __init__(self, workers: int = Config.CHART_WORKERS, max_queue: int = Config.CHART_MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.pending = 0
+        self.rendered = 0
+        self.rejected = 0
+
+    def _ensure_started(self) -> None:
+        if self._executor is None:
+            # spawn: لا نرث حلقة asyncio والخيوط واتصالات قاعدة البيانات من العملية الرئيسية
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker
+            )
+            self._slots = asyncio.Semaphore(self.workers)
+
+    async def render(self, kind: str, data: Any) -> bytes:
+        """رسم مخطط وإرجاع PNG"""
+        if kind not in RENDERERS:
+            raise ValueError(f"Unknown chart type: {kind}")
+        if self.pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise ChartQueueFull(f"{self.pending} charts already pending")
+
+        self._ensure_started()
+        self.pending += 1
+        try:
+            async with self._slots:
+                loop = asyncio.get_running_loop()
+                image = await loop.run_in_executor(self._executor, render_chart, kind, data)
+                self.rendered += 1
+                return image
+        finally:
+            self.pending -= 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._slots = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'workers': self.workers,
+            'pending': self.pending,
+            'rendered': self.rendered,
+            'rejected': self.rejected
+        }
+
+# Global chart renderer instance
+chart_renderer = ChartRenderer()
+
+def chart_fingerprint(data: Any) -> str:
+    """بصمة بيانات المخطط؛ أي تغير في السلاسل (قوائم أو مصفوفات NumPy) يعطي بصمة مختلفة"""
+    return hashlib.blake2b(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL), digest_size=16).hexdigest()
+
+# file_id لصور المخططات المرسلة، المفتاح (النوع، المستخدم، الفترة، بصمة البيانات)
+chart_cache = LRUCache(max_entries=Config.CHART_CACHE_MAX_ENTRIES, ttl=Config.CHART_CACHE_TTL_SECONDS)
@@ -0,0 +1,43 @@
+import numpy as np
+from typing import Tuple
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> Tuple[np.ndarray, np.ndarray]:
+    """تقليل النقاط بخوارزمية Largest-Triangle-Three-Buckets مع الحفاظ على شكل المنحنى.
+
+    يبقي أول وآخر نقطة، ومن كل دلو بينهما النقطة التي تصنع أكبر مثلث مع النقطة
+    المختارة قبلها ومتوسط الدلو التالي. الحلقة على الدلاء فقط، فالتكلفة محدودة بـ threshold.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return x, y
+
+    # x كأعداد لحساب المساحات (datetime64 → ثوان)
+    xs = x.astype('datetime64[s]').astype(np.float64) if np.issubdtype(x.dtype, np.datetime64) else x.astype(np.float64)
+    ys = y.astype(np.float64)
+
+    edges = (np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+
+    # متوسط كل دلو (والدلو الأخير هو النقطة الأخيرة) بالمجموع التراكمي
+    next_starts = np.append(edges[1:], n - 1)
+    next_ends = np.append(edges[2:], [n, n])
+    cum_x = np.concatenate(([0.0], np.cumsum(xs)))
+    cum_y = np.concatenate(([0.0], np.cumsum(ys)))
+    counts = next_ends - next_starts
+    avg_x = (cum_x[next_ends] - cum_x[next_starts]) / counts
+    avg_y = (cum_y[next_ends] - cum_y[next_starts]) / counts
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        areas = np.abs(
+            (xs[a] - avg_x[i]) * (ys[start:end] - ys[a])
+            - (xs[a] - xs[start:end]) * (avg_y[i] - ys[a])
+        )
+        a = start + int(areas.argmax())
+        selected[i + 1] = a
+
+    return x[selected], y[selected]
@@ -0,0 +1,80 @@
+import re
+import time
+import hashlib
+from typing import Dict, Any, Optional
+from telegram import Message
+from config import Config
+from utils.cache import LRUCache
+from utils.task_model import ForwardingTask
+
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivial whitespace/case differences hash the same"""
+    return WHITESPACE_PATTERN.sub(' ', text).strip().casefold()
+
+def message_fingerprint(message: Message) -> Optional[bytes]:
+    """file_unique_id for media, normalized text hash for text"""
+    media = (
+        (message.photo[-1] if message.photo else None)
+        or message.video or message.audio or message.document or message.voice
+        or message.video_note or message.sticker or message.animation
+    )
+    if media is not None:
+        return b'm' + media.file_unique_id.encode('utf-8')
+
+    text = normalize_text(message.text or message.caption or "")
+    if not text:
+        return None
+
+    return b't' + hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+class DuplicateSuppressor:
+    """Time-windowed fingerprint sets, one bounded LRU per target chat"""
+
+    def __init__(self, max_entries_per_target: int = Config.DUPLICATE_MAX_ENTRIES_PER_TARGET,
+                 max_window: int = Config.DUPLICATE_MAX_WINDOW_SECONDS):
+        self.max_entries_per_target = max_entries_per_target
+        self.max_window = max_window
+        self.targets: Dict[int, LRUCache] = {}
+        self.suppressed = 0
+
+    def _target_store(self, target_chat_id: int) -> LRUCache:
+        store = self.targets.get(target_chat_id)
+        if store is None:
+            store = LRUCache(max_entries=self.max_entries_per_target, ttl=self.max_window)
+            self.targets[target_chat_id] = store
+        return store
+
+    def is_duplicate(self, task: ForwardingTask, message: Message) -> bool:
+        """Check and record the message; True when seen within the task window"""
+        window = task.settings.duplicate_window
+        if window is None:
+            return False
+
+        fingerprint = message_fingerprint(message)
+        if fingerprint is None:
+            return False
+
+        window = min(window, self.max_window)
+        store = self._target_store(task.target_chat_id)
+        now = time.monotonic()
+
+        seen_at = store.get(fingerprint)
+        if seen_at is not None and now - seen_at < window:
+            self.suppressed += 1
+            return True
+
+        store.set(fingerprint, now)
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-target fill level and total suppressed messages"""
+        return {
+            'targets': len(self.targets),
+            'entries': sum(len(store) for store in self.targets.values()),
+            'suppressed': self.suppressed
+        }
+
+# Global duplicate suppressor instance
+duplicate_suppressor = DuplicateSuppressor()
@@ -1,47 +1,137 @@
 import re
+import hashlib
 import asyncio
-from typing import Dict, Any, Optional, List
-from telegram import Message
+from typing import Dict, Any, Optional, List, Sequence, Tuple
+from telegram import Message, MessageEntity
 from telegram.constants import MessageType
 import validators
+from config import Config
+from utils.cache import LRUCache
+from utils.near_duplicate import near_duplicate_detector
+from utils.user_id_set import UserIdSet
+from utils.task_model import CompiledSettings, EMPTY_USER_IDS
+
+# URLs and Telegram links/usernames in a single pass; fallback when no entities exist.
+# One shared prefix group keeps the scan cheap, the tail depends on how the prefix ended.
+LINK_PATTERN = re.compile(
+    r'(?:https?://|www\.|(?:t|telegram)\.me/|@)'
+    r'(?:(?<=[/.])[^\s<>"\']+|(?<=@)[a-zA-Z0-9_]+)'
+)
+
+# Entities that count as links; text_link hides its URL behind plain text
+LINK_ENTITY_TYPES = frozenset({MessageEntity.URL, MessageEntity.TEXT_LINK, MessageEntity.MENTION})
+# Entities whose visible text is the link itself and gets cut on removal
+REMOVABLE_ENTITY_TYPES = frozenset({MessageEntity.URL, MessageEntity.MENTION})
+
+# Reject reasons reported by filter_message, counted per task and hour in filter_rejections
+REASON_BLACKLIST = 'blacklist'
+REASON_WHITELIST = 'whitelist'
+REASON_MEDIA_TYPE = 'media_type'
+REASON_BLOCKED_WORD = 'blocked_word'
+REASON_REQUIRED_WORD = 'required_word'
+REASON_LINK = 'link'
+REASON_MENTION = 'mention'
+REASON_FORWARDED = 'forwarded'
+REASON_INLINE_KEYBOARD = 'inline_keyboard'
+REASON_DUPLICATE = 'duplicate'
+REASON_NEAR_DUPLICATE = 'near_duplicate'
+
+# Cached verdict for messages that pass every filter (None means a cache miss)
+FORWARD = ''
+
+def message_entities(message: Message) -> Sequence[MessageEntity]:
+    """Entities of the text or the caption, whichever the message carries"""
+    return message.entities or message.caption_entities or ()
+
+def link_spans(entities: Sequence[MessageEntity]) -> Tuple[Tuple[int, int], ...]:
+    """(offset, length) of removable link entities, in UTF-16 code units"""
+    return tuple(
+        (entity.offset, entity.length)
+        for entity in entities if entity.type in REMOVABLE_ENTITY_TYPES
+    )
+
+def cut_spans(text: str, spans: Sequence[Tuple[int, int]]) -> str:
+    """Remove UTF-16 ranges from text (Telegram offsets count UTF-16 units)"""
+    encoded = text.encode('utf-16-le')
+    parts = []
+    position = 0
+    for offset, length in sorted(spans):
+        start = max(offset * 2, position)
+        parts.append(encoded[position:start])
+        position = max(position, (offset + length) * 2)
+    parts.append(encoded[position:])
+    return b''.join(parts).decode('utf-16-le')
+
+# Shared across all tasks: reposts of the same post hit the same entries
+decision_cache = LRUCache(
+    max_entries=Config.FILTER_CACHE_MAX_ENTRIES,
+    max_bytes=Config.FILTER_CACHE_MAX_BYTES
+)
 
 class MessageProcessor:
-    def __init__(self, task_settings: Dict[str, Any]):
-        self.settings = task_settings
+    __slots__ = ('settings', 'whitelist', 'blacklist')
+    
+    def __init__(self, settings: CompiledSettings, whitelist: UserIdSet = EMPTY_USER_IDS,
+                 blacklist: UserIdSet = EMPTY_USER_IDS):
+        self.settings = settings
+        self.whitelist = whitelist
+        self.blacklist = blacklist
+    
+    @staticmethod
+    def _text_hash(text: str) -> bytes:
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+    
+    @staticmethod
+    def cache_stats() -> Dict[str, Any]:
+        """Hit-rate and memory usage of the filter decision cache"""
+        return decision_cache.stats()
     
     async def should_forward_message(self, message: Message) -> bool:
         """Check if message should be forwarded based on filters"""
-        
-        # Check media filters
-        if not self._check_media_filter(message):
-            return False
-        
-        # Check text filters
-        if not self._check_text_filters(message):
-            return False
-        
-        # Check advanced filters
-        if not self._check_advanced_filters(message):
-            return False
-        
-        # Check whitelist/blacklist
-        if not self._check_user_lists(message):
-            return False
-        
-        return True
+        return await self.filter_message(message) is None
+    
+    async def filter_message(self, message: Message) -> Optional[str]:
+        """Reason code of the first filter that rejects the message, None to forward"""
+        
+        # Check whitelist/blacklist (sender dependent, never cached)
+        reason = self._user_lists_reason(message)
+        if reason:
+            return reason
+        
+        key = self._decision_key(message)
+        verdict = decision_cache.get(key)
+        if verdict is None:
+            verdict = (
+                self._media_reason(message)
+                or self._text_reason(message)
+                or self._advanced_reason(message)
+                or FORWARD
+            )
+            decision_cache.set(key, verdict)
+        
+        return verdict or None
     
-    def _check_media_filter(self, message: Message) -> bool:
+    def _decision_key(self, message: Message) -> tuple:
+        """Cache key: (settings id, text hash, media type, message flags)"""
+        text = message.text or message.caption or ""
+        flags = (
+            bool(message.forward_date),
+            bool(message.reply_markup and message.reply_markup.inline_keyboard),
+            any(entity.type in ['mention', 'text_mention'] for entity in (message.entities or ())),
+            # text_link URLs are not part of the text hash
+            any(entity.type in LINK_ENTITY_TYPES for entity in message_entities(message))
+        )
+        return ('verdict', self.settings.settings_id, self._text_hash(text),
+                self._get_message_type(message), flags)
+    
+    def _media_reason(self, message: Message) -> Optional[str]:
         """Check media type filters"""
-        media_filters = self.settings.get('media_filters', {})
-        if not media_filters.get('enabled', True):
-            return True
-        
-        allowed_types = media_filters.get('allowed_types', [])
-        if not allowed_types:
-            return True
+        allowed_types = self.settings.allowed_types
+        if allowed_types is None:
+            return None
         
         message_type = self._get_message_type(message)
-        return message_type in allowed_types
+        return None if message_type in allowed_types else REASON_MEDIA_TYPE
     
     def _get_message_type(self, message: Message) -> str:
         """Get message type"""
@@ -64,116 +154,121 @@ class MessageProcessor:
         else:
             return 'text'
     
-    def _check_text_filters(self, message: Message) -> bool:
+    def _text_reason(self, message: Message) -> Optional[str]:
         """Check text-based filters"""
         if not message.text and not message.caption:
-            return True
+            return None
         
-        text = message.text or message.caption or ""
+        settings = self.settings
+        if not settings.blocked_words and not settings.required_words:
+            return None
+        
+        text = (message.text or message.caption or "").lower()
         
         # Check blocked words
-        blocked_words = self.settings.get('blocked_words', [])
-        for word in blocked_words:
-            if word.lower() in text.lower():
-                return False
+        for word in settings.blocked_words:
+            if word in text:
+                return REASON_BLOCKED_WORD
         
         # Check required words
-        required_words = self.settings.get('required_words', [])
-        if required_words:
-            for word in required_words:
-                if word.lower() in text.lower():
+        if settings.required_words:
+            for word in settings.required_words:
+                if word in text:
                     break
             else:
-                return False
+                return REASON_REQUIRED_WORD
         
-        return True
+        return None
     
-    def _check_advanced_filters(self, message: Message) -> bool:
+    def _advanced_reason(self, message: Message) -> Optional[str]:
         """Check advanced filters"""
-        advanced_filters = self.settings.get('advanced_filters', {})
+        settings = self.settings
         
         # Block links
-        if advanced_filters.get('block_links', False):
+        if settings.block_links:
             text = message.text or message.caption or ""
-            if self._contains_links(text):
-                return False
+            if self._contains_links(text, message_entities(message)):
+                return REASON_LINK
         
         # Block usernames/mentions
-        if advanced_filters.get('block_mentions', False):
+        if settings.block_mentions:
             if message.entities:
                 for entity in message.entities:
                     if entity.type in ['mention', 'text_mention']:
-                        return False
+                        return REASON_MENTION
         
         # Block forwarded messages
-        if advanced_filters.get('block_forwarded', False):
+        if settings.block_forwarded:
             if message.forward_date:
-                return False
+                return REASON_FORWARDED
         
         # Block messages with inline keyboards
-        if advanced_filters.get('block_inline_keyboards', False):
+        if settings.block_inline_keyboards:
             if message.reply_markup and message.reply_markup.inline_keyboard:
-                return False
+                return REASON_INLINE_KEYBOARD
         
-        return True
+        return None
     
-    def _check_user_lists(self, message: Message) -> bool:
+    def _user_lists_reason(self, message: Message) -> Optional[str]:
         """Check whitelist and blacklist"""
         user_id = message.from_user.id if message.from_user else None
         if not user_id:
-            return True
+            return None
         
         # Check blacklist
-        blacklist = self.settings.get('blacklist', [])
-        if user_id in blacklist:
-            return False
+        if user_id in self.blacklist:
+            return REASON_BLACKLIST
         
         # Check whitelist
-        whitelist = self.settings.get('whitelist', [])
-        if whitelist and user_id not in whitelist:
-            return False
+        if self.whitelist and user_id not in self.whitelist:
+            return REASON_WHITELIST
         
-        return True
+        return None
     
-    def _contains_links(self, text: str) -> bool:
+    def _contains_links(self, text: str, entities: Sequence[MessageEntity] = ()) -> bool:
         """Check if text contains links"""
-        # URL pattern
-        url_pattern = r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\$$\$$,]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
-        if re.search(url_pattern, text):
-            return True
+        # Telegram already parsed the text: no need to scan it
+        if entities:
+            return any(entity.type in LINK_ENTITY_TYPES for entity in entities)
         
-        # Telegram links
-        telegram_pattern = r'(?:@[a-zA-Z0-9_]+|t\.me/[a-zA-Z0-9_]+)'
-        if re.search(telegram_pattern, text):
-            return True
-        
-        return False
+        return LINK_PATTERN.search(text) is not None
     
-    async def process_message_text(self, text: str) -> str:
+    async def process_message_text(self, text: str,
+                                   entities: Sequence[MessageEntity] = ()) -> str:
         """Process message text with replacements, header, footer"""
         if not text:
             return text
         
-        processed_text = text
+        settings = self.settings
+        remove_links = settings.remove_links
+        spans = link_spans(entities) if remove_links and entities else ()
+        
+        key = ('text', settings.settings_id, self._text_hash(text), spans)
+        cached = decision_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        # Entity offsets refer to the original text, so cut before replacing
+        processed_text = cut_spans(text, spans) if spans else text
         
         # Apply replacements
-        replacements = self.settings.get('replacements', {})
-        for old_text, new_text in replacements.items():
+        for old_text, new_text in settings.replacements:
             processed_text = processed_text.replace(old_text, new_text)
         
-        # Remove links if enabled
-        if self.settings.get('remove_links', False):
+        # Remove links if enabled (regex only when Telegram sent no entities)
+        if remove_links and not entities:
             processed_text = self._remove_links(processed_text)
         
         # Remove lines containing specific words
-        remove_lines_with = self.settings.get('remove_lines_with', [])
+        remove_lines_with = settings.remove_lines_with
         if remove_lines_with:
             lines = processed_text.split('\n')
             filtered_lines = []
             for line in lines:
                 should_remove = False
+                lowered_line = line.lower()
                 for word in remove_lines_with:
-                    if word.lower() in line.lower():
+                    if word in lowered_line:
                         should_remove = True
                         break
                 if not should_remove:
@@ -181,36 +276,40 @@ class MessageProcessor:
             processed_text = '\n'.join(filtered_lines)
         
         # Remove empty lines
-        if self.settings.get('remove_empty_lines', False):
+        if settings.remove_empty_lines:
             lines = processed_text.split('\n')
             processed_text = '\n'.join(line for line in lines if line.strip())
         
         # Add header
-        header = self.settings.get('header', '')
+        header = settings.header
         if header:
             processed_text = f"{header}\n\n{processed_text}"
         
         # Add footer
-        footer = self.settings.get('footer', '')
+        footer = settings.footer
         if footer:
             processed_text = f"{processed_text}\n\n{footer}"
         
+        decision_cache.set(key, processed_text)
         return processed_text
     
     def _remove_links(self, text: str) -> str:
         """Remove links from text"""
-        # Remove URLs
-        text = re.sub(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\$$\$$,]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', '', text)
+        return LINK_PATTERN.sub('', text)
+    
+    def is_near_duplicate(self, message: Message, target_chat_id: int) -> bool:
+        """Check for lightly edited reposts recently forwarded to the target"""
+        near_duplicate = self.settings.near_duplicate
+        if near_duplicate is None:
+            return False
         
-        # Remove Telegram links
-        text = re.sub(r'(?:@[a-zA-Z0-9_]+|t\.me/[a-zA-Z0-9_]+)', '', text)
+        text = message.text or message.caption or ""
+        if not text:
+            return False
         
-        return text
+        threshold, window = near_duplicate
+        return near_duplicate_detector.check_and_add(target_chat_id, text, threshold, window)
     
     async def get_delay(self) -> int:
         """Get delay for message forwarding"""
-        delay_settings = self.settings.get('delay', {})
-        if not delay_settings.get('enabled', False):
-            return 0
-        
-        return delay_settings.get('seconds', 0)
+        return self.settings.delay_seconds
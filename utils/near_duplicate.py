@@ -0,0 +1,139 @@
+import re
+import time
+import hashlib
+from collections import OrderedDict, deque
+from typing import Dict, Any, List, Optional, Tuple
+from config import Config
+from utils.duplicate_filter import normalize_text
+
+SIGNATURE_BITS = 64
+BAND_COUNTS = (4, 8, 16)
+# Largest distance the pigeonhole guarantee holds for (fewer differing bits than bands)
+MAX_DISTANCE = BAND_COUNTS[-1] - 1
+LINK_PATTERN = re.compile(r'(?:https?://|www\.|t\.me/)\S+')
+TOKEN_PATTERN = re.compile(r'\w+')
+
+def simhash(text: str, min_tokens: int = Config.NEAR_DUPLICATE_MIN_TOKENS) -> Optional[int]:
+    """64-bit SimHash over word unigrams and bigrams; None for texts too short to compare"""
+    tokens = TOKEN_PATTERN.findall(LINK_PATTERN.sub(' ', normalize_text(text)))
+    if len(tokens) < min_tokens:
+        return None
+
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    bits = [
+        format(int.from_bytes(hashlib.blake2b(f.encode('utf-8'), digest_size=8).digest(), 'big'), '064b')
+        for f in features
+    ]
+
+    # Column-wise majority vote, counted in C via tuple.count
+    half = len(bits) / 2
+    signature = 0
+    for column in zip(*bits):
+        signature = (signature << 1) | (column.count('1') > half)
+    return signature
+
+class SimHashIndex:
+    """Banded LSH index of recent signatures for a single target chat"""
+
+    def __init__(self, bands: int, capacity: int):
+        self.bands = bands
+        self.band_bits = SIGNATURE_BITS // self.bands
+        self.band_mask = (1 << self.band_bits) - 1
+        self.capacity = capacity
+        self.entries: "OrderedDict[int, Tuple[int, float]]" = OrderedDict()
+        self.buckets: List[Dict[int, deque]] = [{} for _ in range(self.bands)]
+        self._next_id = 0
+
+    @staticmethod
+    def bands_for(max_distance: int) -> int:
+        """Pigeonhole: with more bands than differing bits, a match shares at least one band"""
+        if max_distance > MAX_DISTANCE:
+            raise ValueError(f"max_distance {max_distance} exceeds {MAX_DISTANCE}")
+        return next(b for b in BAND_COUNTS if b > max_distance)
+
+    def _band_keys(self, signature: int):
+        for band in range(self.bands):
+            yield band, (signature >> (band * self.band_bits)) & self.band_mask
+
+    def find(self, signature: int, max_distance: int, window: float, now: float) -> bool:
+        """Look for a signature within max_distance bits seen in the last window seconds"""
+        for band, key in self._band_keys(signature):
+            for entry_id in self.buckets[band].get(key, ()):
+                entry = self.entries.get(entry_id)
+                if entry is None or now - entry[1] >= window:
+                    continue
+                if (signature ^ entry[0]).bit_count() <= max_distance:
+                    return True
+        return False
+
+    def add(self, signature: int, now: float) -> None:
+        """Insert a signature, evicting the oldest one beyond capacity"""
+        entry_id = self._next_id
+        self._next_id += 1
+        self.entries[entry_id] = (signature, now)
+        for band, key in self._band_keys(signature):
+            bucket = self.buckets[band].get(key)
+            if bucket is None:
+                bucket = deque()
+                self.buckets[band][key] = bucket
+            bucket.append(entry_id)
+
+        if len(self.entries) > self.capacity:
+            self._evict()
+
+    def _evict(self) -> None:
+        """Drop the oldest entry from its buckets; ids are FIFO, so it heads each of them"""
+        entry_id, (signature, _) = self.entries.popitem(last=False)
+        for band, key in self._band_keys(signature):
+            bucket = self.buckets[band][key]
+            if bucket and bucket[0] == entry_id:
+                bucket.popleft()
+            else:
+                bucket.remove(entry_id)
+            if not bucket:
+                del self.buckets[band][key]
+
+class NearDuplicateDetector:
+    """Per-target SimHash indexes for lightly edited reposts"""
+
+    def __init__(self, capacity: int = Config.NEAR_DUPLICATE_MAX_ENTRIES_PER_TARGET):
+        self.capacity = capacity
+        self.indexes: Dict[Tuple[int, int], SimHashIndex] = {}
+        self.suppressed = 0
+
+    @staticmethod
+    def max_distance(threshold: float) -> int:
+        """Similarity threshold (0..1) to the allowed number of differing bits, clamped to MAX_DISTANCE"""
+        return min(MAX_DISTANCE, max(0, int((1 - threshold) * SIGNATURE_BITS)))
+
+    def check_and_add(self, target_chat_id: int, text: str, threshold: float,
+                      window: float) -> bool:
+        """True when a similar text reached the target within the window; records it otherwise"""
+        signature = simhash(text)
+        if signature is None:
+            return False
+
+        max_distance = self.max_distance(threshold)
+        bands = SimHashIndex.bands_for(max_distance)
+        index = self.indexes.get((target_chat_id, bands))
+        if index is None:
+            index = SimHashIndex(bands, self.capacity)
+            self.indexes[(target_chat_id, bands)] = index
+        now = time.monotonic()
+
+        if index.find(signature, max_distance, window, now):
+            self.suppressed += 1
+            return True
+
+        index.add(signature, now)
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'indexes': len(self.indexes),
+            'entries': sum(len(index.entries) for index in self.indexes.values()),
+            'suppressed': self.suppressed
+        }
+
+# Global near-duplicate detector instance
+near_duplicate_detector = NearDuplicateDetector()
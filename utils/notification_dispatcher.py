@@ -0,0 +1,99 @@
+import asyncio
+from typing import Optional
+from config import Config
+from database.notifications_manager import NotificationsManager
+from .broadcaster import send_classified, SENT, BLOCKED
+from .rate_limiter import RateLimiter, send_limiter
+
+class NotificationDispatcher:
+    """إرسال صفوف جدول notifications: حجز دفعة ذرياً (SKIP LOCKED)، إرسالها متداخلة عبر
+    محدد المعدل المشترك، ثم تأكيد نتائجها بمعاملة واحدة.
+
+    عدة نسخ من البوت يمكنها العمل معاً دون تكرار، والإشعار الذي حجزته نسخة توقفت
+    يعاد إرساله بعد NOTIFICATION_LEASE_SECONDS. ما لن يرسل (حظر البوت، انتهاء الصلاحية،
+    استنفاد المحاولات) يعلم failed_at فيخرج من الطابور.
+    """
+
+    def __init__(self, limiter: RateLimiter = send_limiter, batch_size: int = Config.NOTIFICATION_BATCH_SIZE,
+                 poll_interval: float = Config.NOTIFICATION_POLL_SECONDS,
+                 lease_seconds: int = Config.NOTIFICATION_LEASE_SECONDS,
+                 max_attempts: int = Config.NOTIFICATION_MAX_ATTEMPTS):
+        self.limiter = limiter
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.bot = None
+        self.sent = 0
+        self.failed = 0
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def wake(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    async def dispatch_batch(self) -> int:
+        """حجز دفعة وإرسالها؛ يعيد عدد الإشعارات المحجوزة"""
+        notifications = await NotificationsManager.claim_notifications(
+            self.batch_size, self.lease_seconds, self.max_attempts
+        )
+        if not notifications:
+            return 0
+
+        results = await asyncio.gather(*(
+            send_classified(self.bot, notification['user_id'],
+                            f"🔔 **{notification['title']}**\n\n{notification['message']}", self.limiter)
+            for notification in notifications
+        ))
+
+        sent_ids, failed_ids, abandoned_ids = [], [], []
+        for notification, result in zip(notifications, results):
+            if result == SENT:
+                sent_ids.append(notification['id'])
+            elif result == BLOCKED:
+                abandoned_ids.append(notification['id'])
+            else:
+                failed_ids.append(notification['id'])
+
+        await NotificationsManager.complete_notifications(sent_ids, failed_ids, abandoned_ids, self.max_attempts)
+        self.sent += len(sent_ids)
+        self.failed += len(failed_ids) + len(abandoned_ids)
+        return len(notifications)
+
+    async def run(self):
+        """الإرسال ما دامت الدفعات ممتلئة، ثم الانتظار حتى wake أو poll_interval"""
+        self._wake = asyncio.Event()
+        while True:
+            self._wake.clear()
+            try:
+                if await self.dispatch_batch() >= self.batch_size:
+                    continue
+                await NotificationsManager.fail_dead_notifications(self.lease_seconds, self.max_attempts)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error dispatching notifications: {e}")
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, bot) -> None:
+        self.bot = bot
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """إيقاف المرسل؛ الدفعة المحجوزة غير المؤكدة تعود للطابور بعد انتهاء مهلتها"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+# Global notification dispatcher instance
+notification_dispatcher = NotificationDispatcher()
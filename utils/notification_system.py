@@ -14,12 +14,11 @@ class NotificationSystem:
             from config import Config
             
             # الحصول على قائمة المديرين
-            users = await UserManager.get_all_users()
-            admins = [user for user in users if user['is_admin']]
+            admin_ids = await UserManager.get_admin_ids()
             
             # إضافة المدير الرئيسي
-            if Config.ADMIN_USER_ID not in [admin['user_id'] for admin in admins]:
-                admins.append({'user_id': Config.ADMIN_USER_ID})
+            if Config.ADMIN_USER_ID not in admin_ids:
+                admin_ids.append(Config.ADMIN_USER_ID)
             
             # تحديد رمز الإشعار
             icon = {
@@ -39,17 +38,14 @@ class NotificationSystem:
 🕐 **الوقت:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
             """
             
-            # إرسال للمديرين
-            success_count = 0
-            for admin in admins:
-                try:
-                    # هنا نحتاج للوصول لـ bot instance
-                    # سيتم تنفيذ هذا في المعالجات
-                    success_count += 1
-                except Exception:
-                    continue
-            
-            return success_count > 0
+            # إرسال للمديرين عبر محدد المعدل المشترك
+            from utils.broadcaster import broadcaster, SENT
+            if broadcaster.bot is None:
+                print("Admin notification not sent: bot is not running")
+                return False
+            
+            results = await broadcaster.send_to(broadcaster.bot, admin_ids, notification_text)
+            return results[SENT] > 0
             
         except Exception as e:
             print(f"Error sending admin notification: {e}")
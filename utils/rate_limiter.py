@@ -0,0 +1,60 @@
+import asyncio
+import time
+from typing import Any, Optional
+from telegram.error import RetryAfter
+from config import Config
+
+class RateLimiter:
+    """دلو رموز (token bucket): معدل ثابت من الإرسال مع سماح بدفعة قصيرة"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """الانتظار حتى يتوفر رمز؛ المنتظرون يخدمون بالترتيب"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """إيقاف الإرسال مؤقتاً بعد رد RetryAfter من تلغرام.
+
+        الردود المتزامنة لا تتراكم: المهلة تنتهي عند أبعد موعد منها، ثم يبدأ الدلو فارغاً.
+        """
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0.0
+        self._updated_at = self._paused_until
+
+# حد الإرسال المشترك للرسائل الجماعية (التقارير والإشعارات الإدارية)
+send_limiter = RateLimiter(Config.SEND_RATE_PER_SECOND, Config.SEND_BURST)
+
+async def send_message_limited(bot, chat_id: int, text: str,
+                               limiter: Optional[RateLimiter] = None, **kwargs: Any):
+    """إرسال رسالة عبر محدد المعدل مع إعادة المحاولة مرة بعد RetryAfter"""
+    limiter = limiter or send_limiter
+    await limiter.acquire()
+    try:
+        return await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+    except RetryAfter as e:
+        retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+        limiter.pause(retry_after)
+        await limiter.acquire()
+        return await bot.send_message(chat_id=chat_id, text=text, **kwargs)
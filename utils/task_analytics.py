@@ -0,0 +1,109 @@
+import numpy as np
+from datetime import datetime, timedelta
+from typing import Any, Dict
+from config import Config
+from database.statistics_manager import StatisticsManager
+
+WEEKDAY_NAMES = ['الاثنين', 'الثلاثاء', 'الأربعاء', 'الخميس', 'الجمعة', 'السبت', 'الأحد']
+
+def moving_average(values: np.ndarray, window: int) -> np.ndarray:
+    """متوسط متحرك لنافذة ثابتة عبر المجموع التراكمي (طول الناتج n - window + 1)"""
+    if len(values) < window:
+        return np.empty(0, dtype=np.float64)
+    cumulative = np.cumsum(np.concatenate(([0], values)), dtype=np.float64)
+    return (cumulative[window:] - cumulative[:-window]) / window
+
+def weighted_percentiles(values: np.ndarray, weights: np.ndarray, quantiles) -> np.ndarray:
+    """نسب مئوية موزونة: كل قيمة تتكرر بقدر وزنها دون توسيع المصفوفة"""
+    mask = weights > 0
+    if not mask.any():
+        return np.zeros(len(quantiles))
+    order = np.argsort(values[mask])
+    sorted_values = values[mask][order]
+    cumulative = np.cumsum(weights[mask][order])
+    positions = np.searchsorted(cumulative, np.asarray(quantiles) * cumulative[-1])
+    return sorted_values[np.minimum(positions, len(sorted_values) - 1)]
+
+def analyze_series(series: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """تحليل سلسلة ساعية (ناتج StatisticsManager.get_time_series) بعمليات متجهة فقط"""
+    buckets = series['bucket']
+    forwarded = series['forwarded']
+    filtered = series['filtered']
+    failed = series['failed']
+    processing_ms = series['processing_ms']
+
+    total_forwarded = int(forwarded.sum())
+    total_filtered = int(filtered.sum())
+    total_failed = int(failed.sum())
+    total_processed = total_forwarded + total_filtered + total_failed
+
+    result: Dict[str, Any] = {
+        'hours': len(buckets),
+        'total_forwarded': total_forwarded,
+        'total_filtered': total_filtered,
+        'total_failed': total_failed,
+        'total_processed': total_processed,
+        'success_rate': total_forwarded / total_processed * 100 if total_processed else 0.0,
+        'filter_rate': total_filtered / total_processed * 100 if total_processed else 0.0,
+        'error_rate': total_failed / total_processed * 100 if total_processed else 0.0,
+        # زمن المعالجة لكل رسالة موجهة، لا متوسط مجاميع الساعات
+        'avg_processing_ms': float(processing_ms.sum()) / total_forwarded if total_forwarded else 0.0,
+    }
+
+    # نسب زمن المعالجة تقريبية: متوسط كل ساعة موزون بعدد رسائلها
+    hourly_latency = np.divide(processing_ms, forwarded, out=np.zeros(len(forwarded)), where=forwarded > 0)
+    result['processing_p50_ms'], result['processing_p95_ms'] = weighted_percentiles(
+        hourly_latency, forwarded, [0.5, 0.95]
+    )
+
+    # الرسائل الموجهة لكل ساعة
+    if len(forwarded):
+        result['hourly_p50'], result['hourly_p95'] = np.percentile(forwarded, [50, 95])
+        result['hourly_max'] = int(forwarded.max())
+    else:
+        result['hourly_p50'] = result['hourly_p95'] = 0.0
+        result['hourly_max'] = 0
+
+    # المتوسط المتحرك لآخر 24 ساعة مقارنة بالـ 24 ساعة التي قبلها
+    moving = moving_average(forwarded, 24)
+    result['last_24h_rate'] = float(moving[-1]) if len(moving) else 0.0
+    result['previous_24h_rate'] = float(moving[-25]) if len(moving) > 24 else 0.0
+
+    # ملفات الساعة واليوم: متوسط الرسائل الموجهة في كل ساعة من اليوم وكل يوم من الأسبوع
+    hour_numbers = buckets.astype('datetime64[h]').astype(np.int64)
+    hour_of_day = hour_numbers % 24
+    weekday = (hour_numbers // 24 + 3) % 7  # 1970-01-01 كان خميساً؛ الاثنين = 0
+
+    hour_counts = np.bincount(hour_of_day, minlength=24)
+    result['hour_profile'] = np.bincount(hour_of_day, weights=forwarded, minlength=24) / np.maximum(hour_counts, 1)
+
+    weekday_days = np.bincount(weekday, minlength=7) / 24
+    result['weekday_profile'] = np.bincount(weekday, weights=forwarded, minlength=7) / np.maximum(weekday_days, 1)
+
+    result['peak_hour'] = int(result['hour_profile'].argmax())
+    result['peak_weekday'] = int(result['weekday_profile'].argmax())
+
+    # مجاميع يومية (الأحدث أولاً)
+    days, day_index = np.unique(buckets.astype('datetime64[D]'), return_inverse=True)
+    result['daily_dates'] = days[::-1]
+    result['daily_forwarded'] = np.bincount(day_index, weights=forwarded, minlength=len(days))[::-1].astype(np.int64)
+    result['daily_filtered'] = np.bincount(day_index, weights=filtered, minlength=len(days))[::-1].astype(np.int64)
+
+    return result
+
+class TaskAnalytics:
+    """تحليلات أداء المهمة من سلسلتها الساعية"""
+
+    @staticmethod
+    async def get_task_analytics(task_id: int, days: int = Config.STATS_ANALYTICS_DAYS) -> Dict[str, Any]:
+        """تحميل آخر days يوماً من الإحصائيات الساعية في استعلام واحد ثم تحليلها"""
+        end = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        start = end - timedelta(days=days)
+
+        series = await StatisticsManager.get_time_series([task_id], start, end)
+        if not series:
+            return {}
+
+        result = analyze_series(series)
+        result['days'] = days
+        return result
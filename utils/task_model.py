@@ -0,0 +1,142 @@
+import json
+import hashlib
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Tuple
+from config import Config
+from utils.user_id_set import UserIdSet
+
+# Keys that depend on the sender and never take part in cached decisions
+SENDER_DEPENDENT_KEYS = ('whitelist', 'blacklist')
+
+EMPTY_USER_IDS = UserIdSet()
+
+def settings_fingerprint(settings: Dict[str, Any]) -> bytes:
+    """Stable id of the text-only part of the settings"""
+    cacheable = {k: v for k, v in settings.items() if k not in SENDER_DEPENDENT_KEYS}
+    blob = json.dumps(cacheable, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(blob.encode('utf-8'), digest_size=8).digest()
+
+class CompiledSettings:
+    """Immutable, pre-normalized view of a task's settings JSON.
+
+    Words are lower-cased once, nested dicts are flattened to plain fields and
+    disabled features collapse to None/empty, so per-message checks are
+    attribute reads. Tasks with identical settings share one instance.
+    """
+
+    __slots__ = (
+        'settings_id', 'allowed_types', 'blocked_words', 'required_words',
+        'block_links', 'block_mentions', 'block_forwarded', 'block_inline_keyboards',
+        'replacements', 'remove_links', 'remove_lines_with', 'remove_empty_lines',
+        'header', 'footer', 'delay_seconds', 'duplicate_window', 'near_duplicate',
+        'inline_buttons'
+    )
+
+    allowed_types: Optional[FrozenSet[str]]
+    blocked_words: Tuple[str, ...]
+    required_words: Tuple[str, ...]
+    replacements: Tuple[Tuple[str, str], ...]
+    remove_lines_with: Tuple[str, ...]
+    duplicate_window: Optional[int]
+    near_duplicate: Optional[Tuple[float, int]]
+    inline_buttons: Tuple[Tuple[str, str, str], ...]
+
+    def __init__(self, settings: Dict[str, Any], settings_id: Optional[bytes] = None):
+        set_field = object.__setattr__
+        set_field(self, 'settings_id', settings_id or settings_fingerprint(settings))
+
+        media_filters = settings.get('media_filters', {})
+        allowed_types = media_filters.get('allowed_types', [])
+        set_field(self, 'allowed_types',
+                  frozenset(allowed_types) if media_filters.get('enabled', True) and allowed_types else None)
+
+        set_field(self, 'blocked_words', _lowered(settings.get('blocked_words', [])))
+        set_field(self, 'required_words', _lowered(settings.get('required_words', [])))
+
+        advanced_filters = settings.get('advanced_filters', {})
+        for name in ('block_links', 'block_mentions', 'block_forwarded', 'block_inline_keyboards'):
+            set_field(self, name, bool(advanced_filters.get(name, False)))
+
+        set_field(self, 'replacements', tuple(settings.get('replacements', {}).items()))
+        set_field(self, 'remove_links', bool(settings.get('remove_links', False)))
+        set_field(self, 'remove_lines_with', _lowered(settings.get('remove_lines_with', [])))
+        set_field(self, 'remove_empty_lines', bool(settings.get('remove_empty_lines', False)))
+        set_field(self, 'header', settings.get('header', '') or '')
+        set_field(self, 'footer', settings.get('footer', '') or '')
+
+        delay = settings.get('delay', {})
+        set_field(self, 'delay_seconds', delay.get('seconds', 0) if delay.get('enabled', False) else 0)
+
+        duplicate = settings.get('duplicate_filter', {})
+        set_field(self, 'duplicate_window',
+                  duplicate.get('window_seconds', Config.DUPLICATE_WINDOW_SECONDS)
+                  if duplicate.get('enabled', False) else None)
+
+        near_duplicate = settings.get('near_duplicate_filter', {})
+        set_field(self, 'near_duplicate', (
+            near_duplicate.get('threshold', Config.NEAR_DUPLICATE_THRESHOLD),
+            near_duplicate.get('window_seconds', Config.DUPLICATE_WINDOW_SECONDS)
+        ) if near_duplicate.get('enabled', False) else None)
+
+        buttons = settings.get('inline_buttons', {})
+        set_field(self, 'inline_buttons', tuple(
+            (button.get('text', ''), button.get('url', ''), button.get('callback_data', ''))
+            for button in buttons.get('buttons', [])
+        ) if buttons.get('enabled', False) else ())
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+def _lowered(words: Iterable[str]) -> Tuple[str, ...]:
+    return tuple(word.lower() for word in words)
+
+class ForwardingTask:
+    """Routing fields of an active task plus its compiled processor.
+
+    Only what the forwarder reads per message is kept; descriptions,
+    timestamps and counters stay in the database.
+    """
+
+    __slots__ = ('id', 'source_chat_id', 'target_chat_id', 'task_type', 'processor')
+
+    def __init__(self, task_id: int, source_chat_id: int, target_chat_id: int,
+                 task_type: str, processor):
+        self.id = task_id
+        self.source_chat_id = source_chat_id
+        self.target_chat_id = target_chat_id
+        self.task_type = task_type
+        self.processor = processor
+
+    @property
+    def settings(self) -> CompiledSettings:
+        return self.processor.settings
+
+    @classmethod
+    def from_record(cls, record, user_lists: Optional[Dict[str, UserIdSet]] = None,
+                    interned: Optional[Dict[bytes, CompiledSettings]] = None) -> 'ForwardingTask':
+        """Compile a task row; pass the same `interned` dict to share identical settings"""
+        from utils.message_processor import MessageProcessor
+
+        settings = record['settings']
+        settings_id = settings_fingerprint(settings)
+        compiled = interned.get(settings_id) if interned is not None else None
+        if compiled is None:
+            compiled = CompiledSettings(settings, settings_id)
+            if interned is not None:
+                interned[settings_id] = compiled
+
+        # Lists live in task_user_lists; legacy inline lists are still honoured
+        user_lists = user_lists or {}
+        whitelist = user_lists.get('whitelist') or _legacy_list(settings, 'whitelist')
+        blacklist = user_lists.get('blacklist') or _legacy_list(settings, 'blacklist')
+
+        return cls(
+            record['id'], record['source_chat_id'], record['target_chat_id'],
+            record['task_type'], MessageProcessor(compiled, whitelist, blacklist)
+        )
+
+def _legacy_list(settings: Dict[str, Any], list_type: str) -> UserIdSet:
+    user_ids = settings.get(list_type)
+    return UserIdSet(user_ids) if user_ids else EMPTY_USER_IDS
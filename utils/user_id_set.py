@@ -0,0 +1,40 @@
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Iterator
+
+class UserIdSet:
+    """مجموعة معرفات ثابتة مرتبة (int64): 8 بايت لكل معرف وبحث O(log n)"""
+
+    __slots__ = ('_ids',)
+
+    def __init__(self, user_ids: Iterable[int] = ()):
+        self._ids = array('q', sorted(set(user_ids)))
+
+    @classmethod
+    def from_sorted(cls, user_ids: Iterable[int]) -> 'UserIdSet':
+        """بناء من معرفات مرتبة وفريدة مسبقاً (مثل ORDER BY user_id)"""
+        instance = cls.__new__(cls)
+        instance._ids = array('q', user_ids)
+        return instance
+
+    def __contains__(self, user_id: int) -> bool:
+        ids = self._ids
+        index = bisect_left(ids, user_id)
+        return index < len(ids) and ids[index] == user_id
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __bool__(self) -> bool:
+        return len(self._ids) > 0
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._ids)
+
+    def union(self, user_ids: Iterable[int]) -> 'UserIdSet':
+        return UserIdSet(list(self._ids) + list(user_ids))
+
+    @property
+    def nbytes(self) -> int:
+        """حجم مخزن المعرفات بالبايت"""
+        return len(self._ids) * self._ids.itemsize